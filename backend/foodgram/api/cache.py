@@ -0,0 +1,229 @@
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+
+VERSION_KEY = 'version:{}'
+RECIPES_VERSION = 'recipes'
+PAGE_KEY = 'page:{}:{}'
+PAGE_STATS_KEY = 'page_stats:{}'
+PAGE_STATS = ('hits', 'misses', 'invalidations')
+FRAGMENTS_VERSION = 'recipe_fragments'
+RECIPE_VERSION = 'recipe:{}'
+FRAGMENT_KEY = 'fragment:{}:{}:{}:{}'
+CHANGE_KEY = 'change:{}:{}'
+LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+# Отставание процесса больше чем на столько изменений дешевле
+# наверстать перестройкой индекса.
+MAX_CHANGES = 1000
+
+
+def get_version(name):
+    """Текущая версия набора данных name из общего кеша.
+    Версия хранится без срока жизни, при потере ключа начинается
+    с текущего времени в миллисекундах, поэтому не повторяет
+    значения, уже запомненные процессами."""
+    key = VERSION_KEY.format(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def get_data_version(name, queryset):
+    """Версия набора данных name для данных в памяти процесса.
+    С кешем в памяти процесса версии других процессов не видны,
+    поэтому к версии добавляются число и наибольший id записей
+    queryset: добавления и удаления в других процессах все равно
+    обнаруживаются, а изменения записей — только с общим кешем."""
+    version = get_version(name)
+    if settings.CACHES['default']['BACKEND'] not in LOCAL_CACHES:
+        return version
+    stats = queryset.aggregate(count=Count('pk'), last=Max('pk'))
+    return f'{version}:{stats["count"]}:{stats["last"]}'
+
+
+def bump_version(name):
+    """Увеличение версии набора данных name после его изменения."""
+    try:
+        return cache.incr(VERSION_KEY.format(name))
+    except ValueError:
+        return get_version(name)
+
+
+def increment(key):
+    """Увеличение счетчика в кеше, счетчик создается при отсутствии."""
+    if cache.add(key, 1, None):
+        return 1
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+        return 1
+
+
+def page_cache_key(request, name):
+    """Ключ страницы: версия набора данных name, адрес и
+    отсортированные параметры запроса, поэтому ?tags=a&tags=b
+    и ?tags=b&tags=a попадают в один ключ."""
+    query = sorted(
+        (key, sorted(values)) for key, values in request.query_params.lists()
+    )
+    raw = f'{request.build_absolute_uri(request.path)}?{query}'
+    return PAGE_KEY.format(
+        get_version(name), hashlib.sha1(raw.encode()).hexdigest()
+    )
+
+
+def get_cached_page(key):
+    """Данные ответа из кеша страниц с учетом статистики попаданий."""
+    data = cache.get(key)
+    increment(PAGE_STATS_KEY.format('misses' if data is None else 'hits'))
+    return data
+
+
+def set_cached_page(key, data):
+    cache.set(key, data, settings.RECIPE_PAGE_CACHE_TIMEOUT)
+
+
+def invalidate_pages(name):
+    """Сброс всех закешированных страниц набора данных name."""
+    bump_version(name)
+    increment(PAGE_STATS_KEY.format('invalidations'))
+
+
+def get_page_cache_stats():
+    """Счетчики кеша страниц и доля попаданий."""
+    stats = {
+        stat: cache.get(PAGE_STATS_KEY.format(stat), 0) for stat in PAGE_STATS
+    }
+    requests = stats['hits'] + stats['misses']
+    stats['hit_rate'] = stats['hits'] / requests if requests else 0.0
+    return stats
+
+
+def get_recipe_fragments(recipe_ids, request):
+    """Закешированные части представлений рецептов, не зависящие
+    от пользователя. Ключ включает общую версию фрагментов, id и версию
+    рецепта, а также адрес сайта, от которого зависят ссылки на
+    картинки. Возвращает найденные фрагменты и ключи всех рецептов."""
+    version_keys = {
+        recipe_id: VERSION_KEY.format(RECIPE_VERSION.format(recipe_id))
+        for recipe_id in recipe_ids
+    }
+    versions = cache.get_many(version_keys.values())
+    for key in set(version_keys.values()) - set(versions):
+        cache.add(key, int(time.time() * 1000), None)
+        versions[key] = cache.get(key)
+    site = hashlib.sha1(
+        request.build_absolute_uri('/').encode() if request else b''
+    ).hexdigest()[:12]
+    fragments_version = get_version(FRAGMENTS_VERSION)
+    keys = {
+        recipe_id: FRAGMENT_KEY.format(
+            fragments_version, recipe_id, versions[key], site
+        )
+        for recipe_id, key in version_keys.items()
+    }
+    cached = cache.get_many(keys.values())
+    fragments = {recipe_id: cached[key] for recipe_id, key in keys.items()
+                 if key in cached}
+    return fragments, keys
+
+
+def set_recipe_fragments(fragments, keys):
+    cache.set_many({keys[recipe_id]: fragment
+                    for recipe_id, fragment in fragments.items()})
+
+
+def invalidate_recipe_fragment(recipe_id):
+    """Сброс фрагмента рецепта после его изменения."""
+    bump_version(RECIPE_VERSION.format(recipe_id))
+
+
+def publish_change(name, change):
+    """Запись изменения набора данных name в журнал общего кеша под
+    новой версией, которую и возвращает."""
+    version = bump_version(name)
+    cache.set(CHANGE_KEY.format(name, version), change,
+              settings.INDEX_CHANGES_TIMEOUT)
+    return version
+
+
+def get_changes(name, since, until):
+    """Изменения набора данных name версий от since (не включая)
+    до until по порядку, None если какого-то нет в журнале."""
+    if not 0 < until - since <= MAX_CHANGES:
+        return None
+    keys = [CHANGE_KEY.format(name, version)
+            for version in range(since + 1, until + 1)]
+    changes = cache.get_many(keys)
+    if len(changes) != len(keys):
+        return None
+    return [changes[key] for key in keys]
+
+
+class ProcessIndex:
+    """Индекс в памяти процесса, общий для его потоков.
+
+    Индекс строится функцией build при первом обращении. Изменения
+    публикуются в журнал общего кеша под версиями набора данных name,
+    другие процессы применяют их к своему индексу функцией
+    apply(index, change) по порядку версий. Индекс перестраивается,
+    только если нужных изменений в журнале нет или версия сброшена
+    целиком."""
+
+    def __init__(self, name, build, apply):
+        self.name = name
+        self.build = build
+        self.apply = apply
+        self.index = None
+        self.version = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        version = get_version(self.name)
+        if self.index is None or self.version != version:
+            with self.lock:
+                if self.index is None or self.version != version:
+                    self.catch_up(version)
+        return self.index
+
+    def catch_up(self, version):
+        changes = None
+        if self.index is not None:
+            changes = get_changes(self.name, self.version, version)
+        if changes is None:
+            self.index = self.build()
+        else:
+            for change in changes:
+                self.apply(self.index, change)
+        self.version = version
+
+    def update(self, change):
+        """Публикация изменения и применение его к индексу процесса,
+        если индекс был актуален, иначе процесс наверстает журнал
+        при следующем обращении."""
+        with self.lock:
+            version = publish_change(self.name, change)
+            if self.index is not None and self.version == version - 1:
+                self.apply(self.index, change)
+                self.version = version
+
+    def invalidate(self):
+        """Перестройка индекса во всех процессах."""
+        bump_version(self.name)
+
+    def reset(self):
+        """Сброс индекса этого процесса, например между тестами,
+        когда база откатывается, а версия в новом кеше может совпасть
+        с запомненной."""
+        with self.lock:
+            self.index = self.version = None
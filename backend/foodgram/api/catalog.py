@@ -0,0 +1,95 @@
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+
+from recipes.models import Ingredient
+from .cache import get_data_version
+
+CATALOG_VERSION = 'ingredients'
+
+
+class IngredientCatalog:
+    """Неизменяемый каталог ингредиентов в памяти процесса.
+
+    Ингредиенты отсортированы по имени в нижнем регистре, поиск
+    по началу имени выполняется двоичным поиском по отсортированным
+    ключам, поиск по подстроке — одним проходом str.find по склеенным
+    ключам, смещения которых хранятся в массиве."""
+
+    def __init__(self, rows):
+        rows = sorted(rows, key=lambda row: (row[1].lower(), row[2], row[0]))
+        self.ids = array('l', (row[0] for row in rows))
+        self.names = [row[1] for row in rows]
+        self.units = [row[2] for row in rows]
+        self.keys = [name.lower() for name in self.names]
+        self.text = '\n'.join(self.keys)
+        self.offsets = array('l')
+        offset = 0
+        for key in self.keys:
+            self.offsets.append(offset)
+            offset += len(key) + 1
+
+    def __len__(self):
+        return len(self.ids)
+
+    def item(self, index):
+        """Ингредиент в представлении IngredientSerializer."""
+        return {
+            'id': self.ids[index],
+            'name': self.names[index],
+            'measurement_unit': self.units[index],
+        }
+
+    def prefix_range(self, key):
+        """Границы ингредиентов, имя которых начинается с key."""
+        start = bisect_left(self.keys, key)
+        end = bisect_right(self.keys, key + '\U0010ffff', lo=start)
+        return start, end
+
+    def substring_indexes(self, key, exclude):
+        """Индексы ингредиентов, содержащих key не в начале имени."""
+        position = self.text.find(key)
+        while position != -1:
+            index = bisect_right(self.offsets, position) - 1
+            if not exclude[0] <= index < exclude[1]:
+                yield index
+            if index + 1 == len(self.offsets):
+                return
+            position = self.text.find(key, self.offsets[index + 1])
+
+    def search(self, query, limit=None):
+        """Ингредиенты, имя которых содержит query без учета регистра:
+        сначала совпадения с начала имени, затем остальные,
+        внутри групп по алфавиту."""
+        key = query.lower().replace('\n', ' ')
+        if not key:
+            return [self.item(index) for index in range(len(self))][:limit]
+        prefix = self.prefix_range(key)
+        results = [self.item(index) for index in range(*prefix)][:limit]
+        for index in self.substring_indexes(key, prefix):
+            if limit is not None and len(results) >= limit:
+                break
+            results.append(self.item(index))
+        return results
+
+
+_catalog = None
+_catalog_version = None
+_catalog_lock = threading.Lock()
+
+
+def get_ingredient_catalog():
+    """Каталог ингредиентов процесса, перестраивается при изменении
+    версии, которую увеличивают сигналы модели Ingredient. Изменения
+    из других процессов видны только с общим кешем (check api.W001),
+    с кешем в памяти процесса — лишь добавления и удаления."""
+    global _catalog, _catalog_version
+    version = get_data_version(CATALOG_VERSION, Ingredient.objects.all())
+    if _catalog is None or _catalog_version != version:
+        with _catalog_lock:
+            if _catalog is None or _catalog_version != version:
+                _catalog = IngredientCatalog(Ingredient.objects.values_list(
+                    'id', 'name', 'measurement_unit'
+                ))
+                _catalog_version = version
+    return _catalog
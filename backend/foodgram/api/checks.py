@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+from .cache import LOCAL_CACHES
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """Версии кеша страниц, фрагментов, снимков и индексов в памяти
+    процессов должны быть видны всем процессам сервера."""
+    if settings.CACHES['default']['BACKEND'] not in LOCAL_CACHES:
+        return []
+    return [Warning(
+        'Кеш по умолчанию хранится в памяти процесса: изменения данных '
+        'в одном процессе gunicorn не сбрасывают кеш страниц, снимки, '
+        'каталог ингредиентов и индексы остальных процессов.',
+        hint='Задайте CACHE_BACKEND и CACHE_LOCATION общего кеша, '
+             'например memcached.',
+        id='api.W001',
+    )]
@@ -1,6 +1,32 @@
 import django_filters
+from django_filters.constants import EMPTY_VALUES
 
 from recipes.models import Recipe, Ingredient, Tag
+from recipes.search import search_recipes
+from .cache import get_data_version
+from .snapshots import TAGS_VERSION
+
+_tag_bits = (None, {})
+
+
+def get_tag_bits(refresh=True):
+    """Соответствие slug тега его биту в маске рецепта. Хранится
+    в памяти процесса до изменения версии, которую увеличивают
+    сигналы модели Tag; с кешем в памяти процесса версия учитывает
+    теги, добавленные и удаленные другими процессами, иначе бит
+    удаленного тега мог бы достаться новому тегу незаметно.
+    Без refresh версия не проверяется повторно в том же запросе."""
+    global _tag_bits
+    if not refresh and _tag_bits[0] is not None:
+        return _tag_bits[1]
+    version = get_data_version(TAGS_VERSION, Tag.objects.all())
+    if _tag_bits[0] != version:
+        _tag_bits = (version, dict(Tag.objects.values_list('slug', 'bit')))
+    return _tag_bits[1]
+
+
+def get_tag_choices():
+    return [(slug, slug) for slug in get_tag_bits()]
 
 
 class IngredientFilter(django_filters.FilterSet):
@@ -13,33 +39,107 @@ class IngredientFilter(django_filters.FilterSet):
         fields = ('name', )
 
 
+class StableOrderingFilter(django_filters.OrderingFilter):
+    """Сортировка, дополненная первичным ключом в том же направлении,
+    чтобы порядок рецептов с равными значениями был однозначным
+    и совпадал с составными индексами. aliases задает дополнительные
+    параметры для уже перечисленных полей, параметры из descending
+    по умолчанию сортируют по убыванию."""
+
+    def __init__(self, *args, aliases=None, descending=(), **kwargs):
+        self.aliases = aliases or {}
+        self.descending = set(descending)
+        super().__init__(*args, **kwargs)
+        self.param_map.update(self.aliases)
+
+    def build_choices(self, fields, labels):
+        choices = super().build_choices(fields, labels)
+        for param in self.aliases:
+            choices += [(param, param), (f'-{param}', f'-{param}')]
+        return choices
+
+    def get_ordering_value(self, param):
+        value = super().get_ordering_value(param)
+        if param.lstrip('-') in self.descending:
+            return value[1:] if value.startswith('-') else f'-{value}'
+        return value
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        ordering = [self.get_ordering_value(param) for param in value]
+        ordering.append('-id' if ordering[-1].startswith('-') else 'id')
+        return qs.order_by(*ordering)
+
+
 class RecipeFilter(django_filters.FilterSet):
     """Фильтр рецептов."""
     author = django_filters.NumberFilter(field_name='author__id')
-    tags = django_filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        queryset=Tag.objects.all(),
-        to_field_name='slug',
+    tags = django_filters.MultipleChoiceFilter(
+        choices=get_tag_choices,
+        method='filter_tags',
     )
     is_favorited = django_filters.NumberFilter(method='filter_is_favorited')
     is_in_shopping_cart = django_filters.NumberFilter(
         method='filter_is_in_shopping_cart'
     )
+    min_favorites_count = django_filters.NumberFilter(
+        field_name='favorites_count', lookup_expr='gte'
+    )
+    search = django_filters.CharFilter(method='filter_search')
+    ordering = StableOrderingFilter(
+        fields=(
+            ('favorites_count', 'favorites_count'),
+            ('pub_date', 'pub_date'),
+            ('trending_score', 'trending'),
+        ),
+        aliases={'popular': 'favorites_count'},
+        descending=('popular', 'trending'),
+    )
 
     class Meta:
         model = Recipe
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart',
+                  'min_favorites_count', 'search')
+
+    @staticmethod
+    def filter_tags(queryset, name, value):
+        """Рецепты хотя бы с одним из тегов: одно побитовое условие
+        по маске рецепта вместо соединения с таблицей тегов. Биты
+        уже обновлены при проверке значений по get_tag_choices."""
+        tag_bits = get_tag_bits(refresh=False)
+        mask = 0
+        for slug in value:
+            if slug in tag_bits:
+                mask |= 1 << tag_bits[slug]
+        return queryset.filter(tags_mask__hasany=mask)
+
+    @staticmethod
+    def filter_search(queryset, name, value):
+        """Поиск по названию и описанию в порядке релевантности,
+        явно заданная сортировка ordering применяется после поиска."""
+        value = value.strip()
+        if not value:
+            return queryset
+        return search_recipes(queryset, value)
 
     def filter_is_favorited(self, queryset, name, value):
         """Переопределение фильтрации по избранным рецептам,
         если 1 то фильтруется."""
         if value == 1:
-            return queryset.filter(favorites__user=self.request.user)
+            return self._filter_by_flag(queryset, 'is_favorited')
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         """Переопределение фильтрации по рецептам в списке покупок,
         если 1 то фильтруется."""
         if value == 1:
-            return queryset.filter(carts__user=self.request.user)
+            return self._filter_by_flag(queryset, 'is_in_shopping_cart')
         return queryset
+
+    def _filter_by_flag(self, queryset, flag):
+        """Фильтрация по флагу, аннотированному в RecipeViewSet,
+        у анонимного пользователя нет избранного и списка покупок."""
+        if self.request.user.is_anonymous:
+            return queryset.none()
+        return queryset.filter(**{flag: True})
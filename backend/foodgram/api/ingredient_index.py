@@ -0,0 +1,115 @@
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+from itertools import groupby
+from operator import itemgetter
+
+from recipes.models import IngredientAmount
+from .cache import ProcessIndex
+
+INGREDIENT_INDEX_VERSION = 'ingredient_index'
+
+
+class IngredientIndex:
+    """Инвертированный индекс ингредиент → рецепты в памяти процесса.
+
+    Для каждого ингредиента хранится отсортированный массив id рецептов,
+    в которые он входит, для каждого рецепта — число его ингредиентов.
+    Покрытие рецептов набором ингредиентов считается сложением
+    массивов этих ингредиентов в Counter, без обращения к базе."""
+
+    def __init__(self, rows):
+        """rows — пары (ingredient_id, recipe_id), упорядоченные
+        по ингредиенту и рецепту."""
+        self.recipes = {}
+        self.sizes = Counter()
+        for ingredient_id, group in groupby(rows, key=itemgetter(0)):
+            postings = array('l', map(itemgetter(1), group))
+            self.recipes[ingredient_id] = postings
+            self.sizes.update(postings)
+
+    def update_recipe(self, recipe_id, old_ingredient_ids, ingredient_ids):
+        """Замена ингредиентов рецепта recipe_id."""
+        old_ingredient_ids = set(old_ingredient_ids)
+        ingredient_ids = set(ingredient_ids)
+        for ingredient_id in old_ingredient_ids - ingredient_ids:
+            postings = self.recipes.get(ingredient_id)
+            if postings is None:
+                continue
+            index = bisect_left(postings, recipe_id)
+            if index < len(postings) and postings[index] == recipe_id:
+                del postings[index]
+        for ingredient_id in ingredient_ids - old_ingredient_ids:
+            insort(self.recipes.setdefault(ingredient_id, array('l')),
+                   recipe_id)
+        if ingredient_ids:
+            self.sizes[recipe_id] = len(ingredient_ids)
+        else:
+            self.sizes.pop(recipe_id, None)
+
+    def remove_recipe(self, recipe_id):
+        """Удаление рецепта, ингредиенты которого уже неизвестны:
+        проход по всем ингредиентам двоичным поиском."""
+        for postings in self.recipes.values():
+            index = bisect_left(postings, recipe_id)
+            if index < len(postings) and postings[index] == recipe_id:
+                del postings[index]
+        self.sizes.pop(recipe_id, None)
+
+    def match(self, ingredient_ids):
+        """Рецепты, в которые входит хотя бы один из ингредиентов,
+        в виде кортежей (recipe_id, покрыто, всего ингредиентов).
+        Сначала рецепты с большей долей покрытых ингредиентов,
+        при равенстве — с большим их числом, затем более новые."""
+        covered = Counter()
+        for ingredient_id in set(ingredient_ids):
+            covered.update(self.recipes.get(ingredient_id, ()))
+        matches = [(recipe_id, count, self.sizes[recipe_id])
+                   for recipe_id, count in covered.items()]
+        matches.sort(key=lambda match: (
+            -match[1] / match[2], -match[1], -match[0]
+        ))
+        return matches
+
+
+def build_index():
+    return IngredientIndex(
+        IngredientAmount.objects.order_by(
+            'ingredient_id', 'recipe_id'
+        ).values_list('ingredient_id', 'recipe_id').iterator()
+    )
+
+
+def apply_change(index, change):
+    recipe_id, old_ingredient_ids, ingredient_ids = change
+    if old_ingredient_ids is None:
+        index.remove_recipe(recipe_id)
+    else:
+        index.update_recipe(recipe_id, old_ingredient_ids, ingredient_ids)
+
+
+_index = ProcessIndex(INGREDIENT_INDEX_VERSION, build_index, apply_change)
+
+
+def get_ingredient_index():
+    """Индекс процесса, строится из IngredientAmount при первом
+    обращении, изменения других процессов применяются из журнала."""
+    return _index.get()
+
+
+def update_recipe_index(recipe_id, old_ingredient_ids, ingredient_ids):
+    """Изменение ингредиентов рецепта в индексах всех процессов
+    без перестройки."""
+    _index.update(
+        (recipe_id, sorted(old_ingredient_ids), sorted(ingredient_ids))
+    )
+
+
+def remove_recipe_index(recipe_id):
+    """Удаление рецепта из индексов всех процессов."""
+    _index.update((recipe_id, None, ()))
+
+
+def invalidate_ingredient_index():
+    """Перестройка индекса во всех процессах."""
+    _index.invalidate()
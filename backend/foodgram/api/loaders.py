@@ -0,0 +1,87 @@
+from collections import defaultdict
+
+from django.db import models
+from rest_framework import serializers
+
+from recipes.models import Favorite, ShoppingCart, Subscription
+
+
+class RelationLoader:
+    """Пакетная загрузка связей текущего пользователя с объектами
+    на время запроса.
+
+    Сериализаторы заранее сообщают нужные id через prime, при первом
+    обращении к связи выполняется один запрос IN по всем накопленным
+    id, результат запоминается до конца запроса."""
+    relations = {
+        Favorite: 'recipe_id',
+        ShoppingCart: 'recipe_id',
+        Subscription: 'author_id',
+    }
+
+    def __init__(self, user):
+        self.user = user
+        self.pending = defaultdict(set)
+        self.loaded = defaultdict(dict)
+
+    def prime(self, model, ids):
+        """Регистрация id, связь с которыми понадобится позже."""
+        self.pending[model].update(
+            obj_id for obj_id in ids if obj_id not in self.loaded[model]
+        )
+
+    def load(self, model, obj_id):
+        """Связан ли пользователь с объектом obj_id через model."""
+        loaded = self.loaded[model]
+        if obj_id not in loaded:
+            ids = self.pending.pop(model, set()) | {obj_id}
+            field = self.relations[model]
+            found = set(model.objects.filter(
+                user=self.user, **{f'{field}__in': ids}
+            ).values_list(field, flat=True))
+            loaded.update((pk, pk in found) for pk in ids)
+        return loaded[obj_id]
+
+
+def get_relation_loader(request):
+    """Загрузчик связей, общий для всех сериализаторов запроса."""
+    request = getattr(request, '_request', request)
+    loader = getattr(request, 'relation_loader', None)
+    if loader is None:
+        loader = request.relation_loader = RelationLoader(request.user)
+    return loader
+
+
+def is_related(context, model, obj_id):
+    """Связан ли текущий пользователь с объектом obj_id через model,
+    ложь если не авторизованный пользователь."""
+    request = context.get('request')
+    if request is None or request.user.is_anonymous:
+        return False
+    return get_relation_loader(request).load(model, obj_id)
+
+
+class RelationLoaderListSerializer(serializers.ListSerializer):
+    """Сериализатор списка, который перед сериализацией сообщает
+    загрузчику связей id всех объектов. Дочерний сериализатор описывает
+    нужные связи атрибутом loader_relations: пары (модель, атрибут
+    объекта с id)."""
+
+    def to_representation(self, data):
+        instances = list(
+            data.all() if isinstance(data, models.Manager) else data
+        )
+        self.prime_relations(instances)
+        return self.represent(instances)
+
+    def prime_relations(self, instances):
+        request = self.context.get('request')
+        if request is None or request.user.is_anonymous:
+            return
+        loader = get_relation_loader(request)
+        for model, attr in getattr(self.child, 'loader_relations', ()):
+            loader.prime(model, (getattr(obj, attr) for obj in instances))
+
+    def represent(self, instances):
+        """Сериализация списка после регистрации id."""
+        return super().to_representation(instances)
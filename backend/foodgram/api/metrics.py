@@ -0,0 +1,219 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (
+    256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304
+)
+# (имя, описание, границы корзин) гистограмм на представление и метод.
+HISTOGRAMS = (
+    ('foodgram_http_request_duration_seconds',
+     'Время обработки запроса', LATENCY_BUCKETS),
+    ('foodgram_db_duration_seconds',
+     'Время запросов к базе данных за запрос', LATENCY_BUCKETS),
+    ('foodgram_db_queries',
+     'Количество запросов к базе данных за запрос', QUERY_BUCKETS),
+    ('foodgram_http_response_size_bytes',
+     'Размер тела ответа', SIZE_BUCKETS),
+)
+RESPONSES = 'foodgram_http_responses_total'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_store = None
+_store_lock = threading.Lock()
+_last_flush = 0
+_started = int(time.time() * 1000)
+
+
+class MetricsStore:
+    """Гистограммы запросов по представлению и методу и счетчики
+    ответов по статусам в памяти процесса. Гистограмма хранится
+    как количества по корзинам (последняя — +Inf) и сумма значений."""
+
+    def __init__(self):
+        self.histograms = {}
+        self.responses = Counter()
+
+    def get_histograms(self, key):
+        if key not in self.histograms:
+            self.histograms[key] = {
+                name: {'counts': [0] * (len(buckets) + 1), 'sum': 0}
+                for name, _, buckets in HISTOGRAMS
+            }
+        return self.histograms[key]
+
+    def observe(self, view, method, status, values):
+        """Учет запроса, values — значения гистограмм в порядке
+        HISTOGRAMS."""
+        histograms = self.get_histograms((view, method))
+        for (name, _, buckets), value in zip(HISTOGRAMS, values):
+            histograms[name]['counts'][bisect_left(buckets, value)] += 1
+            histograms[name]['sum'] += value
+        self.responses[(view, method, str(status))] += 1
+
+    def to_json(self):
+        return {
+            'histograms': [[view, method, histograms] for
+                           (view, method), histograms in
+                           self.histograms.items()],
+            'responses': [[*key, count] for key, count in
+                          self.responses.items()],
+        }
+
+    def merge(self, data):
+        """Добавление метрик из to_json другого процесса."""
+        for view, method, histograms in data['histograms']:
+            own = self.get_histograms((view, method))
+            for name, histogram in histograms.items():
+                if name not in own:
+                    continue
+                own[name]['sum'] += histogram['sum']
+                for index, count in enumerate(histogram['counts']):
+                    own[name]['counts'][index] += count
+        for view, method, status, count in data['responses']:
+            self.responses[(view, method, status)] += count
+
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = MetricsStore()
+    return _store
+
+
+def get_path():
+    """Файл метрик процесса в METRICS_DIR. Время запуска в имени
+    не дает новому процессу с тем же pid затереть метрики прежнего."""
+    return os.path.join(
+        settings.METRICS_DIR, f'{os.getpid()}-{_started}.json'
+    )
+
+
+def flush():
+    """Запись метрик процесса в его файл. Файл заменяется целиком,
+    поэтому читатели не видят частично записанных данных."""
+    global _last_flush
+    if not settings.METRICS_DIR:
+        return
+    with _store_lock:
+        data = json.dumps(get_store().to_json())
+        _last_flush = time.monotonic()
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    path = get_path()
+    temporary = f'{path}.{threading.get_ident()}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as metrics_file:
+        metrics_file.write(data)
+    os.replace(temporary, path)
+
+
+def record(view, method, status, values):
+    """Учет запроса в метриках процесса, не чаще
+    METRICS_FLUSH_INTERVAL секунд метрики сбрасываются в файл."""
+    with _store_lock:
+        get_store().observe(view, method, status, values)
+        due = time.monotonic() - _last_flush >= settings.METRICS_FLUSH_INTERVAL
+    if due:
+        flush()
+
+
+def is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def prune(names):
+    """Удаление файлов завершившихся процессов, чтобы их число и время
+    сбора не росли без ограничений. Возвращает имена оставшихся
+    файлов. Суммы счетчиков при этом уменьшаются, Prometheus считает
+    это сбросом счетчиков."""
+    alive = []
+    for name in names:
+        pid = name.split('-', 1)[0]
+        if pid.isdigit() and not is_alive(int(pid)):
+            try:
+                os.remove(os.path.join(settings.METRICS_DIR, name))
+            except OSError:
+                pass
+            continue
+        alive.append(name)
+    return alive
+
+
+def collect():
+    """Метрики всех работающих процессов из файлов METRICS_DIR, файлы
+    завершившихся процессов удаляются. Без METRICS_DIR — метрики только
+    этого процесса."""
+    if not settings.METRICS_DIR:
+        with _store_lock:
+            data = get_store().to_json()
+        store = MetricsStore()
+        store.merge(data)
+        return store
+    flush()
+    store = MetricsStore()
+    for name in prune(sorted(
+        name for name in os.listdir(settings.METRICS_DIR)
+        if name.endswith('.json')
+    )):
+        try:
+            with open(os.path.join(settings.METRICS_DIR, name),
+                      encoding='utf-8') as metrics_file:
+                store.merge(json.load(metrics_file))
+        except (OSError, ValueError):
+            continue
+    return store
+
+
+def escape(value):
+    return (value.replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def labels(**values):
+    return '{' + ','.join(
+        f'{name}="{escape(value)}"' for name, value in values.items()
+    ) + '}'
+
+
+def render(store):
+    """Метрики в текстовом формате Prometheus."""
+    lines = []
+    keys = sorted(store.histograms)
+    for name, description, buckets in HISTOGRAMS:
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} histogram')
+        for view, method in keys:
+            histogram = store.histograms[(view, method)][name]
+            cumulative = 0
+            for bound, count in zip(
+                [*map(str, buckets), '+Inf'], histogram['counts']
+            ):
+                cumulative += count
+                lines.append(f'{name}_bucket'
+                             f'{labels(view=view, method=method, le=bound)}'
+                             f' {cumulative}')
+            lines.append(f'{name}_sum{labels(view=view, method=method)} '
+                         f'{histogram["sum"]}')
+            lines.append(f'{name}_count{labels(view=view, method=method)} '
+                         f'{cumulative}')
+    lines.append(f'# HELP {RESPONSES} Количество ответов')
+    lines.append(f'# TYPE {RESPONSES} counter')
+    for (view, method, status), count in sorted(store.responses.items()):
+        lines.append(f'{RESPONSES}'
+                     f'{labels(view=view, method=method, status=status)}'
+                     f' {count}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,90 @@
+import time
+
+from django.db import connection
+
+from .metrics import record
+
+
+class DatabaseTimer:
+    """Обертка выполнения запросов к базе, считающая их количество
+    и суммарное время."""
+
+    def __init__(self):
+        self.queries = 0
+        self.duration = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.queries += 1
+
+
+def get_view_name(request):
+    """Имя представления и действия, например RecipeViewSet.list
+    или RecipeViewSet.download_shopping_cart."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    view = getattr(match.func, 'cls', None)
+    if view is None:
+        return match.view_name or match.func.__name__
+    actions = getattr(match.func, 'actions', None) or {}
+    method = request.method.lower()
+    return f'{view.__name__}.{actions.get(method, method)}'
+
+
+class MetricsMiddleware:
+    """Учет времени обработки, времени и количества запросов к базе,
+    размера и статуса ответа каждого запроса по представлениям.
+    Потоковый ответ учитывается, когда он прочитан до конца."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # Таймер недочитанного потокового ответа прошлого запроса.
+        connection.execute_wrappers[:] = [
+            wrapper for wrapper in connection.execute_wrappers
+            if not isinstance(wrapper, DatabaseTimer)
+        ]
+        timer = DatabaseTimer()
+        connection.execute_wrappers.append(timer)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        except Exception:
+            self.detach(timer)
+            raise
+
+        def finish(size):
+            self.detach(timer)
+            duration = time.perf_counter() - started
+            record(get_view_name(request), request.method,
+                   response.status_code,
+                   (duration, timer.duration, timer.queries, size))
+
+        if response.streaming:
+            response.streaming_content = self.count_bytes(
+                response.streaming_content, finish
+            )
+        else:
+            finish(len(response.content))
+        return response
+
+    @staticmethod
+    def detach(timer):
+        if timer in connection.execute_wrappers:
+            connection.execute_wrappers.remove(timer)
+
+    @staticmethod
+    def count_bytes(chunks, finish):
+        size = 0
+        try:
+            for chunk in chunks:
+                size += len(chunk)
+                yield chunk
+        finally:
+            finish(size)
@@ -1,4 +1,8 @@
-from rest_framework import mixins, viewsets
+from rest_framework import mixins, status, viewsets
+from rest_framework.response import Response
+
+from .cache import get_cached_page, page_cache_key, set_cached_page
+from .snapshots import get_snapshot
 
 
 class ListRetrieveViewSet(mixins.RetrieveModelMixin,
@@ -11,3 +15,48 @@ class ListRetrieveViewSet(mixins.RetrieveModelMixin,
 class ListViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
     """List and retrieve view set."""
     pass
+
+
+class SnapshotListMixin:
+    """List из заранее сериализованного снимка всего queryset,
+    снимок пересоздается при изменении версии snapshot_name."""
+    snapshot_name = None
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
+        snapshot = get_snapshot(
+            self.snapshot_name,
+            lambda: self.get_serializer(queryset, many=True).data,
+            queryset
+        )
+        return snapshot.response(request)
+
+
+class AnonymousPageCacheMixin:
+    """Кеширование ответов list и retrieve для анонимных пользователей,
+    ответ которых не зависит от пользователя. Страницы сбрасываются
+    увеличением версии page_cache_name."""
+    page_cache_name = None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def cached_response(self, method, request, *args, **kwargs):
+        if not request.user.is_anonymous:
+            return method(request, *args, **kwargs)
+        key = page_cache_key(request, self.page_cache_name)
+        data = get_cached_page(key)
+        if data is not None:
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+        response = method(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            set_cached_page(key, response.data)
+        response['X-Cache'] = 'MISS'
+        return response
@@ -1,8 +1,202 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import binascii
+import datetime
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from recipes.models import FeedEntry
+
+
+class KeysetPagination(BasePagination):
+    """Курсорный (keyset) пагинатор.
+
+    Курсор хранит значения полей упорядочивания последнего объекта
+    страницы, следующая страница выбирается условием по этим полям,
+    без OFFSET и COUNT(*). Упорядочивание берется из queryset
+    и дополняется первичным ключом для однозначности."""
+    page_size = 10
+    page_size_query_param = 'limit'
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.model = queryset.model
+        self.annotations = queryset.query.annotations
+        self.ordering = self.get_ordering(queryset)
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self.get_position_filter(position))
+
+        page_size = self.get_page_size(request)
+        results = list(queryset[:page_size + 1])
+        self.has_next = len(results) > page_size
+        self.page = results[:page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    @staticmethod
+    def get_ordering(queryset):
+        """Поля упорядочивания queryset, последним всегда идет pk."""
+        ordering = list(queryset.query.order_by
+                        or queryset.model._meta.ordering)
+        if not ordering or ordering[-1].lstrip('-') not in ('id', 'pk'):
+            descending = bool(ordering) and ordering[0].startswith('-')
+            ordering.append('-pk' if descending else 'pk')
+        return ordering
+
+    def get_position_filter(self, position):
+        """Условие «строго после позиции» для лексикографического порядка.
+        Первое поле дополнительно ограничено нестрогим неравенством,
+        чтобы база могла выполнить один диапазонный проход по индексу."""
+        lookups = [
+            (field.lstrip('-'), 'lt' if field.startswith('-') else 'gt')
+            for field in self.ordering
+        ]
+        after = Q()
+        for index, (field, lookup) in enumerate(lookups):
+            condition = Q(**{f'{field}__{lookup}': position[index]})
+            for previous, (equal_field, _) in enumerate(lookups[:index]):
+                condition &= Q(**{equal_field: position[previous]})
+            after |= condition
+        first_field, first_lookup = lookups[0]
+        return Q(**{f'{first_field}__{first_lookup}e': position[0]}) & after
+
+    def decode_cursor(self, request):
+        """Позиция из курсора, None для первой страницы."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+        except (TypeError, ValueError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if (not isinstance(position, list)
+                or len(position) != len(self.ordering)):
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            position = [
+                self.get_field(field).to_python(value)
+                for field, value in zip(self.ordering, position)
+            ]
+        except (ValidationError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if None in position:
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def get_field(self, name):
+        """Поле модели или аннотации, по которому упорядочен queryset,
+        для приведения значения из курсора к его типу."""
+        name = name.lstrip('-')
+        if name in self.annotations:
+            return self.annotations[name].output_field
+        model, field = self.model, None
+        for part in name.split('__'):
+            if field is not None:
+                model = field.related_model
+            field = (model._meta.pk if part == 'pk'
+                     else model._meta.get_field(part))
+        return field.target_field if field.is_relation else field
+
+    def encode_cursor(self, obj):
+        """Курсор на позицию объекта obj."""
+        position = []
+        for field in self.ordering:
+            value = obj
+            for attr in field.lstrip('-').split('__'):
+                value = getattr(value, attr)
+            position.append(value)
+        data = json.dumps(position, default=self.encode_value)
+        return base64.urlsafe_b64encode(data.encode()).decode()
+
+    @staticmethod
+    def encode_value(value):
+        """Сериализация значений, которые не поддерживает json.
+        Дата сохраняется с микросекундами, иначе теряется позиция
+        среди рецептов, опубликованных в одну миллисекунду."""
+        if isinstance(value, (datetime.date, datetime.time)):
+            return value.isoformat()
+        return str(value)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.page[-1])
+        )
+
+
+class FeedPagination(KeysetPagination):
+    """Курсорный пагинатор ленты подписок. Страница выбирается
+    функцией get_feed по позиции (pub_date, recipe_id) из курсора
+    и состоит из id рецептов."""
+    feed_ordering = ('-pub_date', '-recipe_id')
+
+    def paginate_feed(self, get_feed, request):
+        self.request = request
+        self.model = FeedEntry
+        self.annotations = {}
+        self.ordering = self.feed_ordering
+        position = self.decode_cursor(request)
+        page_size = self.get_page_size(request)
+        items = get_feed(position, page_size + 1)
+        self.has_next = len(items) > page_size
+        self.page = items[:page_size]
+        return [item.recipe_id for item in self.page]
 
 
 class RecipePagination(PageNumberPagination):
-    """Пагинатор для рецептов."""
+    """Пагинатор для рецептов.
+
+    По умолчанию постраничный, при наличии параметра cursor
+    (пустого для первой страницы) переключается на KeysetPagination."""
+    page_size = 10
+    page_size_query_param = 'limit'
+    max_page_size = 1000
+    keyset_pagination_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        cursor_query_param = self.keyset_pagination_class.cursor_query_param
+        if cursor_query_param in request.query_params:
+            self.keyset = self.keyset_pagination_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class CookableRecipePagination(PageNumberPagination):
+    """Пагинатор для рецептов, подобранных по ингредиентам."""
     page_size = 10
     page_size_query_param = 'limit'
     max_page_size = 1000
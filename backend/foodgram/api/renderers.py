@@ -0,0 +1,65 @@
+import csv
+import json
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class ShoppingCartTextRenderer(BaseRenderer):
+    """Список покупок в виде текстового файла.
+
+    Сам список отдается потоком через stream, render используется
+    DRF только для ответов с ошибками."""
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if isinstance(data, dict):
+            data = '\n'.join(f'{key}: {value}' for key, value in data.items())
+        return str(data).encode(self.charset)
+
+    @staticmethod
+    def stream(ingredients):
+        """Построчная выдача списка из кортежей (имя, единица, количество)."""
+        yield 'Ваш список покупок \n\n'
+        for number, (name, unit, amount) in enumerate(ingredients, 1):
+            yield f'{number}) {name} ({unit}) — {amount}\n'
+
+
+class Echo:
+    """Объект с интерфейсом файла, возвращающий записанную строку."""
+
+    @staticmethod
+    def write(value):
+        return value
+
+
+class ShoppingCartCSVRenderer(ShoppingCartTextRenderer):
+    """Список покупок в виде csv файла."""
+    media_type = 'text/csv'
+    format = 'csv'
+
+    @staticmethod
+    def stream(ingredients):
+        writer = csv.writer(Echo())
+        yield writer.writerow(('name', 'measurement_unit', 'amount'))
+        for row in ingredients:
+            yield writer.writerow(row)
+
+
+class ShoppingCartJSONRenderer(JSONRenderer):
+    """Список покупок в виде json массива."""
+    charset = 'utf-8'
+
+    @staticmethod
+    def stream(ingredients):
+        yield '['
+        for number, (name, unit, amount) in enumerate(ingredients):
+            item = json.dumps(
+                {'name': name, 'measurement_unit': unit, 'amount': amount},
+                ensure_ascii=False
+            )
+            yield f',{item}' if number else item
+        yield ']'
@@ -1,11 +1,21 @@
+from collections import OrderedDict, defaultdict
+
+from django.db import models, transaction
+from django.db.models import F, Prefetch, Window, prefetch_related_objects
+from django.db.models.functions import RowNumber
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import serializers
 
+from recipes import minhash, shopping_list
 from recipes.models import (
     Favorite, Ingredient, IngredientAmount, Recipe,
     Subscription, ShoppingCart, Tag, User,
 )
+from .cache import get_recipe_fragments, set_recipe_fragments
 from .fields import Base64ImageField
+from .ingredient_index import update_recipe_index
+from .similarity import update_similarity_index
+from .loaders import RelationLoaderListSerializer, is_related
 
 
 class UserRegistrationSerializer(UserCreateSerializer):
@@ -21,13 +31,25 @@ class CustomUserSerializer(UserSerializer):
     """Сериализатор отображения пользователя."""
     is_subscribed = serializers.SerializerMethodField()
 
+    loader_relations = ((Subscription, 'id'),)
+
     class Meta(UserSerializer.Meta):
         fields = ('email', 'id', 'username',
-                  'first_name', 'last_name', 'is_subscribed')
+                  'first_name', 'last_name', 'is_subscribed', 'recipes_count')
+        read_only_fields = ('recipes_count',)
+        list_serializer_class = RelationLoaderListSerializer
 
     def get_is_subscribed(self, obj):
         """Возвращает истину если подписан на автора, иначе ложь."""
-        return is_obj_follow_author(self, obj, Subscription)
+        return is_obj_follow_author(self, obj, Subscription, 'is_subscribed')
+
+
+class AuthorSerializer(UserSerializer):
+    """Сериализатор автора рецепта без полей,
+    зависящих от текущего пользователя."""
+
+    class Meta(UserSerializer.Meta):
+        fields = ('email', 'id', 'username', 'first_name', 'last_name')
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -68,6 +90,29 @@ class RecipeShortSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'image', 'cooking_time')
 
 
+class CookableRecipeSerializer(RecipeShortSerializer):
+    """Сериализатор рецепта, подобранного по имеющимся ингредиентам.
+    Покрытие и недостающие ингредиенты вычисляются во view."""
+    covered_ingredients = serializers.IntegerField(read_only=True)
+    total_ingredients = serializers.IntegerField(read_only=True)
+    missing_ingredients = IngredientAmountSerializer(
+        many=True, read_only=True
+    )
+
+    class Meta(RecipeShortSerializer.Meta):
+        fields = RecipeShortSerializer.Meta.fields + (
+            'covered_ingredients', 'total_ingredients', 'missing_ingredients'
+        )
+
+
+class SimilarRecipeSerializer(RecipeShortSerializer):
+    """Сериализатор похожего рецепта с оценкой сходства ингредиентов."""
+    similarity = serializers.FloatField(read_only=True)
+
+    class Meta(RecipeShortSerializer.Meta):
+        fields = RecipeShortSerializer.Meta.fields + ('similarity',)
+
+
 class FavoriteSerializer(serializers.ModelSerializer):
     """Сериализатор для избранных рецептов."""
 
@@ -98,35 +143,130 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
             instance.recipe, context=context).data
 
 
-class RecipeSerializer(serializers.ModelSerializer):
-    """Сериализатор для рецептов."""
+class RecipeFragmentSerializer(serializers.ModelSerializer):
+    """Сериализатор части рецепта, не зависящей от пользователя,
+    его результат кешируется для каждого рецепта."""
     tags = TagSerializer(many=True, read_only=True)
-    author = CustomUserSerializer(read_only=True)
+    author = AuthorSerializer(read_only=True)
     ingredients = serializers.SerializerMethodField(read_only=True)
     image = Base64ImageField()
+
+    class Meta:
+        model = Recipe
+        fields = ('id', 'tags', 'author', 'ingredients', 'name', 'image',
+                  'text', 'cooking_time', 'favorites_count')
+
+    @staticmethod
+    def get_ingredients(obj):
+        """Переопределение сериализации поля ингредиенты рецепта,
+        используются предзагруженные ингредиенты."""
+        return IngredientAmountSerializer(
+            obj.ingredientamount_set.all(), many=True
+        ).data
+
+
+class RecipeListSerializer(RelationLoaderListSerializer):
+    """Сериализатор списка рецептов, собирает все рецепты страницы
+    за одно обращение к кешу фрагментов."""
+
+    def represent(self, instances):
+        return self.child.represent(instances)
+
+
+class RecipeSerializer(RecipeFragmentSerializer):
+    """Сериализатор для рецептов.
+
+    Представление собирается из кешируемого фрагмента
+    RecipeFragmentSerializer и флагов текущего пользователя."""
+    author = CustomUserSerializer(read_only=True)
     is_favorited = serializers.SerializerMethodField(read_only=True)
     is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
+    loader_relations = (
+        (Favorite, 'id'),
+        (ShoppingCart, 'id'),
+        (Subscription, 'author_id'),
+    )
+    prefetch = (
+        'author',
+        Prefetch('tags', queryset=Tag.objects.all()),
+        Prefetch(
+            'ingredientamount_set',
+            queryset=IngredientAmount.objects.select_related('ingredient')
+        ),
+    )
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
                   'is_in_shopping_cart', 'name', 'image', 'text',
-                  'cooking_time')
+                  'cooking_time', 'favorites_count')
+        list_serializer_class = RecipeListSerializer
+
+    def to_representation(self, instance):
+        return self.represent([instance])[0]
+
+    def represent(self, recipes):
+        """Представления рецептов: фрагменты берутся из кеша,
+        для отсутствующих связи загружаются одним запросом на связь."""
+        request = self.context.get('request')
+        fragments, keys = get_recipe_fragments(
+            [recipe.id for recipe in recipes], request
+        )
+        missing = [recipe for recipe in recipes
+                   if recipe.id not in fragments]
+        if missing:
+            prefetch_related_objects(missing, *self.prefetch)
+            created = {
+                fragment['id']: fragment
+                for fragment in RecipeFragmentSerializer(
+                    missing, many=True, context=self.context
+                ).data
+            }
+            set_recipe_fragments(created, keys)
+            fragments.update(created)
+
+        return [self.overlay(fragments[recipe.id], recipe)
+                for recipe in recipes]
+
+    def overlay(self, fragment, recipe):
+        """Дополнение фрагмента флагами текущего пользователя."""
+        author = OrderedDict(fragment['author'])
+        author['is_subscribed'] = self.get_is_author_subscribed(recipe)
+        user_fields = {
+            'author': author,
+            'is_favorited': self.get_is_favorited(recipe),
+            'is_in_shopping_cart': self.get_is_in_shopping_cart(recipe),
+        }
+        return OrderedDict(
+            (field, user_fields[field] if field in user_fields
+             else fragment[field])
+            for field in self.Meta.fields
+        )
+
+    def get_is_author_subscribed(self, obj):
+        """Возвращает истину если подписан на автора рецепта, иначе ложь.
+        Используется аннотация is_author_subscribed из RecipeViewSet,
+        если ее нет — загрузчик связей запроса."""
+        if hasattr(obj, 'is_author_subscribed'):
+            return obj.is_author_subscribed
+        return is_related(self.context, Subscription, obj.author_id)
 
     def get_is_favorited(self, obj):
         """Возвращает истину если рецепт в избранном, иначе ложь."""
-        return is_obj_follow_recipe(self, obj, Favorite)
+        return is_obj_follow_recipe(self, obj, Favorite, 'is_favorited')
 
     def get_is_in_shopping_cart(self, obj):
         """Возвращает истину если рецепт в списке покупок, иначе ложь."""
-        return is_obj_follow_recipe(self, obj, ShoppingCart)
+        return is_obj_follow_recipe(
+            self, obj, ShoppingCart, 'is_in_shopping_cart'
+        )
 
     def validate(self, data):
-        """Валидация рецепта."""
+        """Валидация рецепта, существование ингредиентов и тегов
+        проверяется одним запросом для каждой модели."""
         ingredients = self.initial_data.get('ingredients')
         tags = self.initial_data.get('tags')
-        ingredients_set = set()
-        tags_obj = list()
+        amounts = dict()
 
         if ingredients is None:
             raise serializers.ValidationError({
@@ -161,139 +301,258 @@ class RecipeSerializer(serializers.ModelSerializer):
                         'Количество ингредиента должно быть меньше 10000'
                     ]
                 })
-            ingredient_id = ingredient.get('id')
-            if not Ingredient.objects.filter(id=ingredient_id).exists():
+            ingredient_id = to_int_or_none(ingredient.get('id'))
+            if ingredient_id is None:
                 raise serializers.ValidationError({
                     'ingredients_id': ['Ингредиент не существует']
                 })
-            if ingredient_id in ingredients_set:
+            if ingredient_id in amounts:
                 raise serializers.ValidationError({
                     'ingredients_id': [
                         'Ингредиент в рецепте не должен повторяться'
                     ]
                 })
-            ingredients_set.add(ingredient_id)
+            amounts[ingredient_id] = int(amount)
 
-        for tag in tags:
-            if tag in tags_obj:
-                raise serializers.ValidationError({
-                    'tags': [
-                        'Тэг в рецепте не должен повторяться'
-                    ]
-                })
-            if not Tag.objects.filter(id=tag).exists():
-                raise serializers.ValidationError({
-                    'tags': ['Тег не существует']
-                })
-            tags_obj.append(Tag.objects.get(id=tag))
+        if Ingredient.objects.filter(
+                id__in=amounts).count() != len(amounts):
+            raise serializers.ValidationError({
+                'ingredients_id': ['Ингредиент не существует']
+            })
 
-        data['ingredients'] = ingredients
+        tag_ids = [to_int_or_none(tag) for tag in tags]
+        if len(set(tag_ids)) != len(tag_ids):
+            raise serializers.ValidationError({
+                'tags': [
+                    'Тэг в рецепте не должен повторяться'
+                ]
+            })
+        tags_obj = list(Tag.objects.filter(id__in=tag_ids))
+        if len(tags_obj) != len(tag_ids):
+            raise serializers.ValidationError({
+                'tags': ['Тег не существует']
+            })
+
+        data['ingredients'] = amounts
         data['tags'] = tags_obj
 
         return data
 
+    @transaction.atomic
     def create(self, validated_data):
         """Переопределение создания рецепта."""
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
+        signature = minhash.signature(ingredients)
         recipe = Recipe.objects.create(
             author=self.context.get('request').user,
+            minhash=minhash.to_bytes(signature),
             **validated_data
         )
         recipe.tags.add(*tags)
         self.create_ingredient_amount(recipe, ingredients)
+        transaction.on_commit(
+            lambda: update_recipe_index(recipe.id, (), ingredients)
+        )
+        transaction.on_commit(
+            lambda: update_similarity_index(recipe.id, signature)
+        )
 
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        """Переопределение обновления рецепта."""
-        instance.tags.clear()
-        tags = self.initial_data.get('tags')
-        instance.tags.add(*tags)
-
-        IngredientAmount.objects.filter(recipe=instance).delete()
-        self.create_ingredient_amount(
-            instance,
-            validated_data.get('ingredients')
+        """Переопределение обновления рецепта, изменяются только
+        отличающиеся теги и ингредиенты, изменение ингредиентов
+        переносится в списки покупок. Сохраняются только редактируемые
+        поля: счетчики и рейтинг обновляются параллельно через F()."""
+        instance.tags.set(validated_data.get('tags'))
+        update_fields = ['name', 'text', 'cooking_time']
+
+        amounts = validated_data.get('ingredients')
+        old_amounts = self.update_ingredient_amount(instance, amounts)
+        shopping_list.change_recipe(instance.id, old_amounts, amounts)
+        transaction.on_commit(
+            lambda: update_recipe_index(instance.id, old_amounts, amounts)
         )
+        if set(old_amounts) != set(amounts):
+            signature = minhash.signature(amounts)
+            instance.minhash = minhash.to_bytes(signature)
+            update_fields.append('minhash')
+            transaction.on_commit(
+                lambda: update_similarity_index(instance.id, signature)
+            )
 
         instance.name = validated_data.get('name')
         instance.text = validated_data.get('text')
         instance.cooking_time = validated_data.get('cooking_time')
         if validated_data.get('image') is not None:
             instance.image = validated_data.get('image')
-        instance.save()
+            update_fields.append('image')
+        instance.save(update_fields=update_fields)
 
         return instance
 
     @staticmethod
-    def get_ingredients(obj):
-        """Переопределение сериализации поля ингредиенты рецепта."""
-        queryset = IngredientAmount.objects.filter(recipe=obj)
-        return IngredientAmountSerializer(queryset, many=True).data
+    def create_ingredient_amount(instance, amounts):
+        """Создание элементов в промежуточной таблице ингредиенты-рецепт
+        одним запросом."""
+        IngredientAmount.objects.bulk_create(
+            IngredientAmount(recipe=instance, ingredient_id=ingredient_id,
+                             amount=amount)
+            for ingredient_id, amount in amounts.items()
+        )
+
+    def update_ingredient_amount(self, instance, amounts):
+        """Приведение ингредиентов рецепта к amounts
+        ({ingredient_id: amount}), затрагиваются только изменившиеся
+        строки. Возвращает прежние количества."""
+        existing = {
+            ingredient_amount.ingredient_id: ingredient_amount
+            for ingredient_amount in instance.ingredientamount_set.all()
+        }
+        old_amounts = {ingredient_id: ingredient_amount.amount
+                       for ingredient_id, ingredient_amount
+                       in existing.items()}
+
+        removed = [ingredient_amount.id
+                   for ingredient_id, ingredient_amount in existing.items()
+                   if ingredient_id not in amounts]
+        if removed:
+            IngredientAmount.objects.filter(id__in=removed).delete()
+
+        changed = []
+        for ingredient_id, amount in amounts.items():
+            ingredient_amount = existing.get(ingredient_id)
+            if ingredient_amount is not None and (
+                    ingredient_amount.amount != amount):
+                ingredient_amount.amount = amount
+                changed.append(ingredient_amount)
+        if changed:
+            IngredientAmount.objects.bulk_update(changed, ('amount',))
+
+        self.create_ingredient_amount(instance, {
+            ingredient_id: amount for ingredient_id, amount in amounts.items()
+            if ingredient_id not in existing
+        })
+        return old_amounts
+
+
+class SubscriptionListSerializer(serializers.ListSerializer):
+    """Сериализатор списка подписок, рецепты всех авторов страницы
+    загружаются одним запросом."""
+
+    def to_representation(self, data):
+        authors = list(
+            data.all() if isinstance(data, models.Manager) else data
+        )
+        recipes = self.get_latest_recipes(
+            [author.id for author in authors],
+            self.child.get_recipes_limit()
+        )
+        for author in authors:
+            author.latest_recipes = recipes[author.id]
+        return super().to_representation(authors)
 
     @staticmethod
-    def create_ingredient_amount(instance, data):
-        """Создание элементов в промежуточной таблице ингредиенты-рецепт."""
-        for ingredient in data:
-            IngredientAmount.objects.create(
-                recipe=instance,
-                ingredient_id=ingredient.get('id'),
-                amount=ingredient.get('amount'),
+    def get_latest_recipes(author_ids, limit=None):
+        """Последние limit рецептов каждого автора в виде
+        {author_id: [рецепты]}. Ограничение применяется оконной функцией
+        ROW_NUMBER() OVER (PARTITION BY author) во вложенном запросе."""
+        result = defaultdict(list)
+        recipes = Recipe.objects.filter(author_id__in=author_ids)
+        if limit is not None:
+            ranked = recipes.annotate(row_number=Window(
+                expression=RowNumber(),
+                partition_by=(F('author_id'),),
+                order_by=(F('pub_date').desc(), F('id').desc()),
+            )).values(
+                'id', 'name', 'image', 'cooking_time', 'author_id',
+                'pub_date', 'row_number'
             )
+            sql, params = ranked.query.sql_with_params()
+            recipes = Recipe.objects.raw(
+                f'SELECT * FROM ({sql}) ranked WHERE row_number <= %s '
+                f'ORDER BY pub_date DESC, id DESC',
+                (*params, limit)
+            )
+        for recipe in recipes:
+            result[recipe.author_id].append(recipe)
+        return result
 
 
 class SubscriptionSerializer(serializers.ModelSerializer):
-    """Сериализатор для подписок на пользователей."""
+    """Сериализатор для подписок на пользователей.
+    Используется только для авторов, на которых подписан пользователь."""
     is_subscribed = serializers.SerializerMethodField(read_only=True)
     recipes = serializers.SerializerMethodField(read_only=True)
-    recipes_count = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
         model = User
         fields = ('email', 'id', 'username', 'first_name', 'last_name',
                   'is_subscribed', 'recipes', 'recipes_count')
+        read_only_fields = ('recipes_count',)
+        list_serializer_class = SubscriptionListSerializer
 
-    def get_is_subscribed(self, obj):
-        """Возвращает истину если подписан на автора, иначе ложь."""
-        return is_obj_follow_author(self, obj, Subscription)
+    @staticmethod
+    def get_is_subscribed(obj):
+        """Подписка на автора уже известна, запрос не нужен."""
+        return True
 
     def get_recipes(self, obj):
         """Переопределение представления списка рецептов
         с ограничением выдачи."""
         request = self.context.get('request')
-        recipes_limit = request.query_params.get('recipes_limit')
-        recipes = obj.recipes.all()
+        recipes = getattr(obj, 'latest_recipes', None)
+        if recipes is None:
+            recipes = obj.recipes.all()
+            recipes_limit = self.get_recipes_limit()
+            if recipes_limit is not None:
+                recipes = recipes[:recipes_limit]
         context = {'request': request}
-        if recipes_limit is not None:
-            recipes = recipes[:int(recipes_limit)]
         return RecipeShortSerializer(
             instance=recipes, many=True, context=context
         ).data
 
-    @staticmethod
-    def get_recipes_count(obj):
-        """Возвращает количество рецептов пользователя."""
-        return obj.recipes.count()
+    def get_recipes_limit(self):
+        """Проверенный параметр recipes_limit, None если не задан."""
+        request = self.context.get('request')
+        recipes_limit = request.query_params.get('recipes_limit')
+        if recipes_limit is None:
+            return None
+        recipes_limit = to_int_or_none(recipes_limit)
+        if recipes_limit is None or recipes_limit < 0:
+            raise serializers.ValidationError({
+                'recipes_limit': [
+                    'recipes_limit должен быть неотрицательным числом'
+                ]
+            })
+        return recipes_limit
 
 
-def is_obj_follow_author(instance, obj, obj_class):
+def is_obj_follow_author(instance, obj, obj_class, annotation=None):
     """Проверка что есть подписка на автора,
-    ложь если не авторизованный пользователь."""
-    request = instance.context.get('request')
-    return (request is not None
-            and not request.user.is_anonymous
-            and obj_class.objects.filter(
-                user=instance.context.get('request').user, author=obj
-            ).exists())
+    ложь если не авторизованный пользователь.
+    Если автор аннотирован флагом annotation, запрос не выполняется,
+    иначе используется загрузчик связей запроса."""
+    if annotation is not None and hasattr(obj, annotation):
+        return getattr(obj, annotation)
+    return is_related(instance.context, obj_class, obj.pk)
 
 
-def is_obj_follow_recipe(instance, obj, obj_class):
+def is_obj_follow_recipe(instance, obj, obj_class, annotation=None):
     """Проверка что рецепт в избранном,
-    ложь если не авторизованный пользователь."""
-    request = instance.context.get('request')
-    return (request is not None
-            and not request.user.is_anonymous
-            and obj_class.objects.filter(
-                user=instance.context.get('request').user, recipe=obj
-            ).exists())
+    ложь если не авторизованный пользователь.
+    Если рецепт аннотирован флагом annotation, запрос не выполняется,
+    иначе используется загрузчик связей запроса."""
+    if annotation is not None and hasattr(obj, annotation):
+        return getattr(obj, annotation)
+    return is_related(instance.context, obj_class, obj.pk)
+
+
+def to_int_or_none(value):
+    """Приведение id из запроса к числу, None если это невозможно."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,140 @@
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_save
+)
+from django.dispatch import receiver
+
+from recipes.models import Favorite, Ingredient, Recipe, Tag, User
+from .cache import (
+    FRAGMENTS_VERSION, RECIPES_VERSION, bump_version,
+    invalidate_recipe_fragment, invalidate_pages
+)
+from .catalog import CATALOG_VERSION
+from .ingredient_index import (
+    invalidate_ingredient_index, remove_recipe_index
+)
+from .similarity import (
+    invalidate_similarity_index, update_similarity_index
+)
+from .snapshots import TAGS_VERSION
+
+# Поля пользователя, которые выводятся в рецептах как данные автора.
+AUTHOR_FIELDS = ('email', 'username', 'first_name', 'last_name')
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredient_catalog(sender, **kwargs):
+    """Сброс каталога ингредиентов во всех процессах."""
+    bump_version(CATALOG_VERSION)
+    invalidate_recipe_pages()
+    invalidate_recipe_fragments()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tags(sender, **kwargs):
+    """Сброс снимка списка тегов."""
+    bump_version(TAGS_VERSION)
+    invalidate_recipe_pages()
+    invalidate_recipe_fragments()
+
+
+def invalidate_recipe_pages():
+    """Сброс кеша страниц рецептов после фиксации транзакции,
+    иначе параллельный запрос может закешировать старые данные
+    под новой версией."""
+    transaction.on_commit(lambda: invalidate_pages(RECIPES_VERSION))
+
+
+def invalidate_recipe_fragments(*recipe_ids):
+    """Сброс фрагментов рецептов recipe_ids после фиксации транзакции,
+    без аргументов сбрасываются фрагменты всех рецептов."""
+    def invalidate():
+        if not recipe_ids:
+            bump_version(FRAGMENTS_VERSION)
+        for recipe_id in recipe_ids:
+            invalidate_recipe_fragment(recipe_id)
+
+    transaction.on_commit(invalidate)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipes(sender, instance, **kwargs):
+    """Сброс кеша страниц и фрагмента при создании,
+    изменении и удалении рецепта."""
+    invalidate_recipe_pages()
+    invalidate_recipe_fragments(instance.id)
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_recipe_from_indexes(sender, instance, **kwargs):
+    """Удаление рецепта из индексов ингредиентов и похожих рецептов."""
+    recipe_id = instance.id
+    transaction.on_commit(lambda: remove_recipe_index(recipe_id))
+    transaction.on_commit(lambda: update_similarity_index(recipe_id, None))
+
+
+@receiver(post_delete, sender=Ingredient)
+def invalidate_recipe_ingredients(sender, **kwargs):
+    """Перестройка индексов ингредиентов и похожих рецептов после
+    удаления ингредиента, связи с которым удаляются каскадно."""
+    transaction.on_commit(invalidate_ingredient_index)
+    transaction.on_commit(invalidate_similarity_index)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+def invalidate_favorites_count(sender, instance, **kwargs):
+    """Сброс фрагмента рецепта при изменении счетчика избранного,
+    кеш страниц для анонимов обновится по истечении таймаута."""
+    invalidate_recipe_fragments(instance.recipe_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    """Сброс кеша страниц и фрагментов при изменении тегов рецепта."""
+    if not action.startswith('post_'):
+        return
+    invalidate_recipe_pages()
+    if not reverse:
+        invalidate_recipe_fragments(instance.id)
+    elif pk_set:
+        invalidate_recipe_fragments(*pk_set)
+    else:
+        invalidate_recipe_fragments()
+
+
+@receiver(pre_save, sender=User)
+def remember_author_changes(sender, instance, update_fields=None, **kwargs):
+    """Проверка до сохранения, меняются ли выводимые в рецептах
+    данные автора. Сохранение без этих полей в update_fields не
+    требует запроса к базе."""
+    instance._author_changed = False
+    if instance._state.adding or (
+        update_fields is not None
+        and not set(update_fields) & set(AUTHOR_FIELDS)
+    ):
+        return
+    stored = sender.objects.filter(pk=instance.pk).values(
+        *AUTHOR_FIELDS
+    ).first()
+    instance._author_changed = stored is not None and any(
+        stored[field] != getattr(instance, field) for field in AUTHOR_FIELDS
+    )
+
+
+@receiver(post_save, sender=User)
+def invalidate_authors(sender, instance, created, **kwargs):
+    """Сброс кеша страниц и фрагментов рецептов автора при изменении
+    выводимых в них данных автора."""
+    if created or not getattr(instance, '_author_changed', False):
+        return
+    recipe_ids = list(
+        Recipe.objects.filter(author=instance).values_list('id', flat=True)
+    )
+    if recipe_ids:
+        invalidate_recipe_pages()
+        invalidate_recipe_fragments(*recipe_ids)
@@ -0,0 +1,100 @@
+from collections import defaultdict
+
+from recipes import minhash
+from recipes.models import Recipe
+from .cache import ProcessIndex
+
+SIMILARITY_VERSION = 'similarity'
+BANDS = 16
+
+
+class SimilarityIndex:
+    """LSH индекс MinHash подписей рецептов в памяти процесса.
+
+    Подпись делится на bands полос, рецепты с
+    совпадающей полосой попадают в одну корзину. Кандидаты в похожие —
+    рецепты из общих корзин, они упорядочиваются по оценке
+    коэффициента Жаккара по подписям. При 16 полосах по 4 значения
+    рецепт с Жаккаром 0.5 становится кандидатом с вероятностью 0.65,
+    с Жаккаром 0.7 — 0.99."""
+
+    def __init__(self, rows=(), bands=BANDS):
+        self.bands_count = bands
+        self.rows = minhash.NUM_PERMUTATIONS // bands
+        self.signatures = {}
+        self.buckets = defaultdict(list)
+        for recipe_id, data in rows:
+            self.add(recipe_id, minhash.from_bytes(data))
+
+    def bands(self, signature):
+        rows = self.rows
+        for band in range(self.bands_count):
+            yield band, tuple(signature[band * rows:(band + 1) * rows])
+
+    def add(self, recipe_id, signature):
+        self.signatures[recipe_id] = signature
+        for key in self.bands(signature):
+            self.buckets[key].append(recipe_id)
+
+    def remove(self, recipe_id):
+        signature = self.signatures.pop(recipe_id, None)
+        if signature is None:
+            return
+        for key in self.bands(signature):
+            bucket = self.buckets[key]
+            bucket.remove(recipe_id)
+            if not bucket:
+                del self.buckets[key]
+
+    def similar(self, recipe_id, limit):
+        """До limit пар (recipe_id, оценка сходства) для рецепта,
+        сначала наиболее похожие, при равенстве — более новые."""
+        signature = self.signatures.get(recipe_id)
+        if signature is None:
+            return []
+        candidates = set()
+        for key in self.bands(signature):
+            candidates.update(self.buckets.get(key, ()))
+        candidates.discard(recipe_id)
+        scores = sorted(
+            ((candidate, minhash.similarity(
+                signature, self.signatures[candidate]))
+             for candidate in candidates),
+            key=lambda score: (-score[1], -score[0])
+        )
+        return scores[:limit]
+
+
+def build_index():
+    return SimilarityIndex(
+        Recipe.objects.filter(minhash__isnull=False).values_list(
+            'id', 'minhash'
+        ).iterator()
+    )
+
+
+def apply_change(index, change):
+    recipe_id, data = change
+    index.remove(recipe_id)
+    if data is not None:
+        index.add(recipe_id, minhash.from_bytes(data))
+
+
+_index = ProcessIndex(SIMILARITY_VERSION, build_index, apply_change)
+
+
+def get_similarity_index():
+    """Индекс процесса, строится из подписей рецептов при первом
+    обращении, изменения других процессов применяются из журнала."""
+    return _index.get()
+
+
+def update_similarity_index(recipe_id, signature):
+    """Замена полос подписи рецепта в индексах всех процессов без
+    перестройки, None удаляет рецепт из индексов."""
+    _index.update((recipe_id, minhash.to_bytes(signature)))
+
+
+def invalidate_similarity_index():
+    """Перестройка индекса во всех процессах."""
+    _index.invalidate()
@@ -0,0 +1,73 @@
+import gzip
+import hashlib
+import re
+
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+from rest_framework.renderers import JSONRenderer
+
+from .cache import get_data_version
+
+TAGS_VERSION = 'tags'
+SNAPSHOT_KEY = 'snapshot:{}:{}'
+ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+
+_snapshots = {}
+
+
+class Snapshot:
+    """Сериализованный в json список с gzip вариантом и ETag."""
+
+    def __init__(self, data):
+        self.body = JSONRenderer().render(data)
+        self.gzip_body = gzip.compress(self.body)
+        self.digest = hashlib.sha1(self.body).hexdigest()
+
+    def etag(self, gzipped):
+        """Строгий ETag, у сжатого варианта свой."""
+        return f'"{self.digest}-gzip"' if gzipped else f'"{self.digest}"'
+
+    def matches(self, request):
+        etags = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+        return '*' in etags or any(
+            etag in etags for etag in (self.etag(False), self.etag(True))
+        )
+
+    def response(self, request):
+        """Ответ со снимком, 304 если у клиента актуальная версия."""
+        gzipped = bool(ACCEPTS_GZIP.search(
+            request.META.get('HTTP_ACCEPT_ENCODING', '')
+        ))
+        if self.matches(request):
+            response = HttpResponseNotModified()
+        elif gzipped:
+            response = HttpResponse(
+                self.gzip_body, content_type='application/json'
+            )
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(self.body, content_type='application/json')
+        response['ETag'] = self.etag(gzipped)
+        response['Vary'] = 'Accept-Encoding'
+        return response
+
+
+def get_snapshot(name, build, queryset):
+    """Снимок набора данных name текущей версии. Снимок хранится
+    в памяти процесса и в общем кеше, build вызывается только если
+    снимка этой версии еще нет ни там, ни там. Версия учитывает
+    queryset так же, как каталог ингредиентов: без общего кеша
+    устаревший снимок со своим ETag отдавался бы клиентам
+    как актуальный."""
+    version = get_data_version(name, queryset)
+    local = _snapshots.get(name)
+    if local is not None and local[0] == version:
+        return local[1]
+    key = SNAPSHOT_KEY.format(name, version)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = Snapshot(build())
+        cache.set(key, snapshot, None)
+    _snapshots[name] = (version, snapshot)
+    return snapshot
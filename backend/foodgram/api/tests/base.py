@@ -0,0 +1,117 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.test import override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APITestCase
+
+from api.ingredient_index import _index as ingredient_index
+from api.similarity import _index as similarity_index
+from recipes.models import Ingredient, IngredientAmount, Recipe, Tag
+
+User = get_user_model()
+
+IMAGE = ('data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJ'
+         'AAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg==')
+
+
+class APIBaseTestCase(APITestCase):
+    """Пользователи, теги и ингредиенты для тестов API. Картинки
+    рецептов сохраняются во временную папку, метрики запросов не
+    записываются в общую папку METRICS_DIR."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_settings = override_settings(
+            MEDIA_ROOT=cls.media_root, METRICS_DIR=''
+        )
+        cls.media_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_settings.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(
+                email=f'user{index}@example.com', username=f'user{index}',
+                first_name='Имя', last_name='Фамилия', password='pass12345!'
+            ) for index in range(3)
+        ]
+        cls.tags = [
+            Tag.objects.create(name=name, color=color, slug=slug)
+            for name, color, slug in (('Завтрак', '#00FF00', 'breakfast'),
+                                      ('Обед', '#0000FF', 'lunch'))
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(name=f'ингредиент {index}',
+                                      measurement_unit='г')
+            for index in range(10)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        ingredient_index.reset()
+        similarity_index.reset()
+
+    def run_on_commit(self):
+        """Выполнение обработчиков on_commit сразу: транзакция теста
+        не фиксируется, а сброс кеша выполняется после фиксации."""
+        on_commit = mock.patch.object(
+            transaction, 'on_commit', side_effect=lambda function: function()
+        )
+        on_commit.start()
+        self.addCleanup(on_commit.stop)
+
+    def client_for(self, user):
+        client = APIClient()
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+    def recipe_data(self, ingredients, **data):
+        return {
+            'name': 'Рецепт',
+            'text': 'Описание',
+            'cooking_time': 10,
+            'image': IMAGE,
+            'tags': [self.tags[0].id],
+            'ingredients': [{'id': ingredient.id, 'amount': 10}
+                            for ingredient in ingredients],
+            **data,
+        }
+
+    def create_recipe(self, user, ingredients, **data):
+        response = self.client_for(user).post(
+            '/api/recipes/', self.recipe_data(ingredients, **data),
+            format='json'
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data['id']
+
+    @staticmethod
+    def make_recipe(author, ingredients=(), tags=(), name='Рецепт',
+                    **fields):
+        """Рецепт, созданный напрямую в базе. Поля pub_date
+        и favorites_count записываются после создания."""
+        recipe = Recipe.objects.create(
+            author=author, name=name, text='Описание', cooking_time=10,
+            image='recipes/placeholder.png'
+        )
+        IngredientAmount.objects.bulk_create(
+            IngredientAmount(recipe=recipe, ingredient=ingredient, amount=10)
+            for ingredient in ingredients
+        )
+        recipe.tags.set(tags)
+        if fields:
+            Recipe.objects.filter(pk=recipe.pk).update(**fields)
+        return recipe
@@ -0,0 +1,132 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.cache import (
+    FRAGMENTS_VERSION, RECIPE_VERSION, RECIPES_VERSION, get_version
+)
+from recipes.models import Ingredient, Tag
+
+from .base import APIBaseTestCase, User
+
+
+class AuthorInvalidationTests(APIBaseTestCase):
+    """Сброс кеша рецептов при изменении данных автора."""
+
+    def setUp(self):
+        super().setUp()
+        self.recipe_ids = [
+            self.create_recipe(user, self.ingredients[:2])
+            for user in self.users[:2]
+        ]
+        self.run_on_commit()
+
+    def get_versions(self):
+        return [get_version(FRAGMENTS_VERSION), get_version(RECIPES_VERSION),
+                *(get_version(RECIPE_VERSION.format(recipe_id))
+                  for recipe_id in self.recipe_ids)]
+
+    def test_author_change_invalidates_only_own_recipes(self):
+        before = self.get_versions()
+        author = User.objects.get(pk=self.users[0].pk)
+        author.first_name = 'Другое'
+        author.save()
+        after = self.get_versions()
+        self.assertEqual(after[0], before[0])
+        self.assertNotEqual(after[1], before[1])
+        self.assertNotEqual(after[2], before[2])
+        self.assertEqual(after[3], before[3])
+
+    def test_unrelated_saves_keep_cache(self):
+        before = self.get_versions()
+        author = User.objects.get(pk=self.users[0].pk)
+        author.save()
+        author.set_password('other12345!')
+        author.save(update_fields=['password'])
+        User.objects.create_user(
+            email='new@example.com', username='new', first_name='Имя',
+            last_name='Фамилия', password='pass12345!'
+        )
+        self.assertEqual(self.get_versions(), before)
+
+
+class PageCacheTests(APIBaseTestCase):
+    """Кеш страниц для анонимных пользователей и фрагменты рецептов."""
+
+    def setUp(self):
+        super().setUp()
+        self.run_on_commit()
+        self.author = self.users[0]
+        self.recipe_id = self.create_recipe(self.author, self.ingredients[:2])
+
+    def assert_cache(self, url, expected):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Cache'], expected)
+        return response.data
+
+    def test_hit_and_miss(self):
+        for url in ('/api/recipes/', f'/api/recipes/{self.recipe_id}/'):
+            with self.subTest(url=url):
+                self.assert_cache(url, 'MISS')
+                self.assert_cache(url, 'HIT')
+        self.assert_cache('/api/recipes/?limit=5', 'MISS')
+        response = self.client_for(self.author).get('/api/recipes/')
+        self.assertFalse(response.has_header('X-Cache'))
+
+    def test_query_order_shares_page(self):
+        self.assert_cache('/api/recipes/?tags=breakfast&tags=lunch', 'MISS')
+        self.assert_cache('/api/recipes/?tags=lunch&tags=breakfast', 'HIT')
+
+    def test_recipe_edit_invalidates(self):
+        detail = f'/api/recipes/{self.recipe_id}/'
+        self.assert_cache('/api/recipes/', 'MISS')
+        self.assert_cache(detail, 'MISS')
+        response = self.client_for(self.author).patch(
+            detail, self.recipe_data(self.ingredients[:2], name='Новое'),
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        data = self.assert_cache('/api/recipes/', 'MISS')
+        self.assertEqual(data['results'][0]['name'], 'Новое')
+        self.assertEqual(self.assert_cache(detail, 'MISS')['name'], 'Новое')
+
+    def test_recipe_delete_invalidates(self):
+        self.assert_cache('/api/recipes/', 'MISS')
+        response = self.client_for(self.author).delete(
+            f'/api/recipes/{self.recipe_id}/'
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.assert_cache('/api/recipes/', 'MISS')['count'],
+                         0)
+
+    def test_tag_edit_invalidates(self):
+        self.assert_cache('/api/recipes/', 'MISS')
+        tag = Tag.objects.get(pk=self.tags[0].pk)
+        tag.name = 'Полдник'
+        tag.save()
+        data = self.assert_cache('/api/recipes/', 'MISS')
+        self.assertEqual(data['results'][0]['tags'][0]['name'], 'Полдник')
+
+    def test_ingredient_edit_invalidates(self):
+        self.assert_cache('/api/recipes/', 'MISS')
+        ingredient = Ingredient.objects.get(pk=self.ingredients[0].pk)
+        ingredient.name = 'соль'
+        ingredient.save()
+        data = self.assert_cache('/api/recipes/', 'MISS')
+        self.assertIn('соль', [
+            item['name'] for item in data['results'][0]['ingredients']
+        ])
+
+    def test_fragments_reused_across_pages(self):
+        for index in range(3):
+            self.create_recipe(self.author, self.ingredients[index:index + 2])
+        client = self.client_for(self.users[1])
+        self.assertEqual(client.get('/api/recipes/?limit=4').status_code, 200)
+        with CaptureQueriesContext(connection) as warm:
+            cached = client.get('/api/recipes/?limit=2&page=2').data
+        cache.clear()
+        with CaptureQueriesContext(connection) as cold:
+            fresh = client.get('/api/recipes/?limit=2&page=2').data
+        self.assertEqual(cached, fresh)
+        self.assertLess(len(warm), len(cold))
@@ -0,0 +1,65 @@
+from recipes.models import Recipe, Tag
+
+from .base import APIBaseTestCase
+
+
+class TagFilterTests(APIBaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.run_on_commit()
+        breakfast, lunch = self.tags
+        author = self.users[0]
+        self.breakfast = self.make_recipe(author, tags=[breakfast])
+        self.lunch = self.make_recipe(author, tags=[lunch])
+        self.both = self.make_recipe(author, tags=[breakfast, lunch])
+        self.untagged = self.make_recipe(author)
+
+    def get_ids(self, query):
+        response = self.client.get(f'/api/recipes/?{query}')
+        self.assertEqual(response.status_code, 200, response.data)
+        return {recipe['id'] for recipe in response.data['results']}
+
+    def test_tags_are_combined_with_or(self):
+        self.assertEqual(
+            self.get_ids('tags=breakfast'), {self.breakfast.id, self.both.id}
+        )
+        self.assertEqual(
+            self.get_ids('tags=breakfast&tags=lunch'),
+            {self.breakfast.id, self.lunch.id, self.both.id}
+        )
+
+    def test_unknown_slug_is_rejected(self):
+        response = self.client.get('/api/recipes/?tags=breakfast&tags=supper')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('tags', response.data)
+
+    def test_deleted_tag_clears_its_bit(self):
+        breakfast, lunch = self.tags
+        Tag.objects.filter(pk=lunch.pk).delete()
+
+        masks = dict(Recipe.objects.values_list('id', 'tags_mask'))
+        self.assertEqual(masks[self.lunch.id], 0)
+        self.assertEqual(masks[self.both.id], breakfast.mask)
+        response = self.client.get('/api/recipes/?tags=lunch')
+        self.assertEqual(response.status_code, 400)
+
+    def test_freed_bit_is_reused_by_new_tag(self):
+        lunch = self.tags[1]
+        Tag.objects.filter(pk=lunch.pk).delete()
+        dinner = Tag.objects.create(
+            name='Ужин', color='#FF0000', slug='dinner'
+        )
+        self.assertEqual(dinner.bit, lunch.bit)
+        self.assertEqual(self.get_ids('tags=dinner'), set())
+
+        recipe = self.make_recipe(self.users[1], tags=[dinner])
+        self.assertEqual(self.get_ids('tags=dinner'), {recipe.id})
+
+    def test_tag_added_elsewhere_is_accepted(self):
+        self.get_ids('tags=breakfast')
+        Tag.objects.bulk_create([
+            Tag(name='Ужин', color='#FF0000', slug='dinner', bit=5)
+        ])
+
+        self.assertEqual(self.get_ids('tags=dinner'), set())
@@ -0,0 +1,62 @@
+from django.test import SimpleTestCase
+
+from api.catalog import IngredientCatalog
+from recipes.models import Ingredient
+
+from .base import APIBaseTestCase
+
+
+class IngredientCatalogTests(SimpleTestCase):
+
+    def setUp(self):
+        self.catalog = IngredientCatalog([
+            (1, 'Сахарная пудра', 'г'),
+            (2, 'сахар', 'г'),
+            (3, 'Тростниковый сахар', 'г'),
+            (4, 'Соль', 'г'),
+            (5, 'Ванильный сахар', 'г'),
+        ])
+
+    def ids(self, results):
+        return [item['id'] for item in results]
+
+    def test_prefix_matches_before_substring_matches(self):
+        self.assertEqual(
+            self.ids(self.catalog.search('сахар')), [2, 1, 5, 3]
+        )
+
+    def test_search_ignores_case(self):
+        self.assertEqual(self.ids(self.catalog.search('САХАР')), [2, 1, 5, 3])
+        self.assertEqual(self.ids(self.catalog.search('сОль')), [4])
+
+    def test_limit_applies_to_both_groups(self):
+        self.assertEqual(self.ids(self.catalog.search('сахар', 1)), [2])
+        self.assertEqual(self.ids(self.catalog.search('сахар', 3)), [2, 1, 5])
+
+    def test_empty_query_returns_all_in_order(self):
+        self.assertEqual(self.ids(self.catalog.search('')), [5, 2, 1, 4, 3])
+
+    def test_no_match(self):
+        self.assertEqual(self.catalog.search('перец'), [])
+
+
+class IngredientSearchTests(APIBaseTestCase):
+
+    def search(self, name):
+        response = self.client.get('/api/ingredients/', {'name': name})
+        self.assertEqual(response.status_code, 200)
+        return [item['name'] for item in response.data]
+
+    def test_search_by_name(self):
+        Ingredient.objects.create(name='Мука', measurement_unit='г')
+        Ingredient.objects.create(name='Рисовая мука', measurement_unit='г')
+
+        self.assertEqual(self.search('МУК'), ['Мука', 'Рисовая мука'])
+
+    def test_ingredients_added_elsewhere_are_found(self):
+        self.assertEqual(self.search('мука'), [])
+        Ingredient.objects.bulk_create([
+            Ingredient(name='Мука', measurement_unit='г')
+        ])
+
+        self.assertEqual(self.search('мука'), ['Мука'])
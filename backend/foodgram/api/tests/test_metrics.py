@@ -0,0 +1,41 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from django.test import SimpleTestCase, override_settings
+
+from api import metrics
+
+
+class MetricsFilesTests(SimpleTestCase):
+
+    def setUp(self):
+        self.metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.metrics_dir, ignore_errors=True)
+        settings = override_settings(METRICS_DIR=self.metrics_dir)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def write(self, name, view):
+        store = metrics.MetricsStore()
+        store.observe(view, 'GET', 200, (0.01, 0.001, 1, 100))
+        with open(os.path.join(self.metrics_dir, name), 'w') as file:
+            json.dump(store.to_json(), file)
+
+    def test_collect_prunes_dead_processes(self):
+        process = subprocess.Popen([sys.executable, '-c', ''])
+        process.wait()
+        self.write(f'{process.pid}-1.json', 'DeadView.list')
+        self.write(f'{os.getppid()}-1.json', 'ParentView.list')
+
+        store = metrics.collect()
+
+        views = {view for view, _ in store.histograms}
+        self.assertIn('ParentView.list', views)
+        self.assertNotIn('DeadView.list', views)
+        self.assertEqual(sorted(os.listdir(self.metrics_dir)), sorted([
+            f'{os.getppid()}-1.json', os.path.basename(metrics.get_path())
+        ]))
@@ -0,0 +1,92 @@
+import base64
+import datetime
+import json
+
+from django.utils import timezone
+
+from .base import APIBaseTestCase
+
+
+def encode(position):
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+class KeysetPaginationTests(APIBaseTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        author = cls.users[0]
+        now = timezone.now()
+        same = now - datetime.timedelta(days=1)
+        # Три пары рецептов с одинаковой датой публикации
+        # и одинаковым количеством добавлений в избранное.
+        cls.recipes = [
+            cls.make_recipe(
+                author, tags=[cls.tags[index % 2]],
+                pub_date=same if index < 6 else now - datetime.timedelta(
+                    days=index
+                ),
+                favorites_count=index // 2,
+            ) for index in range(8)
+        ]
+
+    def walk(self, url):
+        """id рецептов всех страниц по ссылкам next и их количество."""
+        ids, pages = [], 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.data)
+            self.assertNotIn('count', response.data)
+            ids.extend(recipe['id'] for recipe in response.data['results'])
+            url = response.data['next']
+            pages += 1
+        return ids, pages
+
+    def test_pub_date_order_with_ties(self):
+        ids, pages = self.walk('/api/recipes/?cursor=&limit=3')
+        expected = [recipe.id for recipe in sorted(
+            self.recipes, key=lambda recipe: (
+                -self.get_pub_date(recipe).timestamp(), -recipe.id
+            )
+        )]
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 3)
+
+    def test_last_page_has_no_next(self):
+        response = self.client.get('/api/recipes/?cursor=&limit=8')
+        self.assertEqual(len(response.data['results']), 8)
+        self.assertIsNone(response.data['next'])
+
+    def test_popular_order_with_ties(self):
+        ids, _ = self.walk('/api/recipes/?cursor=&limit=3&ordering=popular')
+        self.assertEqual(ids, [recipe.id for recipe in sorted(
+            self.recipes,
+            key=lambda recipe: (-(self.recipes.index(recipe) // 2),
+                                -recipe.id)
+        )])
+
+    def test_tags_with_popular_ordering(self):
+        ids, _ = self.walk(
+            f'/api/recipes/?cursor=&limit=2&ordering=popular'
+            f'&tags={self.tags[1].slug}'
+        )
+        self.assertEqual(ids, [
+            recipe.id for recipe in reversed(self.recipes[1::2])
+        ])
+
+    def test_invalid_cursor(self):
+        for cursor in ('not-base64!', encode({'x': 1}), encode([1]),
+                       encode(['x', 1]), encode([None, 1]),
+                       encode(['2020-01-01T00:00:00+00:00', 'x'])):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(f'/api/recipes/?cursor={cursor}')
+                self.assertEqual(response.status_code, 404)
+        response = self.client.get(
+            f'/api/recipes/?ordering=popular&cursor={encode(["x", 1])}'
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def get_pub_date(self, recipe):
+        recipe.refresh_from_db(fields=['pub_date'])
+        return recipe.pub_date
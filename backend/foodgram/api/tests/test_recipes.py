@@ -0,0 +1,274 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
+
+from recipes import minhash, shopping_list
+from recipes.counters import recount, recount_favorites, recount_recipes
+from recipes.models import Favorite, Recipe, ShoppingCart, User
+
+from .base import APIBaseTestCase
+
+
+class RecipeTests(APIBaseTestCase):
+
+    def test_create_and_update_with_one_ingredient(self):
+        author = self.users[0]
+        recipe_id = self.create_recipe(author, self.ingredients[:1])
+        response = self.client_for(author).patch(
+            f'/api/recipes/{recipe_id}/',
+            self.recipe_data(self.ingredients[1:2]), format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        recipe = Recipe.objects.get(pk=recipe_id)
+        self.assertEqual(
+            bytes(recipe.minhash),
+            minhash.to_bytes(minhash.signature([self.ingredients[1].id]))
+        )
+
+    def test_update_keeps_concurrent_counters(self):
+        author = self.users[0]
+        recipe_id = self.create_recipe(author, self.ingredients[:2])
+        change_recipe = shopping_list.change_recipe
+
+        def change_concurrently(*args):
+            change_recipe(*args)
+            Recipe.objects.filter(pk=recipe_id).update(
+                favorites_count=F('favorites_count') + 1, trending_score=5
+            )
+
+        with mock.patch.object(shopping_list, 'change_recipe',
+                               side_effect=change_concurrently):
+            response = self.client_for(author).patch(
+                f'/api/recipes/{recipe_id}/',
+                self.recipe_data(self.ingredients[:2], name='Новое'),
+                format='json'
+            )
+        self.assertEqual(response.status_code, 200, response.data)
+        recipe = Recipe.objects.get(pk=recipe_id)
+        self.assertEqual(recipe.name, 'Новое')
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(recipe.trending_score, 5)
+
+    def test_trending_ordering_follows_updated_scores(self):
+        recipes = [self.make_recipe(self.users[0]) for _ in range(3)]
+        for user in self.users[:2]:
+            Favorite.objects.create(user=user, recipe=recipes[1])
+        Favorite.objects.create(user=self.users[0], recipe=recipes[2])
+        call_command('updatescores', stdout=mock.Mock())
+
+        response = self.client.get('/api/recipes/?ordering=trending')
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            [recipes[1].id, recipes[2].id, recipes[0].id]
+        )
+
+        for user in self.users:
+            Favorite.objects.create(user=user, recipe=recipes[0])
+        call_command('updatescores', stdout=mock.Mock())
+
+        response = self.client.get('/api/recipes/?ordering=trending')
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            [recipes[0].id, recipes[1].id, recipes[2].id]
+        )
+
+    def test_counters_follow_deletes(self):
+        author = self.users[0]
+        recipe_id = self.create_recipe(author, self.ingredients[:1])
+        other_id = self.create_recipe(author, self.ingredients[:1])
+        for user in self.users[1:]:
+            response = self.client_for(user).post(
+                f'/api/recipes/{recipe_id}/favorite/'
+            )
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            Recipe.objects.get(pk=recipe_id).favorites_count, 2
+        )
+        self.assertEqual(User.objects.get(pk=author.pk).recipes_count, 2)
+
+        response = self.client_for(self.users[1]).delete(
+            f'/api/recipes/{recipe_id}/favorite/'
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(
+            Recipe.objects.get(pk=recipe_id).favorites_count, 1
+        )
+
+        User.objects.filter(pk=self.users[2].pk).delete()
+        self.assertEqual(
+            Recipe.objects.get(pk=recipe_id).favorites_count, 0
+        )
+
+        response = self.client_for(author).delete(
+            f'/api/recipes/{other_id}/'
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(User.objects.get(pk=author.pk).recipes_count, 1)
+        self.assertEqual((recount_favorites(), recount_recipes()), (0, 0))
+
+    def test_recount_fixes_drift_in_batches(self):
+        recipes = [self.make_recipe(self.users[0]) for _ in range(3)]
+        Favorite.objects.create(user=self.users[1], recipe=recipes[0])
+        Recipe.objects.update(favorites_count=5)
+        User.objects.update(recipes_count=0)
+
+        self.assertEqual(recount(
+            Recipe.objects.all(), 'favorites_count', Favorite, 'recipe',
+            batch_size=2
+        ), 3)
+        self.assertEqual(recount_recipes(), 1)
+
+        self.assertEqual(
+            list(Recipe.objects.order_by('id').values_list(
+                'favorites_count', flat=True
+            )), [1, 0, 0]
+        )
+        self.assertEqual(
+            User.objects.get(pk=self.users[0].pk).recipes_count, 3
+        )
+
+
+class RecipeFlagsTests(APIBaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = self.users[0]
+        self.favorite = self.make_recipe(self.users[1])
+        self.in_cart = self.make_recipe(self.users[1])
+        self.other = self.make_recipe(self.users[1])
+        Favorite.objects.create(user=self.user, recipe=self.favorite)
+        ShoppingCart.objects.create(user=self.user, recipe=self.in_cart)
+        ShoppingCart.objects.create(user=self.users[2], recipe=self.other)
+
+    def flags(self, client, query=''):
+        response = client.get(f'/api/recipes/{query}')
+        self.assertEqual(response.status_code, 200)
+        return {
+            recipe['id']: (recipe['is_favorited'],
+                           recipe['is_in_shopping_cart'])
+            for recipe in response.data['results']
+        }
+
+    def test_flags_for_current_user(self):
+        client = self.client_for(self.user)
+        self.assertEqual(self.flags(client), {
+            self.favorite.id: (True, False),
+            self.in_cart.id: (False, True),
+            self.other.id: (False, False),
+        })
+        response = client.get(f'/api/recipes/{self.favorite.id}/')
+        self.assertTrue(response.data['is_favorited'])
+        self.assertFalse(response.data['is_in_shopping_cart'])
+
+    def test_flags_for_anonymous_user(self):
+        self.assertEqual(set(self.flags(self.client).values()), {
+            (False, False)
+        })
+
+    def test_filter_by_flags(self):
+        client = self.client_for(self.user)
+        self.assertEqual(
+            list(self.flags(client, '?is_favorited=1')), [self.favorite.id]
+        )
+        self.assertEqual(
+            list(self.flags(client, '?is_in_shopping_cart=1')),
+            [self.in_cart.id]
+        )
+        self.assertEqual(len(self.flags(client, '?is_favorited=0')), 3)
+
+
+class RecipeReadPathTests(APIBaseTestCase):
+    """Теги, ингредиенты и автор рецептов страницы загружаются
+    фиксированным числом запросов."""
+
+    def add_recipes(self, count):
+        for index in range(count):
+            self.make_recipe(
+                self.users[index % 2], self.ingredients[index:index + 3],
+                tags=self.tags
+            )
+
+    def test_list_query_count_does_not_grow(self):
+        client = self.client_for(self.users[2])
+        for count in (2, 8):
+            self.add_recipes(count)
+            cache.clear()
+            with self.assertNumQueries(6):
+                response = client.get('/api/recipes/?limit=50')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), count)
+            Recipe.objects.all().delete()
+
+    def test_list_contains_relations(self):
+        self.add_recipes(1)
+        recipe = self.client_for(self.users[2]).get(
+            '/api/recipes/'
+        ).data['results'][0]
+
+        self.assertEqual(
+            [tag['slug'] for tag in recipe['tags']], ['breakfast', 'lunch']
+        )
+        self.assertEqual(
+            sorted((item['id'], item['amount'])
+                   for item in recipe['ingredients']),
+            [(ingredient.id, 10) for ingredient in self.ingredients[:3]]
+        )
+        self.assertEqual(recipe['author']['id'], self.users[0].id)
+        self.assertFalse(recipe['author']['is_subscribed'])
+
+
+class RecipeValidationTests(APIBaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.client_for(self.users[0])
+
+    def post(self, data):
+        return self.client.post('/api/recipes/', data, format='json')
+
+    def assert_rejected(self, field, **data):
+        recipe = self.recipe_data(self.ingredients[:2])
+        recipe.update(data)
+        response = self.post(recipe)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(field, response.data)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_invalid_ingredients(self):
+        first = self.ingredients[0].id
+        for ingredients, field in (
+            ([{'id': first, 'amount': 1}, {'id': first, 'amount': 2}],
+             'ingredients_id'),
+            ([{'id': 10 ** 6, 'amount': 1}], 'ingredients_id'),
+            ([{'id': 'abc', 'amount': 1}], 'ingredients_id'),
+            ([{'id': first, 'amount': 0}], 'ingredients_amount'),
+            ([{'id': first, 'amount': 'много'}], 'ingredients_amount'),
+            ([{'id': first, 'amount': 10001}], 'ingredients_amount'),
+            ([{'id': first}], 'amount'),
+        ):
+            with self.subTest(ingredients=ingredients):
+                self.assert_rejected(field, ingredients=ingredients)
+
+    def test_invalid_tags(self):
+        tag = self.tags[0].id
+        for tags in ([tag, tag], [tag, 10 ** 6]):
+            with self.subTest(tags=tags):
+                self.assert_rejected('tags', tags=tags)
+
+    def test_query_count_does_not_depend_on_ingredients(self):
+        self.post(self.recipe_data(self.ingredients[:1]))
+        counts = []
+        for ingredients in (self.ingredients[:1], self.ingredients):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.post(self.recipe_data(ingredients))
+            self.assertEqual(response.status_code, 201, response.data)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(
+            Recipe.objects.get(pk=response.data['id']).ingredients.count(),
+            len(self.ingredients)
+        )
@@ -0,0 +1,42 @@
+from .base import APIBaseTestCase
+
+
+class SearchTests(APIBaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        author = self.users[0]
+        self.in_name = self.make_recipe(author, name='Борщ украинский')
+        self.in_text = self.make_recipe(author, name='Пампушки',
+                                        favorites_count=5)
+        self.in_text.text = 'Подавать к борщу со сметаной'
+        self.in_text.save()
+        self.other = self.make_recipe(author, name='Сырники')
+
+    def get_ids(self, query):
+        response = self.client.get(f'/api/recipes/?{query}')
+        self.assertEqual(response.status_code, 200, response.data)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_search_in_name_and_text_by_relevance(self):
+        self.assertEqual(
+            self.get_ids('search=борщ'), [self.in_name.id, self.in_text.id]
+        )
+
+    def test_search_ignores_case_of_cyrillic(self):
+        self.assertEqual(self.get_ids('search=БОРЩ'), self.get_ids(
+            'search=борщ'
+        ))
+        self.assertEqual(self.get_ids('search=сырники'), [self.other.id])
+
+    def test_explicit_ordering_applies_after_search(self):
+        self.assertEqual(
+            self.get_ids('search=борщ&ordering=popular'),
+            [self.in_text.id, self.in_name.id]
+        )
+
+    def test_blank_search_is_ignored(self):
+        self.assertEqual(len(self.get_ids('search=%20')), 3)
+
+    def test_search_without_matches(self):
+        self.assertEqual(self.get_ids('search=окрошка'), [])
@@ -0,0 +1,86 @@
+import csv
+import io
+import json
+
+from .base import APIBaseTestCase
+
+URL = '/api/recipes/download_shopping_cart/'
+
+
+class DownloadShoppingCartTests(APIBaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.client_for(self.users[0])
+        first, second, third = self.ingredients[:3]
+        for ingredients in ((first, second), (first, third)):
+            recipe = self.make_recipe(self.users[1], ingredients)
+            response = self.client.post(
+                f'/api/recipes/{recipe.id}/shopping_cart/'
+            )
+            self.assertEqual(response.status_code, 201)
+        self.expected = [
+            (first.name, first.measurement_unit, 20),
+            (second.name, second.measurement_unit, 10),
+            (third.name, third.measurement_unit, 10),
+        ]
+
+    def download(self, content_type, extension, **kwargs):
+        response = self.client.get(URL, **kwargs)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response['Content-Type'], f'{content_type}; charset=utf-8'
+        )
+        self.assertEqual(
+            response['Content-Disposition'],
+            f'attachment; filename="shopping_cart.{extension}"'
+        )
+        return b''.join(response.streaming_content).decode()
+
+    def test_text_by_default(self):
+        content = self.download('text/plain', 'txt')
+        self.assertEqual(content, 'Ваш список покупок \n\n' + ''.join(
+            f'{number}) {name} ({unit}) — {amount}\n'
+            for number, (name, unit, amount) in enumerate(self.expected, 1)
+        ))
+        self.assertEqual(
+            self.download('text/plain', 'txt', data={'format': 'txt'}),
+            content
+        )
+
+    def test_csv(self):
+        for kwargs in ({'data': {'format': 'csv'}},
+                       {'HTTP_ACCEPT': 'text/csv'}):
+            content = self.download('text/csv', 'csv', **kwargs)
+            rows = list(csv.reader(io.StringIO(content)))
+            self.assertEqual(rows[0], ['name', 'measurement_unit', 'amount'])
+            self.assertEqual(
+                [tuple(row) for row in rows[1:]],
+                [(name, unit, str(amount))
+                 for name, unit, amount in self.expected]
+            )
+
+    def test_json(self):
+        for kwargs in ({'data': {'format': 'json'}},
+                       {'HTTP_ACCEPT': 'application/json'}):
+            content = self.download('application/json', 'json', **kwargs)
+            self.assertEqual(json.loads(content), [
+                {'name': name, 'measurement_unit': unit, 'amount': amount}
+                for name, unit, amount in self.expected
+            ])
+
+    def test_empty_cart(self):
+        self.client = self.client_for(self.users[2])
+        content = self.download(
+            'application/json', 'json', data={'format': 'json'}
+        )
+        self.assertEqual(json.loads(content), [])
+
+    def test_unknown_format(self):
+        response = self.client.get(URL, {'format': 'xml'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_requires_authentication(self):
+        self.client.credentials()
+        response = self.client.get(URL)
+        self.assertEqual(response.status_code, 401)
@@ -0,0 +1,62 @@
+from api.cache import ProcessIndex
+from api.similarity import SIMILARITY_VERSION, apply_change, build_index
+
+from .base import APIBaseTestCase
+
+
+class SimilarRecipesTests(APIBaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.run_on_commit()
+        self.author = self.users[0]
+        ingredients = self.ingredients
+        self.recipe = self.create_recipe(self.author, ingredients[:6])
+        # Пять из шести общих ингредиентов, затем четыре и ни одного.
+        self.closest = self.create_recipe(self.author, ingredients[:5])
+        self.close = self.create_recipe(self.author, ingredients[:4])
+        self.unrelated = self.create_recipe(self.author, ingredients[7:10])
+
+    def get_similar(self, recipe_id, query=''):
+        response = self.client.get(f'/api/recipes/{recipe_id}/similar/{query}')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_ordered_by_similarity_without_recipe_itself(self):
+        data = self.get_similar(self.recipe)
+        self.assertEqual([recipe['id'] for recipe in data],
+                         [self.closest, self.close])
+        self.assertGreater(data[0]['similarity'], data[1]['similarity'])
+        self.assertEqual(
+            [recipe['id'] for recipe in self.get_similar(self.recipe,
+                                                         '?limit=1')],
+            [self.closest]
+        )
+
+    def test_unknown_recipe(self):
+        response = self.client.get('/api/recipes/0/similar/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_index_updates_after_ingredient_edit(self):
+        response = self.client_for(self.author).patch(
+            f'/api/recipes/{self.unrelated}/',
+            self.recipe_data(self.ingredients[:6]), format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        data = self.get_similar(self.recipe)
+        self.assertEqual(data[0]['id'], self.unrelated)
+        self.assertEqual(data[0]['similarity'], 1.0)
+
+    def test_other_process_applies_changes(self):
+        other = ProcessIndex(SIMILARITY_VERSION, build_index, apply_change)
+        other.get()
+        client = self.client_for(self.author)
+        client.patch(f'/api/recipes/{self.unrelated}/',
+                     self.recipe_data(self.ingredients[:6]), format='json')
+        client.delete(f'/api/recipes/{self.closest}/')
+        with self.assertNumQueries(0):
+            index = other.get()
+        self.assertEqual(
+            [recipe_id for recipe_id, _ in index.similar(self.recipe, 10)],
+            [self.unrelated, self.close]
+        )
@@ -0,0 +1,81 @@
+import gzip
+import json
+
+from recipes.models import Ingredient
+
+from .base import APIBaseTestCase
+
+
+class SnapshotTests(APIBaseTestCase):
+
+    def test_etag_returns_not_modified(self):
+        response = self.client.get('/api/tags/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [tag['slug'] for tag in json.loads(response.content)],
+            ['breakfast', 'lunch']
+        )
+
+        response = self.client.get(
+            '/api/tags/', HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_gzip_variant(self):
+        plain = self.client.get('/api/ingredients/')
+        gzipped = self.client.get(
+            '/api/ingredients/', HTTP_ACCEPT_ENCODING='gzip, deflate'
+        )
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertEqual(gzipped['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', gzipped['Vary'])
+        self.assertEqual(gzip.decompress(gzipped.content), plain.content)
+        self.assertNotEqual(gzipped['ETag'], plain['ETag'])
+
+        response = self.client.get(
+            '/api/ingredients/', HTTP_ACCEPT_ENCODING='gzip',
+            HTTP_IF_NONE_MATCH=gzipped['ETag']
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_tag_save_invalidates_snapshot(self):
+        etag = self.client.get('/api/tags/')['ETag']
+        self.tags[0].name = 'Ранний завтрак'
+        self.tags[0].save()
+
+        response = self.client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(
+            json.loads(response.content)[0]['name'], 'Ранний завтрак'
+        )
+
+    def test_ingredient_save_invalidates_snapshot(self):
+        etag = self.client.get('/api/ingredients/')['ETag']
+        self.ingredients[0].measurement_unit = 'кг'
+        self.ingredients[0].save()
+
+        response = self.client.get(
+            '/api/ingredients/', HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            {'id': self.ingredients[0].id, 'name': 'ингредиент 0',
+             'measurement_unit': 'кг'},
+            json.loads(response.content)
+        )
+
+    def test_ingredients_added_elsewhere_invalidate_snapshot(self):
+        etag = self.client.get('/api/ingredients/')['ETag']
+        Ingredient.objects.bulk_create([
+            Ingredient(name='Мука', measurement_unit='г')
+        ])
+
+        response = self.client.get(
+            '/api/ingredients/', HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            'Мука', [item['name'] for item in json.loads(response.content)]
+        )
@@ -0,0 +1,81 @@
+from recipes.models import Subscription
+
+from .base import APIBaseTestCase, User
+
+
+class SubscribeTests(APIBaseTestCase):
+
+    def test_subscribe_with_recipes_limit(self):
+        user, author = self.users[:2]
+        self.create_recipe(author, self.ingredients[:2])
+        self.create_recipe(author, self.ingredients[2:4])
+        response = self.client_for(user).post(
+            f'/api/users/{author.id}/subscribe/?recipes_limit=1'
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(len(response.data['recipes']), 1)
+
+    def test_invalid_recipes_limit_does_not_subscribe(self):
+        user, author = self.users[:2]
+        for recipes_limit in ('abc', '-1'):
+            response = self.client_for(user).post(
+                f'/api/users/{author.id}/subscribe/'
+                f'?recipes_limit={recipes_limit}'
+            )
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('recipes_limit', response.data)
+        self.assertFalse(
+            Subscription.objects.filter(user=user, author=author).exists()
+        )
+
+
+class QueryCountTests(APIBaseTestCase):
+    """Связи списков пользователей и подписок загружаются одним
+    запросом на страницу, независимо от числа авторов."""
+
+    def add_authors(self, count):
+        user = self.users[0]
+        for index in range(count):
+            author = User.objects.create_user(
+                email=f'author{index}@example.com',
+                username=f'author{index}', first_name='Имя',
+                last_name='Фамилия', password='pass12345!'
+            )
+            for _ in range(3):
+                self.make_recipe(author)
+            if index % 2 == 0:
+                Subscription.objects.create(user=user, author=author)
+
+    def test_users_list(self):
+        client = self.client_for(self.users[0])
+        for count in (2, 6):
+            self.add_authors(count)
+            with self.assertNumQueries(3):
+                response = client.get('/api/users/?limit=50')
+            self.assertEqual(response.status_code, 200)
+            subscribed = set(Subscription.objects.filter(
+                user=self.users[0]
+            ).values_list('author_id', flat=True))
+            self.assertEqual(
+                {user['id'] for user in response.data['results']
+                 if user['is_subscribed']},
+                subscribed
+            )
+            User.objects.filter(username__startswith='author').delete()
+
+    def test_subscriptions_list(self):
+        client = self.client_for(self.users[0])
+        for count in (2, 8):
+            self.add_authors(count)
+            with self.assertNumQueries(4):
+                response = client.get(
+                    '/api/users/subscriptions/?limit=50&recipes_limit=2'
+                )
+            self.assertEqual(response.status_code, 200)
+            authors = response.data['results']
+            self.assertEqual(len(authors), count // 2)
+            for author in authors:
+                self.assertTrue(author['is_subscribed'])
+                self.assertEqual(author['recipes_count'], 3)
+                self.assertEqual(len(author['recipes']), 2)
+            User.objects.filter(username__startswith='author').delete()
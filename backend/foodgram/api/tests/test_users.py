@@ -0,0 +1,52 @@
+from recipes.models import Subscription
+
+from .base import APIBaseTestCase
+
+
+class IsSubscribedTests(APIBaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user, self.author, self.other = self.users
+        Subscription.objects.create(user=self.user, author=self.author)
+        Subscription.objects.create(user=self.other, author=self.user)
+        self.client = self.client_for(self.user)
+
+    def test_users_list(self):
+        response = self.client.get('/api/users/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {user['id']: user['is_subscribed']
+             for user in response.data['results']},
+            {self.user.id: False, self.author.id: True, self.other.id: False}
+        )
+
+    def test_user_detail(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/users/{self.author.id}/')
+        self.assertTrue(response.data['is_subscribed'])
+        response = self.client.get(f'/api/users/{self.other.id}/')
+        self.assertFalse(response.data['is_subscribed'])
+
+    def test_me(self):
+        response = self.client.get('/api/users/me/')
+        self.assertEqual(response.data['id'], self.user.id)
+        self.assertFalse(response.data['is_subscribed'])
+
+    def test_user_without_subscriptions(self):
+        client = self.client_for(self.author)
+        response = client.get('/api/users/')
+        self.assertFalse(any(
+            user['is_subscribed'] for user in response.data['results']
+        ))
+
+    def test_follows_subscribe_and_unsubscribe(self):
+        url = f'/api/users/{self.other.id}/'
+        self.assertEqual(
+            self.client.post(f'{url}subscribe/').status_code, 201
+        )
+        self.assertTrue(self.client.get(url).data['is_subscribed'])
+        self.assertEqual(
+            self.client.delete(f'{url}subscribe/').status_code, 204
+        )
+        self.assertFalse(self.client.get(url).data['is_subscribed'])
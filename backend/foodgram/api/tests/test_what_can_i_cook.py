@@ -0,0 +1,87 @@
+from api.cache import ProcessIndex
+from api.ingredient_index import (
+    INGREDIENT_INDEX_VERSION, apply_change, build_index
+)
+
+from .base import APIBaseTestCase
+
+
+class WhatCanICookTests(APIBaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.run_on_commit()
+        author = self.users[0]
+        salt, flour, milk, eggs, sugar = self.ingredients[:5]
+        self.full = self.create_recipe(author, [salt, flour])
+        self.partial = self.create_recipe(author, [salt, flour, milk])
+        self.single = self.create_recipe(author, [salt])
+        self.other = self.create_recipe(author, [eggs, sugar])
+        self.url = (f'/api/recipes/what_can_i_cook/'
+                    f'?ingredients={salt.id},{flour.id}')
+
+    def test_ranking_and_missing_ingredients(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual([recipe['id'] for recipe in results],
+                         [self.full, self.single, self.partial])
+        self.assertEqual(
+            [(recipe['covered_ingredients'], recipe['total_ingredients'])
+             for recipe in results],
+            [(2, 2), (1, 1), (2, 3)]
+        )
+        self.assertEqual(results[0]['missing_ingredients'], [])
+        self.assertEqual(
+            [item['id'] for item in results[2]['missing_ingredients']],
+            [self.ingredients[2].id]
+        )
+
+    def test_pagination(self):
+        response = self.client.get(f'{self.url}&limit=2')
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNotNone(response.data['next'])
+        response = self.client.get(f'{self.url}&limit=2&page=2')
+        self.assertEqual([recipe['id'] for recipe in response.data['results']],
+                         [self.partial])
+        self.assertIsNone(response.data['next'])
+
+    def test_invalid_ingredients(self):
+        for query in ('', '?ingredients=', '?ingredients=1,x'):
+            with self.subTest(query=query):
+                response = self.client.get(
+                    f'/api/recipes/what_can_i_cook/{query}'
+                )
+                self.assertEqual(response.status_code, 400)
+
+    def test_edit_and_delete_update_index(self):
+        author = self.client_for(self.users[0])
+        response = author.patch(
+            f'/api/recipes/{self.other}/',
+            self.recipe_data(self.ingredients[:2]), format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        author.delete(f'/api/recipes/{self.single}/')
+        response = self.client.get(self.url)
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            [self.other, self.full, self.partial]
+        )
+
+    def test_other_process_applies_changes(self):
+        other = ProcessIndex(INGREDIENT_INDEX_VERSION, build_index,
+                             apply_change)
+        other.get()
+        self.client_for(self.users[0]).patch(
+            f'/api/recipes/{self.other}/',
+            self.recipe_data(self.ingredients[:1]), format='json'
+        )
+        self.client_for(self.users[0]).delete(f'/api/recipes/{self.full}/')
+        with self.assertNumQueries(0):
+            index = other.get()
+        self.assertEqual(
+            [recipe_id for recipe_id, _, _ in
+             index.match({self.ingredients[0].id})],
+            [self.other, self.single, self.partial]
+        )
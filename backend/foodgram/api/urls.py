@@ -3,7 +3,7 @@ from rest_framework.routers import DefaultRouter
 
 from .views import (
     TagViewSet, IngredientViewSet, RecipeViewSet, SubscriptionListViewSet,
-    SubscribeView
+    SubscribeView, CustomUserViewSet, MetricsView
 )
 
 router_v1 = DefaultRouter()
@@ -14,6 +14,7 @@ router_v1.register('recipes', RecipeViewSet, basename='titles')
 router_v1.register(
     'users/subscriptions', SubscriptionListViewSet, basename='subscriptions'
 )
+router_v1.register('users', CustomUserViewSet, basename='users')
 
 urlpatterns = [
     path(
@@ -21,7 +22,7 @@ urlpatterns = [
         SubscribeView.as_view(),
         name='subscribe'
     ),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
     path('auth/', include('djoser.urls.authtoken')),
     path('', include(router_v1.urls)),
-    path('', include('djoser.urls')),
 ]
@@ -1,51 +1,121 @@
-from django.http import HttpResponse
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from djoser.views import UserViewSet
 from rest_framework import status
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
 
+from recipes.feed import get_feed
 from recipes.models import (
-    Tag, Ingredient, Recipe, Favorite, User, Subscription, ShoppingCart,
-    IngredientAmount
+    Tag, Ingredient, IngredientAmount, Recipe, Favorite, User, Subscription,
+    ShoppingCart, ShoppingListItem
 )
+from .cache import RECIPES_VERSION
+from .catalog import CATALOG_VERSION, get_ingredient_catalog
 from .filters import IngredientFilter, RecipeFilter
-from .mixins import ListRetrieveViewSet, ListViewSet
-from .paginations import RecipePagination, SubscriptionPagination
+from .ingredient_index import get_ingredient_index
+from .similarity import get_similarity_index
+from .metrics import CONTENT_TYPE, collect, render
+from .mixins import (
+    AnonymousPageCacheMixin, ListRetrieveViewSet, ListViewSet,
+    SnapshotListMixin
+)
+from .paginations import (
+    CookableRecipePagination, FeedPagination, RecipePagination,
+    SubscriptionPagination
+)
 from .permissions import ReadOnly, IsAutherOrAdminOrReadOnly
+from .renderers import (
+    ShoppingCartCSVRenderer, ShoppingCartJSONRenderer, ShoppingCartTextRenderer
+)
 from .serializers import (
     TagSerializer, IngredientSerializer, RecipeSerializer, FavoriteSerializer,
-    SubscriptionSerializer, ShoppingCartSerializer
+    SubscriptionSerializer, ShoppingCartSerializer, CookableRecipeSerializer,
+    SimilarRecipeSerializer, to_int_or_none
 )
+from .snapshots import TAGS_VERSION
+
 
+class CustomUserViewSet(UserViewSet):
+    """Пользователи djoser с флагом подписки текущего пользователя,
+    вычисленным в том же запросе."""
 
-class TagViewSet(ListRetrieveViewSet):
-    """List, Retrieve для тегов."""
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if user.is_anonymous:
+            return queryset
+        return queryset.annotate(is_subscribed=Exists(
+            Subscription.objects.filter(user=user, author=OuterRef('pk'))
+        ))
+
+
+class TagViewSet(SnapshotListMixin, ListRetrieveViewSet):
+    """List, Retrieve для тегов, список отдается из снимка."""
     permission_classes = (ReadOnly,)
     serializer_class = TagSerializer
     queryset = Tag.objects.all()
     pagination_class = None
+    snapshot_name = TAGS_VERSION
 
 
-class IngredientViewSet(ListRetrieveViewSet):
-    """List, Retrieve для ингредиентов."""
+class IngredientViewSet(SnapshotListMixin, ListRetrieveViewSet):
+    """List, Retrieve для ингредиентов, полный список отдается
+    из снимка."""
     permission_classes = (ReadOnly,)
     serializer_class = IngredientSerializer
     queryset = Ingredient.objects.all()
     filterset_class = IngredientFilter
     pagination_class = None
+    snapshot_name = CATALOG_VERSION
+
+    def list(self, request, *args, **kwargs):
+        """Поиск по имени выполняется по каталогу в памяти процесса,
+        без запроса к базе данных."""
+        name = request.query_params.get('name')
+        if name is None:
+            return super().list(request, *args, **kwargs)
+        return Response(get_ingredient_catalog().search(name))
 
 
-class RecipeViewSet(ModelViewSet):
+class RecipeViewSet(AnonymousPageCacheMixin, ModelViewSet):
     """CRUD для рецептов, добавление рецепта в избранное и список покупок,
-    загрузка списка покупок."""
-    queryset = Recipe.objects.all()
+    загрузка списка покупок. Список и рецепт для анонимных
+    пользователей отдаются из кеша страниц, связи рецептов загружаются
+    RecipeSerializer только для рецептов без кешированного фрагмента."""
+    queryset = Recipe.objects.defer('search_vector', 'minhash')
     permission_classes = (IsAutherOrAdminOrReadOnly,)
     serializer_class = RecipeSerializer
     pagination_class = RecipePagination
     filterset_class = RecipeFilter
+    page_cache_name = RECIPES_VERSION
+    default_similar = 10
+    max_similar = 50
+
+    def get_queryset(self):
+        """Рецепты с флагами избранного, списка покупок и подписки
+        на автора для текущего пользователя, вычисленными в том же
+        запросе."""
+        queryset = super().get_queryset()
+        user = self.request.user
+        if user.is_anonymous:
+            return queryset
+        return queryset.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_author_subscribed=Exists(Subscription.objects.filter(
+                user=user, author=OuterRef('author_id'))),
+        )
 
     @action(detail=True, methods=['post'],
             permission_classes=(IsAuthenticated,), name='favorite')
@@ -71,35 +141,132 @@ class RecipeViewSet(ModelViewSet):
 
     @action(detail=False, methods=['get'],
             permission_classes=(IsAuthenticated,),
+            renderer_classes=(ShoppingCartTextRenderer,
+                              ShoppingCartCSVRenderer,
+                              ShoppingCartJSONRenderer),
             name='download_shopping_cart')
     def download_shopping_cart(self, request, pk=None):
-        """Скачивание файла со списком покупок."""
-        shopping_cart = {}
-        content = 'Выш список покупок \n\n'
-        ingredients = IngredientAmount.objects.filter(
-            recipe__carts__user=request.user).values_list(
-            'ingredient__name', 'amount', 'ingredient__measurement_unit'
+        """Скачивание файла со списком покупок, формат выбирается
+        параметром format: txt (по умолчанию), csv или json.
+        Количество ингредиентов берется из сводного списка покупок,
+        файл отдается потоком."""
+        ingredients = ShoppingListItem.objects.filter(
+            user=request.user
+        ).values_list(
+            'ingredient__name', 'ingredient__measurement_unit', 'total_amount'
+        ).order_by('ingredient__name', 'ingredient__measurement_unit')
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(ingredients.iterator()),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}'
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_cart.{renderer.format}"'
         )
-        for ingredient in ingredients:
-            name = ingredient[0]
-            amount = ingredient[1]
-            unit = ingredient[2]
-            if name in shopping_cart:
-                shopping_cart[name]['amount'] += amount
-            else:
-                shopping_cart[name] = {'unit': unit, 'amount': amount}
-
-        for i, (ingredient, data) in enumerate(shopping_cart.items(), 1):
-            content += (f'{i}) {ingredient} ({data["unit"]}) '
-                        f'— {data["amount"]}\n')
-        response = HttpResponse(content, content_type='text/plain')
-        response[
-            'Content-Disposition'
-        ] = 'attachment; filename="shopping_cart.txt"'
 
         return response
 
+    @action(detail=False, methods=['get'],
+            serializer_class=CookableRecipeSerializer,
+            pagination_class=CookableRecipePagination,
+            name='what_can_i_cook')
+    def what_can_i_cook(self, request):
+        """Рецепты, в которые входят ингредиенты из параметра ingredients
+        (id через запятую), сначала с наибольшей долей имеющихся
+        ингредиентов, с недостающими ингредиентами. Рецепты подбираются
+        по индексу в памяти процесса, из базы загружаются только
+        рецепты страницы и их недостающие ингредиенты."""
+        ingredient_ids = self.get_ingredient_ids(request)
+        matches = self.paginate_queryset(
+            get_ingredient_index().match(ingredient_ids)
+        )
+        recipes = Recipe.objects.defer('search_vector', 'minhash').in_bulk(
+            [recipe_id for recipe_id, _, _ in matches]
+        )
+        missing = self.get_missing_ingredients(recipes, ingredient_ids)
+        page = []
+        for recipe_id, covered, total in matches:
+            recipe = recipes.get(recipe_id)
+            if recipe is None:
+                continue
+            recipe.covered_ingredients = covered
+            recipe.total_ingredients = total
+            recipe.missing_ingredients = missing[recipe_id]
+            page.append(recipe)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'],
+            permission_classes=(IsAuthenticated,),
+            pagination_class=FeedPagination,
+            name='feed')
+    def feed(self, request):
+        """Лента рецептов авторов, на которых подписан пользователь,
+        от новых к старым, с курсорной пагинацией."""
+        recipe_ids = self.paginator.paginate_feed(
+            lambda position, limit: get_feed(
+                request.user.id, position, limit
+            ),
+            request
+        )
+        recipes = self.get_queryset().in_bulk(recipe_ids)
+        page = [recipes[recipe_id] for recipe_id in recipe_ids
+                if recipe_id in recipes]
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['get'],
+            serializer_class=SimilarRecipeSerializer,
+            pagination_class=None,
+            name='similar')
+    def similar(self, request, pk):
+        """Рецепты с наиболее похожим набором ингредиентов, не больше
+        limit (по умолчанию 10). Кандидаты выбираются по LSH индексу
+        MinHash подписей в памяти процесса."""
+        recipe = get_object_or_404(Recipe.objects.only('id'), pk=pk)
+        limit = to_int_or_none(request.query_params.get('limit'))
+        if limit is None or not 0 < limit <= self.max_similar:
+            limit = self.default_similar
+        scores = get_similarity_index().similar(recipe.id, limit)
+        recipes = Recipe.objects.defer('search_vector', 'minhash').in_bulk(
+            [recipe_id for recipe_id, _ in scores]
+        )
+        similar = []
+        for recipe_id, similarity in scores:
+            if recipe_id in recipes:
+                recipes[recipe_id].similarity = similarity
+                similar.append(recipes[recipe_id])
+        return Response(self.get_serializer(similar, many=True).data)
+
+    @staticmethod
+    def get_ingredient_ids(request):
+        """Множество id ингредиентов из параметра ingredients."""
+        values = [
+            value for param in request.query_params.getlist('ingredients')
+            for value in param.split(',') if value.strip()
+        ]
+        ingredient_ids = {to_int_or_none(value) for value in values}
+        if not ingredient_ids or None in ingredient_ids:
+            raise ValidationError({
+                'ingredients': ['Укажите id ингредиентов через запятую.']
+            })
+        return ingredient_ids
+
     @staticmethod
+    def get_missing_ingredients(recipe_ids, ingredient_ids):
+        """Ингредиенты рецептов recipe_ids, которых нет
+        среди ingredient_ids, одним запросом."""
+        missing = defaultdict(list)
+        for ingredient_amount in IngredientAmount.objects.filter(
+            recipe_id__in=recipe_ids
+        ).exclude(
+            ingredient_id__in=ingredient_ids
+        ).select_related('ingredient').order_by('ingredient__name'):
+            missing[ingredient_amount.recipe_id].append(ingredient_amount)
+        return missing
+
+    @staticmethod
+    @transaction.atomic
     def create_obj(serializer_class, pk, request):
         """Создание и сериализация объекта."""
         data = {'user': request.user.id, 'recipe': pk}
@@ -109,6 +276,7 @@ class RecipeViewSet(ModelViewSet):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @staticmethod
+    @transaction.atomic
     def delete_obj(obj_class, pk, request, message):
         """Удаление объекта."""
         obj = obj_class.objects.filter(user_id=request.user.id, recipe_id=pk)
@@ -126,7 +294,8 @@ class SubscriptionListViewSet(ListViewSet):
     pagination_class = SubscriptionPagination
 
     def get_queryset(self):
-        """Получение всех подписок пользователя."""
+        """Получение всех подписок пользователя,
+        количество рецептов хранится в счетчике автора."""
         return User.objects.filter(subscriptions__user=self.request.user)
 
 
@@ -147,16 +316,18 @@ class SubscribeView(APIView):
         if author == request.user:
             return Response({'errors': 'нельзя подписаться на себя'},
                             status=status.HTTP_400_BAD_REQUEST)
+        serializer = self.serializer_class(
+            author, context={'request': request}
+        )
+        # Ошибка в recipes_limit не должна оставлять созданную подписку.
+        serializer.get_recipes_limit()
 
         Subscription.objects.create(
             user=request.user,
             author=author
         )
 
-        return Response(
-            self.serializer_class(author, context={'request': request}).data,
-            status=status.HTTP_201_CREATED
-        )
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def delete(self, request, *args, **kwargs):
         """Удаление подписки на автора."""
@@ -172,3 +343,12 @@ class SubscribeView(APIView):
         subscription.delete()
 
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class MetricsView(APIView):
+    """Метрики запросов всех процессов в формате Prometheus,
+    только для администраторов."""
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return HttpResponse(render(collect()), content_type=CONTENT_TYPE)
@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 from django.core.management.utils import get_random_secret_key
 
@@ -33,6 +34,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -75,6 +77,54 @@ DATABASES = {
     }
 }
 
+# Версии кеша страниц, фрагментов, снимков и индексов в памяти процессов
+# должны быть общими для всех процессов gunicorn: в docker-compose
+# используется memcached. LocMemCache по умолчанию подходит только для
+# разработки и тестов с одним процессом, см. проверку api.W001.
+CACHE_BACKEND = os.getenv(
+    'CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache')
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv('CACHE_LOCATION', default='foodgram'),
+    }
+}
+if 'memcached' not in CACHE_BACKEND:
+    # Страница из 1000 рецептов — это 1000 фрагментов и сама страница,
+    # меньший предел вытеснял бы фрагменты на каждом запросе.
+    CACHES['default']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', default=50000)),
+    }
+
+RECIPE_PAGE_CACHE_TIMEOUT = int(
+    os.getenv('RECIPE_PAGE_CACHE_TIMEOUT', default=300))
+# Срок хранения журнала изменений индексов в памяти процессов.
+INDEX_CHANGES_TIMEOUT = int(
+    os.getenv('INDEX_CHANGES_TIMEOUT', default=3600))
+
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', default=10000))
+FEED_BACKFILL_LIMIT = int(os.getenv('FEED_BACKFILL_LIMIT', default=100))
+FEED_BATCH_SIZE = int(os.getenv('FEED_BATCH_SIZE', default=1000))
+FEED_POPULAR_AUTHORS_TIMEOUT = int(
+    os.getenv('FEED_POPULAR_AUTHORS_TIMEOUT', default=300))
+
+# Пользователей в одном UPDATE списков покупок при изменении рецепта.
+SHOPPING_LIST_BATCH = int(os.getenv('SHOPPING_LIST_BATCH', default=500))
+
+TRENDING_HALF_LIFE_HOURS = float(
+    os.getenv('TRENDING_HALF_LIFE_HOURS', default=72))
+TRENDING_FAVORITE_WEIGHT = float(
+    os.getenv('TRENDING_FAVORITE_WEIGHT', default=1))
+TRENDING_SHOPPING_CART_WEIGHT = float(
+    os.getenv('TRENDING_SHOPPING_CART_WEIGHT', default=0.5))
+TRENDING_BATCH_SIZE = int(os.getenv('TRENDING_BATCH_SIZE', default=500))
+
+METRICS_DIR = os.getenv(
+    'METRICS_DIR',
+    default=os.path.join(tempfile.gettempdir(), 'foodgram_metrics'))
+METRICS_FLUSH_INTERVAL = float(
+    os.getenv('METRICS_FLUSH_INTERVAL', default=10))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME':
@@ -2,7 +2,7 @@ from django.contrib import admin
 
 from .models import (
     Ingredient, Tag, Subscription, Recipe, IngredientAmount, Favorite,
-    ShoppingCart
+    ShoppingCart, ShoppingListItem, FeedEntry
 )
 
 
@@ -12,7 +12,7 @@ class IngredientAdmin(admin.ModelAdmin):
 
 
 class TagAdmin(admin.ModelAdmin):
-    list_display = ('pk', 'name', 'color', 'slug')
+    list_display = ('pk', 'name', 'color', 'slug', 'bit')
     search_fields = ('name', 'slug')
 
 
@@ -32,7 +32,8 @@ class RecipeInlineAdmin(admin.TabularInline):
 class RecipeAdmin(admin.ModelAdmin):
     inlines = [RecipeInlineAdmin, ]
     list_display = ('pk', 'name', 'text', 'cooking_time',
-                    'image', 'author', 'pub_date')
+                    'image', 'author', 'pub_date', 'favorites_count')
+    readonly_fields = ('favorites_count',)
     filter_horizontal = ('tags', 'ingredients')
     search_fields = ('user',)
 
@@ -49,6 +50,16 @@ class ShoppingCartAdmin(admin.ModelAdmin):
     list_display = ('pk', 'user', 'recipe')
 
 
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'user', 'ingredient', 'total_amount')
+
+
+class FeedEntryAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'user', 'recipe', 'author', 'pub_date')
+
+
+admin.site.register(ShoppingListItem, ShoppingListItemAdmin)
+admin.site.register(FeedEntry, FeedEntryAdmin)
 admin.site.register(ShoppingCart, ShoppingCartAdmin)
 admin.site.register(Favorite, FavoriteAdmin)
 admin.site.register(IngredientAmount, IngredientAmountAdmin)
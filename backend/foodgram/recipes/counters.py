@@ -0,0 +1,36 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Favorite, Recipe, User
+
+
+def count_subquery(model, field):
+    """Подзапрос количества строк model, ссылающихся на объект."""
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{field: OuterRef('pk')}
+        ).order_by().values(field).annotate(count=Count('pk')).values('count'),
+        output_field=IntegerField()
+    ), 0)
+
+
+def recount(queryset, counter, model, field, batch_size=1000):
+    """Исправление счетчика counter у объектов queryset по фактическому
+    количеству строк model пачками по batch_size объектов.
+    Возвращает число исправленных объектов."""
+    drifted = list(queryset.annotate(
+        actual=count_subquery(model, field)
+    ).filter(~Q(**{counter: F('actual')})).values_list('pk', flat=True))
+    for start in range(0, len(drifted), batch_size):
+        queryset.filter(pk__in=drifted[start:start + batch_size]).update(
+            **{counter: count_subquery(model, field)}
+        )
+    return len(drifted)
+
+
+def recount_favorites():
+    return recount(Recipe.objects.all(), 'favorites_count', Favorite, 'recipe')
+
+
+def recount_recipes():
+    return recount(User.objects.all(), 'recipes_count', Recipe, 'author')
@@ -0,0 +1,232 @@
+import heapq
+from collections import namedtuple
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, F, Max, Min, Q, Window
+from django.db.models.functions import RowNumber
+
+from .models import FeedEntry, PopularAuthor, Recipe, Subscription
+
+POPULAR_AUTHORS_KEY = 'feed:popular_authors'
+
+FeedItem = namedtuple('FeedItem', ('pub_date', 'recipe_id'))
+
+
+def get_popular_authors():
+    """Авторы, у которых подписчиков больше FEED_FANOUT_LIMIT.
+    Их рецепты не раскладываются по лентам подписчиков, а
+    подмешиваются при чтении ленты. Множество кешируется на
+    FEED_POPULAR_AUTHORS_TIMEOUT, чтобы запись и чтение ленты
+    одинаково относили автора к популярным."""
+    popular = cache.get(POPULAR_AUTHORS_KEY)
+    if popular is None:
+        popular = set(Subscription.objects.values('author_id').annotate(
+            followers=Count('id')
+        ).filter(
+            followers__gt=settings.FEED_FANOUT_LIMIT
+        ).values_list('author_id', flat=True))
+        update_popular_authors(popular)
+        cache.set(POPULAR_AUTHORS_KEY, popular,
+                  settings.FEED_POPULAR_AUTHORS_TIMEOUT)
+    return popular
+
+
+def update_popular_authors(popular):
+    """Сохранение множества популярных авторов. Рецепты авторов,
+    вернувшихся к обычным, опубликованные, пока они считались
+    популярными, раскладываются по лентам подписчиков. Период
+    расширяется на FEED_POPULAR_AUTHORS_TIMEOUT: столько другие
+    процессы могли продолжать считать автора популярным."""
+    known = dict(PopularAuthor.objects.values_list('author_id', 'since'))
+    PopularAuthor.objects.bulk_create(
+        (PopularAuthor(author_id=author_id)
+         for author_id in popular if author_id not in known),
+        ignore_conflicts=True
+    )
+    demoted = {author_id: since for author_id, since in known.items()
+               if author_id not in popular}
+    if not demoted:
+        return
+    PopularAuthor.objects.filter(author_id__in=demoted).delete()
+    margin = timedelta(seconds=settings.FEED_POPULAR_AUTHORS_TIMEOUT)
+    for author_id, since in demoted.items():
+        fan_in(author_id, since - margin)
+
+
+def create_entries(entries):
+    """Вставка записей лент пачками по FEED_BATCH_SIZE, но не больше,
+    чем допускает база: Django 2.2 не ограничивает явный batch_size."""
+    entries = list(entries)
+    batch_size = min(settings.FEED_BATCH_SIZE, connection.ops.bulk_batch_size(
+        FeedEntry._meta.concrete_fields, entries
+    ))
+    FeedEntry.objects.bulk_create(
+        entries, batch_size=batch_size or None, ignore_conflicts=True
+    )
+
+
+def fan_out(recipe):
+    """Добавление нового рецепта в ленты подписчиков автора
+    пачками по FEED_BATCH_SIZE записей."""
+    if recipe.author_id in get_popular_authors():
+        return
+    followers = Subscription.objects.filter(
+        author_id=recipe.author_id
+    ).values_list('user_id', flat=True).iterator()
+    create_entries(
+        FeedEntry(user_id=user_id, recipe_id=recipe.id,
+                  author_id=recipe.author_id, pub_date=recipe.pub_date)
+        for user_id in followers
+    )
+
+
+def fan_in(author_id, since):
+    """Добавление рецептов автора, опубликованных с момента since,
+    в ленты всех его подписчиков."""
+    recipes = list(Recipe.objects.filter(
+        author_id=author_id, pub_date__gte=since
+    ).values_list('id', 'pub_date'))
+    if not recipes:
+        return
+    followers = Subscription.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True).iterator()
+    create_entries(
+        FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                  author_id=author_id, pub_date=pub_date)
+        for user_id in followers for recipe_id, pub_date in recipes
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавление в ленту пользователя последних FEED_BACKFILL_LIMIT
+    рецептов автора, на которого он подписался."""
+    if author_id in get_popular_authors():
+        return
+    recipes = Recipe.objects.filter(author_id=author_id).values_list(
+        'id', 'pub_date'
+    )[:settings.FEED_BACKFILL_LIMIT]
+    create_entries(
+        FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                  author_id=author_id, pub_date=pub_date)
+        for recipe_id, pub_date in recipes
+    )
+
+
+def remove_author(user_id, author_id):
+    """Удаление рецептов автора из ленты отписавшегося пользователя."""
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def insert_entries(subscriptions, recipes):
+    """Вставка в ленты подписчиков последних FEED_BACKFILL_LIMIT
+    рецептов авторов одним INSERT ... SELECT: ограничение применяется
+    оконной функцией ROW_NUMBER() OVER (PARTITION BY author)."""
+    ranked = recipes.order_by().annotate(row_number=Window(
+        expression=RowNumber(),
+        partition_by=(F('author_id'),),
+        order_by=(F('pub_date').desc(), F('id').desc()),
+    )).values('id', 'author_id', 'pub_date', 'row_number')
+    ranked_sql, ranked_params = ranked.query.sql_with_params()
+    followers_sql, followers_params = subscriptions.order_by().values(
+        'user_id', 'author_id'
+    ).query.sql_with_params()
+    ops = connection.ops
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{ops.insert_statement(ignore_conflicts=True)} '
+            f'{ops.quote_name(FeedEntry._meta.db_table)} '
+            f'(user_id, recipe_id, author_id, pub_date) '
+            f'SELECT followers.user_id, ranked.id, ranked.author_id, '
+            f'ranked.pub_date FROM ({followers_sql}) followers '
+            f'JOIN ({ranked_sql}) ranked '
+            f'ON ranked.author_id = followers.author_id '
+            f'WHERE ranked.row_number <= %s '
+            f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}',
+            (*followers_params, *ranked_params,
+             settings.FEED_BACKFILL_LIMIT)
+        )
+
+
+def rebuild_feeds(user_ids=None):
+    """Пересоздание лент пользователей user_ids (всех, если не заданы)
+    по их подпискам, как если бы каждый заново подписался на своих
+    авторов. Все ленты заполняются по диапазонам из FEED_BATCH_SIZE
+    id авторов, одним запросом на диапазон. Возвращает количество
+    обработанных подписок."""
+    entries = FeedEntry.objects.all()
+    subscriptions = Subscription.objects.all()
+    if user_ids:
+        entries = entries.filter(user_id__in=user_ids)
+        subscriptions = subscriptions.filter(user_id__in=user_ids)
+    entries.delete()
+    count = subscriptions.count()
+    subscriptions = subscriptions.exclude(
+        author_id__in=get_popular_authors()
+    )
+    if user_ids:
+        insert_entries(subscriptions, Recipe.objects.filter(
+            author_id__in=subscriptions.values('author_id')
+        ))
+        return count
+    bounds = subscriptions.aggregate(
+        first=Min('author_id'), last=Max('author_id')
+    )
+    if bounds['first'] is None:
+        return count
+    step = settings.FEED_BATCH_SIZE
+    for start in range(bounds['first'], bounds['last'] + 1, step):
+        authors = {'author_id__gte': start, 'author_id__lt': start + step}
+        insert_entries(
+            subscriptions.filter(**authors),
+            Recipe.objects.filter(**authors)
+        )
+    return count
+
+
+def after_position(position, date_field, id_field):
+    """Условие «строго после позиции (pub_date, recipe_id)»
+    в порядке убывания, с ограничением первого поля для прохода
+    по индексу."""
+    if position is None:
+        return Q()
+    pub_date, recipe_id = position
+    return Q(**{f'{date_field}__lte': pub_date}) & (
+        Q(**{f'{date_field}__lt': pub_date})
+        | Q(**{date_field: pub_date, f'{id_field}__lt': recipe_id})
+    )
+
+
+def get_feed(user_id, position=None, limit=10):
+    """До limit записей ленты пользователя после позиции position
+    в порядке убывания даты публикации.
+
+    Лента читается одним проходом по индексу (user, pub_date, recipe)
+    таблицы записей, рецепты популярных авторов, на которых подписан
+    пользователь, выбираются по индексу рецептов и сливаются с ней."""
+    popular = get_popular_authors()
+    entries = FeedEntry.objects.filter(
+        after_position(position, 'pub_date', 'recipe_id'), user_id=user_id
+    )
+    followed_popular = []
+    if popular:
+        entries = entries.exclude(author_id__in=popular)
+        followed_popular = list(Subscription.objects.filter(
+            user_id=user_id, author_id__in=popular
+        ).values_list('author_id', flat=True))
+    entries = entries.order_by('-pub_date', '-recipe_id').values_list(
+        'pub_date', 'recipe_id'
+    )[:limit]
+    if not followed_popular:
+        return [FeedItem(*entry) for entry in entries]
+    recipes = Recipe.objects.filter(
+        after_position(position, 'pub_date', 'id'),
+        author_id__in=followed_popular
+    ).order_by('-pub_date', '-id').values_list('pub_date', 'id')[:limit]
+    return [FeedItem(*item) for item in islice(
+        heapq.merge(entries, recipes, reverse=True), limit
+    )]
@@ -0,0 +1,17 @@
+from django.db import models
+
+
+class BitMaskField(models.BigIntegerField):
+    """Битовая маска в целочисленной колонке."""
+
+
+@BitMaskField.register_lookup
+class HasAnyBits(models.Lookup):
+    """Условие «установлен хотя бы один бит маски»:
+    field__hasany=mask."""
+    lookup_name = 'hasany'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'({lhs} & {rhs}) <> 0', lhs_params + rhs_params
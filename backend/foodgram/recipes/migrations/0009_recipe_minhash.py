@@ -0,0 +1,59 @@
+# Generated by Django 2.2.16 on 2026-10-18 16:52
+
+import random
+from array import array
+from itertools import groupby
+from operator import itemgetter
+
+from django.db import migrations, models
+
+# Копия хеширования recipes.minhash на момент миграции, чтобы
+# последующие изменения модуля не меняли ее результат.
+PRIME = (1 << 61) - 1
+MASK = (1 << 32) - 1
+_random = random.Random(1)
+PERMUTATIONS = tuple(
+    (_random.randrange(1, PRIME), _random.randrange(PRIME))
+    for _ in range(64)
+)
+
+
+def signature(ingredient_ids):
+    hashes = [
+        [((a * ingredient_id + b) % PRIME) & MASK for a, b in PERMUTATIONS]
+        for ingredient_id in set(ingredient_ids)
+    ]
+    return array('I', (min(column) for column in zip(*hashes))).tobytes()
+
+
+def fill_minhash(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    IngredientAmount = apps.get_model('recipes', 'IngredientAmount')
+    rows = IngredientAmount.objects.order_by('recipe_id').values_list(
+        'recipe_id', 'ingredient_id'
+    ).iterator()
+    recipes = []
+    for recipe_id, group in groupby(rows, key=itemgetter(0)):
+        recipes.append(Recipe(
+            pk=recipe_id, minhash=signature(map(itemgetter(1), group))
+        ))
+        if len(recipes) == 1000:
+            Recipe.objects.bulk_update(recipes, ['minhash'])
+            recipes = []
+    Recipe.objects.bulk_update(recipes, ['minhash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='minhash',
+            field=models.BinaryField(null=True, verbose_name='MinHash подпись ингредиентов'),
+        ),
+        migrations.RunPython(fill_minhash, migrations.RunPython.noop),
+    ]
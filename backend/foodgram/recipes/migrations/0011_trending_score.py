@@ -0,0 +1,65 @@
+# Generated by Django 2.2.16 on 2026-10-18 16:56
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.utils.timezone
+
+
+def backfill_created(apps, schema_editor):
+    """Дата добавления существующих записей избранного и списков
+    покупок неизвестна: берется дата публикации рецепта, чтобы
+    старые записи не попали в рейтинг трендов как новые."""
+    Recipe = apps.get_model('recipes', 'Recipe')
+    pub_date = Recipe.objects.filter(pk=OuterRef('recipe_id')).values(
+        'pub_date'
+    )[:1]
+    for name in ('Favorite', 'ShoppingCart'):
+        apps.get_model('recipes', name).objects.update(
+            created=Subquery(pub_date)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_feedentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('favorite_id', models.BigIntegerField(default=0, verbose_name='Последняя учтенная запись избранного')),
+                ('shopping_cart_id', models.BigIntegerField(default=0, verbose_name='Последняя учтенная запись списка покупок')),
+                ('landmark', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Опорный момент времени')),
+                ('updated', models.DateTimeField(null=True, verbose_name='Дата пересчета')),
+            ],
+            options={
+                'verbose_name': 'Состояние рейтинга трендов',
+                'verbose_name_plural': 'Состояние рейтинга трендов',
+            },
+        ),
+        migrations.AddField(
+            model_name='favorite',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='trending_score',
+            field=models.FloatField(default=0, editable=False, verbose_name='Рейтинг трендов'),
+        ),
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-trending_score', '-id'], name='recipe_trending_score_id_idx'),
+        ),
+        migrations.RunPython(backfill_created, migrations.RunPython.noop),
+    ]
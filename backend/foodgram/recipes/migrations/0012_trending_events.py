@@ -0,0 +1,66 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:40
+
+from django.db import migrations, models
+
+
+def mark_scored(apps, schema_editor):
+    """Записи до последней учтенной по прежней отметке id уже вошли
+    в рейтинг трендов."""
+    state = apps.get_model('recipes', 'TrendingState').objects.first()
+    if state is None:
+        return
+    for name, last_id in (('Favorite', state.favorite_id),
+                          ('ShoppingCart', state.shopping_cart_id)):
+        apps.get_model('recipes', name).objects.filter(
+            id__lte=last_id
+        ).update(scored=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_trending_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingRemoval',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipe_id', models.IntegerField(verbose_name='Рецепт')),
+                ('weight', models.FloatField(verbose_name='Вес события')),
+                ('created', models.DateTimeField(verbose_name='Дата события')),
+            ],
+            options={
+                'verbose_name': 'Удаление из рейтинга трендов',
+                'verbose_name_plural': 'Удаления из рейтинга трендов',
+            },
+        ),
+        migrations.AddField(
+            model_name='favorite',
+            name='scored',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Учтено в рейтинге трендов'),
+        ),
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='scored',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Учтено в рейтинге трендов'),
+        ),
+        migrations.RunPython(mark_scored, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='trendingstate',
+            name='favorite_id',
+        ),
+        migrations.RemoveField(
+            model_name='trendingstate',
+            name='shopping_cart_id',
+        ),
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(condition=models.Q(scored=False), fields=['id'], name='favorite_unscored_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shoppingcart',
+            index=models.Index(condition=models.Q(scored=False), fields=['id'], name='shopping_cart_unscored_idx'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+import random
+from array import array
+from functools import lru_cache
+
+NUM_PERMUTATIONS = 64
+PRIME = (1 << 61) - 1
+MASK = (1 << 32) - 1
+SEED = 1
+
+_random = random.Random(SEED)
+PERMUTATIONS = tuple(
+    (_random.randrange(1, PRIME), _random.randrange(PRIME))
+    for _ in range(NUM_PERMUTATIONS)
+)
+
+
+def signature(ingredient_ids):
+    """MinHash подпись множества ингредиентов: для каждой из
+    NUM_PERMUTATIONS хеш-функций ((a * x + b) mod PRIME) & MASK
+    минимальное значение на множестве. Для пустого множества None."""
+    ingredient_ids = set(ingredient_ids)
+    if not ingredient_ids:
+        return None
+    return array('I', (
+        min(column) for column in zip(*map(hashes, ingredient_ids))
+    ))
+
+
+@lru_cache(maxsize=1 << 16)
+def hashes(ingredient_id):
+    """Значения всех хеш-функций для ингредиента, ингредиентов немного,
+    поэтому подпись рецепта сводится к поэлементному минимуму."""
+    return tuple(((a * ingredient_id + b) % PRIME) & MASK
+                 for a, b in PERMUTATIONS)
+
+
+def to_bytes(value):
+    """Компактное представление подписи для хранения в базе."""
+    return None if value is None else value.tobytes()
+
+
+def from_bytes(data):
+    sig = array('I')
+    sig.frombytes(bytes(data))
+    return sig
+
+
+def similarity(first, second):
+    """Оценка коэффициента Жаккара по доле совпавших значений подписей."""
+    return sum(x == y for x, y in zip(first, second)) / len(first)
+
+
+def jaccard(first, second):
+    """Точный коэффициент Жаккара двух множеств."""
+    if not first and not second:
+        return 0.0
+    return len(first & second) / len(first | second)
@@ -1,13 +1,19 @@
 from colorfield.fields import ColorField
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.db.models import Q, F
+from django.utils import timezone
 from django.core.validators import (
     MinValueValidator, MaxValueValidator, ValidationError
 )
 
+from .fields import BitMaskField
+
 User = get_user_model()
 
+TAG_BITS = 63
+
 
 class Ingredient(models.Model):
     """Модель ингредиентов."""
@@ -50,11 +56,39 @@ class Tag(models.Model):
         unique=True,
         verbose_name='Короткое название тега'
     )
+    bit = models.PositiveSmallIntegerField(
+        unique=True,
+        editable=False,
+        verbose_name='Бит тега в маске рецепта'
+    )
 
     class Meta:
         verbose_name = 'Тег'
         verbose_name_plural = 'Теги'
 
+    def clean(self):
+        if self.bit is None:
+            self.bit = self.get_free_bit()
+        return super(Tag, self).clean()
+
+    def save(self, *args, **kwargs):
+        if self.bit is None:
+            self.bit = self.get_free_bit()
+        super(Tag, self).save(*args, **kwargs)
+
+    @staticmethod
+    def get_free_bit():
+        """Младший бит, не занятый другими тегами."""
+        used = set(Tag.objects.values_list('bit', flat=True))
+        for bit in range(TAG_BITS):
+            if bit not in used:
+                return bit
+        raise ValidationError(f'Нельзя создать больше {TAG_BITS} тегов')
+
+    @property
+    def mask(self):
+        return 1 << self.bit
+
     def __str__(self):
         return self.name
 
@@ -123,11 +157,44 @@ class Recipe(models.Model):
         verbose_name='Дата публикации',
         auto_now_add=True
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Добавлений в избранное'
+    )
+    tags_mask = BitMaskField(
+        default=0,
+        editable=False,
+        verbose_name='Маска тегов'
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор'
+    )
+    minhash = models.BinaryField(
+        null=True,
+        editable=False,
+        verbose_name='MinHash подпись ингредиентов'
+    )
+    trending_score = models.FloatField(
+        default=0,
+        editable=False,
+        verbose_name='Рейтинг трендов'
+    )
 
     class Meta:
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = (
+            models.Index(fields=('-pub_date', '-id'),
+                         name='recipe_pub_date_id_idx'),
+            models.Index(fields=('-favorites_count', '-id'),
+                         name='recipe_favorites_count_id_idx'),
+            models.Index(fields=('-trending_score', '-id'),
+                         name='recipe_trending_score_id_idx'),
+        )
 
     def __str__(self):
         return self.name
@@ -175,6 +242,15 @@ class Favorite(models.Model):
         related_name='favorites',
         verbose_name='Избранное'
     )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата добавления'
+    )
+    scored = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name='Учтено в рейтинге трендов'
+    )
 
     class Meta:
         unique_together = ('user', 'recipe')
@@ -184,6 +260,10 @@ class Favorite(models.Model):
             models.UniqueConstraint(fields=('user', 'recipe'),
                                     name='unique_favorite'),
         )
+        indexes = (
+            models.Index(fields=('id',), name='favorite_unscored_idx',
+                         condition=Q(scored=False)),
+        )
 
     def __str__(self):
         return self.user.username + ' следит за ' + self.recipe.name
@@ -203,6 +283,15 @@ class ShoppingCart(models.Model):
         related_name='carts',
         verbose_name='Рецепт'
     )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата добавления'
+    )
+    scored = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name='Учтено в рейтинге трендов'
+    )
 
     class Meta:
         unique_together = ('user', 'recipe')
@@ -212,3 +301,136 @@ class ShoppingCart(models.Model):
             models.UniqueConstraint(fields=('user', 'recipe'),
                                     name='unique_shopping_cart'),
         )
+        indexes = (
+            models.Index(fields=('id',), name='shopping_cart_unscored_idx',
+                         condition=Q(scored=False)),
+        )
+
+
+class ShoppingListItem(models.Model):
+    """Модель суммарного количества ингредиента в списке покупок
+    пользователя, обновляется при изменении списка покупок."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Ингредиент'
+    )
+    total_amount = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Общее количество'
+    )
+
+    class Meta:
+        verbose_name = 'Ингредиент списка покупок'
+        verbose_name_plural = 'Ингредиенты списка покупок'
+        constraints = (
+            models.UniqueConstraint(fields=('user', 'ingredient'),
+                                    name='unique_shopping_list_item'),
+        )
+
+    def __str__(self):
+        return f'{self.user.username}: {self.ingredient} {self.total_amount}'
+
+
+class FeedEntry(models.Model):
+    """Модель записи ленты подписок пользователя: рецепт автора,
+    на которого он подписан. Записи создаются при публикации рецепта
+    и при подписке, дата публикации копируется из рецепта, чтобы
+    страница ленты читалась одним проходом по индексу."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='Пользователь'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        ordering = ('-pub_date', '-recipe_id')
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = (
+            models.UniqueConstraint(fields=('user', 'recipe'),
+                                    name='unique_feed_entry'),
+        )
+        indexes = (
+            models.Index(fields=('user', '-pub_date', '-recipe'),
+                         name='feed_user_pub_date_idx'),
+        )
+
+    def __str__(self):
+        return f'{self.user.username}: {self.recipe.name}'
+
+
+class PopularAuthor(models.Model):
+    """Модель автора, рецепты которого не раскладываются по лентам
+    подписчиков: хранит момент, с которого автор считается популярным,
+    чтобы при возврате к обычным разложить рецепты за этот период."""
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    since = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Популярен с'
+    )
+
+    class Meta:
+        verbose_name = 'Популярный автор'
+        verbose_name_plural = 'Популярные авторы'
+
+
+class TrendingState(models.Model):
+    """Модель состояния пересчета рейтинга трендов: опорный момент
+    времени, относительно которого рассчитаны веса в рейтинге рецептов."""
+    landmark = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Опорный момент времени'
+    )
+    updated = models.DateTimeField(
+        null=True,
+        verbose_name='Дата пересчета'
+    )
+
+    class Meta:
+        verbose_name = 'Состояние рейтинга трендов'
+        verbose_name_plural = 'Состояние рейтинга трендов'
+
+    def __str__(self):
+        return f'Рейтинг трендов на {self.updated}'
+
+
+class TrendingRemoval(models.Model):
+    """Модель удаленных записей избранного и списков покупок, уже
+    учтенных в рейтинге трендов: при пересчете их вес вычитается.
+    Рецепт хранится без внешнего ключа, так как запись создается
+    и при каскадном удалении самого рецепта."""
+    recipe_id = models.IntegerField(verbose_name='Рецепт')
+    weight = models.FloatField(verbose_name='Вес события')
+    created = models.DateTimeField(verbose_name='Дата события')
+
+    class Meta:
+        verbose_name = 'Удаление из рейтинга трендов'
+        verbose_name_plural = 'Удаления из рейтинга трендов'
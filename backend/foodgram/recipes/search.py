@@ -0,0 +1,81 @@
+from django.contrib.postgres.lookups import TrigramSimilar
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, TrigramSimilarity
+)
+from django.db import connection
+from django.db.models import (
+    Case, CharField, F, Func, IntegerField, Q, Value, When
+)
+
+SEARCH_CONFIG = 'russian'
+
+CharField.register_lookup(TrigramSimilar)
+
+
+class PostgresRecipeSearch:
+    """Полнотекстовый поиск по поисковому вектору рецепта.
+
+    Вектор из названия (вес A) и описания (вес B) поддерживается
+    триггером и проиндексирован GIN индексом, результаты упорядочены
+    по релевантности. Если по словам ничего не найдено, выполняется
+    поиск по триграммам названия, который находит слова с опечатками."""
+
+    def search(self, queryset, query):
+        search_query = SearchQuery(query, config=SEARCH_CONFIG)
+        matched = queryset.filter(search_vector=search_query)
+        if matched.exists():
+            return matched.annotate(
+                search_rank=SearchRank(F('search_vector'), search_query)
+            ).order_by('-search_rank', '-id')
+        return queryset.filter(name__trigram_similar=query).annotate(
+            search_rank=TrigramSimilarity('name', query)
+        ).order_by('-search_rank', '-id')
+
+
+class Casefold(Func):
+    """Приведение строки к нижнему регистру с учетом Unicode функцией
+    CASEFOLD, которую add_sqlite_functions добавляет в SQLite."""
+    function = 'CASEFOLD'
+    output_field = CharField()
+
+
+def casefold(value):
+    return None if value is None else value.casefold()
+
+
+def add_sqlite_functions(connection):
+    """Функции поиска для соединения с SQLite: встроенные lower()
+    и LIKE не учитывают регистр только у латиницы."""
+    connection.connection.create_function('CASEFOLD', 1, casefold)
+
+
+class SimpleRecipeSearch:
+    """Поиск по вхождению строки в название или описание для баз
+    без полнотекстового поиска, совпадения в названии идут первыми.
+    В SQLite обе стороны приводятся к нижнему регистру функцией
+    CASEFOLD, так как LIKE не учитывает регистр только у латиницы."""
+
+    def search(self, queryset, query):
+        if connection.vendor == 'sqlite':
+            queryset = queryset.annotate(
+                search_name=Casefold('name'), search_text=Casefold('text')
+            )
+            query = query.casefold()
+            in_name = Q(search_name__contains=query)
+            in_text = Q(search_text__contains=query)
+        else:
+            in_name = Q(name__icontains=query)
+            in_text = Q(text__icontains=query)
+        return queryset.filter(in_name | in_text).annotate(search_rank=Case(
+            When(in_name, then=Value(1)),
+            default=Value(0),
+            output_field=IntegerField()
+        )).order_by('-search_rank', '-id')
+
+
+def search_recipes(queryset, query):
+    """Рецепты queryset, найденные по строке query, в порядке
+    релевантности. Способ поиска выбирается по используемой базе."""
+    if connection.vendor == 'postgresql':
+        return PostgresRecipeSearch().search(queryset, query)
+    return SimpleRecipeSearch().search(queryset, query)
@@ -0,0 +1,145 @@
+from collections import defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+
+from .models import IngredientAmount, ShoppingCart, ShoppingListItem
+
+
+def get_recipe_amounts(recipe_id):
+    """Количество ингредиентов рецепта в виде {ingredient_id: amount}."""
+    return dict(IngredientAmount.objects.filter(
+        recipe_id=recipe_id
+    ).values_list('ingredient_id', 'amount'))
+
+
+def change_shopping_lists(user_ids, amounts):
+    """Прибавление amounts ({ingredient_id: изменение}) к спискам
+    покупок пользователей user_ids одним UPDATE, строки с нулевым
+    количеством удаляются."""
+    amounts = {ingredient_id: amount
+               for ingredient_id, amount in amounts.items() if amount}
+    user_ids = list(user_ids)
+    if not amounts or not user_ids:
+        return
+    created = [
+        ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id)
+        for user_id in user_ids
+        for ingredient_id, amount in amounts.items() if amount > 0
+    ]
+    # Django 2.2 не ограничивает явный batch_size пределами базы.
+    ShoppingListItem.objects.bulk_create(
+        created, ignore_conflicts=True, batch_size=min(
+            settings.SHOPPING_LIST_BATCH, connection.ops.bulk_batch_size(
+                ShoppingListItem._meta.concrete_fields, created
+            )
+        ) or None
+    )
+    items = ShoppingListItem.objects.filter(
+        user_id__in=user_ids, ingredient_id__in=amounts
+    )
+    items.update(total_amount=F('total_amount') + Case(
+        *(When(ingredient_id=ingredient_id, then=Value(amount))
+          for ingredient_id, amount in amounts.items()),
+        output_field=IntegerField()
+    ))
+    items.filter(total_amount=0).delete()
+
+
+def add_recipe(user_id, recipe_id):
+    """Добавление ингредиентов рецепта в список покупок пользователя."""
+    change_shopping_lists([user_id], get_recipe_amounts(recipe_id))
+
+
+def remove_recipe(user_id, recipe_id):
+    """Удаление ингредиентов рецепта из списка покупок пользователя."""
+    change_shopping_lists([user_id], {
+        ingredient_id: -amount
+        for ingredient_id, amount in get_recipe_amounts(recipe_id).items()
+    })
+
+
+def change_recipe(recipe_id, old_amounts, new_amounts):
+    """Перенос изменения ингредиентов рецепта в списки покупок
+    всех пользователей, у которых рецепт в списке покупок,
+    пачками по SHOPPING_LIST_BATCH пользователей."""
+    amounts = {
+        ingredient_id: (new_amounts.get(ingredient_id, 0)
+                        - old_amounts.get(ingredient_id, 0))
+        for ingredient_id in set(old_amounts) | set(new_amounts)
+    }
+    if not any(amounts.values()):
+        return
+    user_ids = ShoppingCart.objects.filter(
+        recipe_id=recipe_id
+    ).values_list('user_id', flat=True).iterator()
+    batch = list(islice(user_ids, settings.SHOPPING_LIST_BATCH))
+    while batch:
+        change_shopping_lists(batch, amounts)
+        batch = list(islice(user_ids, settings.SHOPPING_LIST_BATCH))
+
+
+def calculate_shopping_lists(user_ids=None):
+    """Списки покупок, рассчитанные заново по ShoppingCart,
+    в виде {user_id: {ingredient_id: total_amount}}."""
+    if user_ids is None:
+        amounts = IngredientAmount.objects.filter(recipe__carts__isnull=False)
+    else:
+        amounts = IngredientAmount.objects.filter(
+            recipe__carts__user_id__in=user_ids
+        )
+    rows = amounts.values_list(
+        'recipe__carts__user_id', 'ingredient_id'
+    ).annotate(total_amount=Sum('amount')).order_by()
+    result = defaultdict(dict)
+    for user_id, ingredient_id, total_amount in rows.iterator():
+        result[user_id][ingredient_id] = total_amount
+    return result
+
+
+def stored_shopping_lists(user_ids=None):
+    """Сохраненные списки покупок в том же виде,
+    что и calculate_shopping_lists."""
+    items = ShoppingListItem.objects.all()
+    if user_ids is not None:
+        items = items.filter(user_id__in=user_ids)
+    result = defaultdict(dict)
+    for user_id, ingredient_id, total_amount in items.values_list(
+            'user_id', 'ingredient_id', 'total_amount').iterator():
+        result[user_id][ingredient_id] = total_amount
+    return result
+
+
+def find_mismatched_users(user_ids=None):
+    """id пользователей, чьи сохраненные списки покупок
+    отличаются от расчетных, и расчетные списки."""
+    expected = calculate_shopping_lists(user_ids)
+    stored = stored_shopping_lists(user_ids)
+    changed = sorted(
+        user_id for user_id in set(expected) | set(stored)
+        if expected.get(user_id) != stored.get(user_id)
+    )
+    return changed, expected
+
+
+@transaction.atomic
+def rebuild_shopping_lists(user_ids=None, batch_size=1000):
+    """Пересоздание расходящихся списков покупок с нуля.
+    Возвращает id пользователей, чьи списки были пересчитаны."""
+    changed, expected = find_mismatched_users(user_ids)
+    ShoppingListItem.objects.filter(user_id__in=changed).delete()
+    items = [
+        ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id,
+                         total_amount=total_amount)
+        for user_id in changed
+        for ingredient_id, total_amount in expected[user_id].items()
+    ]
+    # Django 2.2 не ограничивает явный batch_size пределами базы.
+    ShoppingListItem.objects.bulk_create(items, batch_size=min(
+        batch_size, connection.ops.bulk_batch_size(
+            ShoppingListItem._meta.concrete_fields, items
+        )
+    ) or None)
+    return changed
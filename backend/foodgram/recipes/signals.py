@@ -0,0 +1,140 @@
+from collections import defaultdict
+
+from django.db.backends.signals import connection_created
+from django.db.models import F
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete
+)
+from django.dispatch import receiver
+
+from . import feed, search, shopping_list, trending
+from .models import Favorite, Recipe, ShoppingCart, Subscription, Tag, User
+
+
+@receiver(connection_created)
+def add_search_functions(sender, connection, **kwargs):
+    """Функции поиска рецептов для соединений с SQLite."""
+    if connection.vendor == 'sqlite':
+        search.add_sqlite_functions(connection)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_list(sender, instance, created, **kwargs):
+    """Добавление ингредиентов рецепта в сводный список покупок."""
+    if created:
+        shopping_list.add_recipe(instance.user_id, instance.recipe_id)
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_from_shopping_list(sender, instance, **kwargs):
+    """Удаление ингредиентов рецепта из сводного списка покупок.
+    Выполняется до удаления, чтобы при каскадном удалении рецепта
+    его ингредиенты еще были в базе."""
+    shopping_list.remove_recipe(instance.user_id, instance.recipe_id)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def remove_from_trending(sender, instance, **kwargs):
+    """Вычитание удаленной записи из рейтинга трендов при пересчете."""
+    trending.remove_event(instance)
+
+
+@receiver(post_save, sender=Favorite)
+def increment_favorites_count(sender, instance, created, **kwargs):
+    """Увеличение счетчика избранного рецепта."""
+    if created:
+        Recipe.objects.filter(pk=instance.recipe_id).update(
+            favorites_count=F('favorites_count') + 1
+        )
+
+
+@receiver(post_delete, sender=Favorite)
+def decrement_favorites_count(sender, instance, **kwargs):
+    """Уменьшение счетчика избранного рецепта."""
+    Recipe.objects.filter(pk=instance.recipe_id, favorites_count__gt=0).update(
+        favorites_count=F('favorites_count') - 1
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(sender, instance, created, **kwargs):
+    """Увеличение счетчика рецептов автора."""
+    if created:
+        User.objects.filter(pk=instance.author_id).update(
+            recipes_count=F('recipes_count') + 1
+        )
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(sender, instance, **kwargs):
+    """Уменьшение счетчика рецептов автора."""
+    User.objects.filter(pk=instance.author_id, recipes_count__gt=0).update(
+        recipes_count=F('recipes_count') - 1
+    )
+
+
+def update_tags_masks(recipe_ids):
+    """Пересчет масок тегов рецептов recipe_ids по их текущим тегам,
+    возвращает словарь новых масок."""
+    masks = defaultdict(int)
+    for recipe_id in recipe_ids:
+        masks[recipe_id] = 0
+    for recipe_id, bit in Recipe.tags.through.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('recipe_id', 'tag__bit'):
+        masks[recipe_id] |= 1 << bit
+    Recipe.objects.bulk_update(
+        [Recipe(pk=pk, tags_mask=mask) for pk, mask in masks.items()],
+        ['tags_mask'], batch_size=1000
+    )
+    return masks
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def change_tags_mask(sender, instance, action, reverse, pk_set, **kwargs):
+    """Синхронизация маски тегов с тегами рецепта. При очистке
+    рецептов тега их список запоминается до удаления связей.
+    Маска обновляется и у экземпляра рецепта, чтобы его последующее
+    сохранение не записало старое значение."""
+    if action == 'pre_clear' and reverse:
+        instance._cleared_recipe_ids = list(
+            instance.tags.values_list('pk', flat=True)
+        )
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        instance.tags_mask = update_tags_masks([instance.pk])[instance.pk]
+    elif action == 'post_clear':
+        update_tags_masks(instance._cleared_recipe_ids)
+    elif pk_set:
+        update_tags_masks(pk_set)
+
+
+@receiver(post_delete, sender=Tag)
+def clear_tag_bit(sender, instance, **kwargs):
+    """Снятие бита удаленного тега с рецептов, связи удаляются
+    каскадно без сигнала m2m_changed."""
+    Recipe.objects.filter(tags_mask__gt=0).update(
+        tags_mask=F('tags_mask').bitand(~instance.mask)
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def add_to_feeds(sender, instance, created, **kwargs):
+    """Добавление нового рецепта в ленты подписчиков автора."""
+    if created:
+        feed.fan_out(instance)
+
+
+@receiver(post_save, sender=Subscription)
+def backfill_feed(sender, instance, created, **kwargs):
+    """Добавление последних рецептов автора в ленту подписчика."""
+    if created:
+        feed.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Subscription)
+def remove_from_feed(sender, instance, **kwargs):
+    """Удаление рецептов автора из ленты отписавшегося пользователя."""
+    feed.remove_author(instance.user_id, instance.author_id)
@@ -0,0 +1,311 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from recipes import feed, minhash, shopping_list, trending
+from recipes.models import (
+    Favorite, FeedEntry, Ingredient, IngredientAmount, Recipe, ShoppingCart,
+    ShoppingListItem, Subscription
+)
+
+User = get_user_model()
+
+
+def create_users(count):
+    User.objects.bulk_create(User(
+        email=f'user{index}@example.com', username=f'user{index}',
+        first_name='Имя', last_name='Фамилия'
+    ) for index in range(count))
+    return list(User.objects.order_by('id'))
+
+
+def create_recipe(author, ingredients):
+    recipe = Recipe.objects.create(
+        author=author, name='Рецепт', text='Описание', cooking_time=10,
+        image='recipes/placeholder.png'
+    )
+    IngredientAmount.objects.bulk_create(
+        IngredientAmount(recipe=recipe, ingredient=ingredient, amount=1)
+        for ingredient in ingredients
+    )
+    return recipe
+
+
+class MinHashTests(SimpleTestCase):
+
+    def test_signature_of_single_ingredient(self):
+        signature = minhash.signature([5])
+        self.assertEqual(len(signature), minhash.NUM_PERMUTATIONS)
+        self.assertEqual(list(signature), list(minhash.hashes(5)))
+
+    def test_signature_is_elementwise_min(self):
+        signature = minhash.signature([1, 2, 2])
+        self.assertEqual(list(signature), [
+            min(first, second) for first, second in
+            zip(minhash.hashes(1), minhash.hashes(2))
+        ])
+
+    def test_signature_of_empty_set(self):
+        self.assertIsNone(minhash.signature([]))
+
+
+class ShoppingListTests(TestCase):
+
+    def test_rebuild_more_rows_than_sqlite_compound_select_limit(self):
+        users = create_users(3)
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'ингредиент {index}', measurement_unit='г')
+            for index in range(300)
+        )
+        ingredients = list(Ingredient.objects.all())
+        recipe = create_recipe(users[0], ingredients)
+        for user in users:
+            ShoppingCart.objects.create(user=user, recipe=recipe)
+        ShoppingListItem.objects.all().delete()
+
+        changed = shopping_list.rebuild_shopping_lists()
+
+        self.assertEqual(sorted(changed), sorted(user.id for user in users))
+        self.assertEqual(ShoppingListItem.objects.count(), 900)
+
+    def set_amounts(self, recipe, amounts):
+        """Замена ингредиентов рецепта с переносом в списки покупок."""
+        old = shopping_list.get_recipe_amounts(recipe.id)
+        IngredientAmount.objects.filter(recipe=recipe).delete()
+        IngredientAmount.objects.bulk_create(
+            IngredientAmount(
+                recipe=recipe, ingredient=ingredient, amount=amount
+            ) for ingredient, amount in amounts.items()
+        )
+        shopping_list.change_recipe(
+            recipe.id, old, shopping_list.get_recipe_amounts(recipe.id)
+        )
+
+    @override_settings(SHOPPING_LIST_BATCH=2)
+    def test_change_recipe_updates_only_its_carts(self):
+        users = create_users(5)
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'ингредиент {index}', measurement_unit='г')
+            for index in range(3)
+        )
+        first, second, third = Ingredient.objects.all()
+        changed = create_recipe(users[0], [first, second])
+        other = create_recipe(users[0], [second, third])
+        for user in users[:4]:
+            ShoppingCart.objects.create(user=user, recipe=changed)
+        for user in users[3:]:
+            ShoppingCart.objects.create(user=user, recipe=other)
+
+        self.set_amounts(changed, {first: 5, third: 2})
+
+        self.assertEqual(
+            shopping_list.stored_shopping_lists(),
+            shopping_list.calculate_shopping_lists()
+        )
+        self.assertEqual(
+            shopping_list.stored_shopping_lists([users[4].id]),
+            {users[4].id: {second.id: 1, third.id: 1}}
+        )
+        self.assertEqual(
+            shopping_list.stored_shopping_lists([users[3].id]),
+            {users[3].id: {first.id: 5, second.id: 1, third.id: 3}}
+        )
+
+    def test_change_recipe_deletes_rows_returning_to_zero(self):
+        users = create_users(2)
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'ингредиент {index}', measurement_unit='г')
+            for index in range(2)
+        )
+        first, second = Ingredient.objects.all()
+        recipe = create_recipe(users[0], [first, second])
+        for user in users:
+            ShoppingCart.objects.create(user=user, recipe=recipe)
+
+        self.set_amounts(recipe, {second: 3})
+
+        self.assertFalse(
+            ShoppingListItem.objects.filter(ingredient=first).exists()
+        )
+        self.assertEqual(
+            ShoppingListItem.objects.filter(
+                ingredient=second, total_amount=3
+            ).count(), 2
+        )
+
+
+class FeedTests(TestCase):
+
+    def test_fan_out_to_more_followers_than_sqlite_limit(self):
+        author, *followers = create_users(600)
+        Subscription.objects.bulk_create(
+            Subscription(user=follower, author=author)
+            for follower in followers
+        )
+        recipe = create_recipe(author, [])
+        FeedEntry.objects.all().delete()
+
+        feed.fan_out(recipe)
+
+        self.assertEqual(
+            FeedEntry.objects.filter(recipe=recipe).count(), len(followers)
+        )
+
+    def feed_ids(self, user):
+        return [item.recipe_id for item in feed.get_feed(user.id, limit=50)]
+
+    def refresh_popular_authors(self):
+        """Истечение кеша популярных авторов."""
+        cache.delete(feed.POPULAR_AUTHORS_KEY)
+        return feed.get_popular_authors()
+
+    @override_settings(FEED_FANOUT_LIMIT=2)
+    def test_crossing_fanout_limit_both_ways(self):
+        author, *followers = create_users(4)
+        cache.delete(feed.POPULAR_AUTHORS_KEY)
+        for follower in followers[:2]:
+            Subscription.objects.create(user=follower, author=author)
+        before = create_recipe(author, [])
+        self.assertEqual(
+            FeedEntry.objects.filter(recipe=before).count(), 2
+        )
+
+        Subscription.objects.create(user=followers[2], author=author)
+        self.assertIn(author.id, self.refresh_popular_authors())
+        during = create_recipe(author, [])
+        self.assertFalse(FeedEntry.objects.filter(recipe=during).exists())
+        for follower in followers:
+            self.assertEqual(self.feed_ids(follower), [during.id, before.id])
+
+        Subscription.objects.filter(user=followers[0]).delete()
+        self.assertNotIn(author.id, self.refresh_popular_authors())
+        after = create_recipe(author, [])
+        for follower in followers[1:]:
+            self.assertEqual(
+                self.feed_ids(follower), [after.id, during.id, before.id]
+            )
+        self.assertEqual(self.feed_ids(followers[0]), [])
+
+    def entries(self):
+        return set(FeedEntry.objects.values_list(
+            'user_id', 'recipe_id', 'author_id', 'pub_date'
+        ))
+
+    @override_settings(FEED_BACKFILL_LIMIT=2, FEED_BATCH_SIZE=2)
+    def test_rebuild_matches_subscribing_again(self):
+        cache.delete(feed.POPULAR_AUTHORS_KEY)
+        users = create_users(5)
+        for author in users[:3]:
+            for _ in range(3):
+                create_recipe(author, [])
+        for user in users[2:]:
+            for author in users[:3]:
+                if user != author:
+                    Subscription.objects.create(user=user, author=author)
+        expected = self.entries()
+        self.assertEqual(len(expected), 8 * 2)
+
+        FeedEntry.objects.all().delete()
+        self.assertEqual(feed.rebuild_feeds(), 8)
+        self.assertEqual(self.entries(), expected)
+
+        FeedEntry.objects.filter(user=users[3]).delete()
+        with self.assertNumQueries(3):
+            self.assertEqual(feed.rebuild_feeds([users[3].id]), 3)
+        self.assertEqual(self.entries(), expected)
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_rebuild_skips_popular_authors(self):
+        cache.delete(feed.POPULAR_AUTHORS_KEY)
+        author, *followers = create_users(3)
+        for follower in followers:
+            Subscription.objects.create(user=follower, author=author)
+        create_recipe(author, [])
+        cache.delete(feed.POPULAR_AUTHORS_KEY)
+
+        feed.rebuild_feeds()
+
+        self.assertFalse(FeedEntry.objects.exists())
+
+
+class TrendingTests(TestCase):
+
+    def setUp(self):
+        self.users = create_users(3)
+        self.recipes = [create_recipe(self.users[0], []) for _ in range(3)]
+
+    def scores(self):
+        """Рейтинги рецептов относительно рейтинга первого рецепта."""
+        scores = dict(Recipe.objects.values_list('id', 'trending_score'))
+        first = scores[self.recipes[0].id]
+        return [scores[recipe.id] / first for recipe in self.recipes]
+
+    def test_older_events_decay(self):
+        Favorite.objects.create(user=self.users[0], recipe=self.recipes[0])
+        old = Favorite.objects.create(
+            user=self.users[0], recipe=self.recipes[1]
+        )
+        Favorite.objects.filter(pk=old.pk).update(
+            created=timezone.now() - timedelta(
+                hours=2 * settings.TRENDING_HALF_LIFE_HOURS
+            )
+        )
+        ShoppingCart.objects.create(user=self.users[0], recipe=self.recipes[2])
+
+        trending.update_scores()
+
+        first, second, third = self.scores()
+        self.assertAlmostEqual(second, 0.25, places=3)
+        self.assertAlmostEqual(
+            third, settings.TRENDING_SHOPPING_CART_WEIGHT, places=3
+        )
+
+    def test_incremental_update_matches_rebuild(self):
+        Favorite.objects.create(user=self.users[0], recipe=self.recipes[0])
+        Favorite.objects.create(user=self.users[1], recipe=self.recipes[1])
+        trending.update_scores()
+        Favorite.objects.create(user=self.users[2], recipe=self.recipes[0])
+        ShoppingCart.objects.create(user=self.users[0], recipe=self.recipes[2])
+        Favorite.objects.filter(
+            user=self.users[1], recipe=self.recipes[1]
+        ).delete()
+        trending.update_scores()
+        incremental = self.scores()
+
+        trending.update_scores(rebuild=True)
+
+        for expected, score in zip(self.scores(), incremental):
+            self.assertAlmostEqual(score, expected, places=6)
+
+    def test_toggling_does_not_inflate_score(self):
+        Favorite.objects.create(user=self.users[1], recipe=self.recipes[0])
+        for _ in range(3):
+            Favorite.objects.create(
+                user=self.users[0], recipe=self.recipes[1]
+            )
+            trending.update_scores()
+            Favorite.objects.filter(
+                user=self.users[0], recipe=self.recipes[1]
+            ).delete()
+            trending.update_scores()
+
+        self.assertAlmostEqual(self.scores()[1], 0, places=6)
+
+    def test_event_committed_after_later_ids_is_counted(self):
+        delayed = Favorite.objects.create(
+            user=self.users[0], recipe=self.recipes[0]
+        )
+        Favorite.objects.filter(pk=delayed.pk).delete()
+        Favorite.objects.create(user=self.users[1], recipe=self.recipes[0])
+        trending.update_scores()
+
+        Favorite.objects.create(
+            id=delayed.id, user=self.users[0], recipe=self.recipes[1]
+        )
+        trending.update_scores()
+
+        self.assertAlmostEqual(self.scores()[1], 1, places=3)
@@ -0,0 +1,140 @@
+import math
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Value, When
+from django.utils import timezone
+
+from .models import (
+    Favorite, Recipe, ShoppingCart, TrendingRemoval, TrendingState
+)
+
+MAX_EXPONENT = 500
+
+
+def decay_rate():
+    """Скорость затухания λ, при которой вес события уменьшается
+    вдвое за TRENDING_HALF_LIFE_HOURS."""
+    return math.log(2) / (settings.TRENDING_HALF_LIFE_HOURS * 3600)
+
+
+def get_state():
+    """Состояние пересчета, заблокированное до конца транзакции,
+    чтобы параллельные запуски не учли события дважды."""
+    TrendingState.objects.get_or_create(pk=1)
+    return TrendingState.objects.select_for_update().get(pk=1)
+
+
+def event_weight(model):
+    """Вес события добавления рецепта в избранное или список покупок."""
+    if model is Favorite:
+        return settings.TRENDING_FAVORITE_WEIGHT
+    return settings.TRENDING_SHOPPING_CART_WEIGHT
+
+
+def remove_event(instance):
+    """Запоминание удаленной записи избранного или списка покупок,
+    уже учтенной в рейтинге, чтобы при пересчете вычесть ее вес."""
+    if instance.scored:
+        TrendingRemoval.objects.create(
+            recipe_id=instance.recipe_id,
+            weight=event_weight(type(instance)),
+            created=instance.created
+        )
+
+
+def collect_events(model, landmark, rate, scores):
+    """Прибавление к scores весов еще не учтенных событий model.
+    Событие в момент t весит weight * exp(λ(t - landmark)): веса
+    растут со временем, поэтому порядок рецептов по сумме весов
+    совпадает с порядком по затухающему рейтингу на любой момент,
+    а новые события просто прибавляются к сохраненной сумме.
+    Учтенные записи помечаются, поэтому записи из транзакций,
+    завершившихся позже соседних, попадают в следующий пересчет."""
+    weight = event_weight(model)
+    events = model.objects.filter(scored=False).values_list(
+        'id', 'recipe_id', 'created'
+    )
+    event_ids = []
+    for event_id, recipe_id, created in events.iterator():
+        age = (created - landmark).total_seconds()
+        scores[recipe_id] += weight * math.exp(rate * age)
+        event_ids.append(event_id)
+    batch_size = settings.TRENDING_BATCH_SIZE
+    for start in range(0, len(event_ids), batch_size):
+        model.objects.filter(
+            id__in=event_ids[start:start + batch_size]
+        ).update(scored=True)
+
+
+def collect_removals(landmark, rate, scores):
+    """Вычитание из scores весов удаленных учтенных событий."""
+    removals = TrendingRemoval.objects.values_list(
+        'id', 'recipe_id', 'weight', 'created'
+    )
+    removal_ids = []
+    for removal_id, recipe_id, weight, created in removals.iterator():
+        age = (created - landmark).total_seconds()
+        scores[recipe_id] -= weight * math.exp(rate * age)
+        removal_ids.append(removal_id)
+    batch_size = settings.TRENDING_BATCH_SIZE
+    for start in range(0, len(removal_ids), batch_size):
+        TrendingRemoval.objects.filter(
+            id__in=removal_ids[start:start + batch_size]
+        ).delete()
+
+
+def add_scores(scores):
+    """Прибавление scores ({recipe_id: прирост}) к рейтингу рецептов
+    одним UPDATE на TRENDING_BATCH_SIZE рецептов."""
+    recipe_ids = list(scores)
+    batch_size = settings.TRENDING_BATCH_SIZE
+    for start in range(0, len(recipe_ids), batch_size):
+        batch = recipe_ids[start:start + batch_size]
+        Recipe.objects.filter(id__in=batch).update(
+            trending_score=F('trending_score') + Case(
+                *(When(id=recipe_id, then=Value(scores[recipe_id]))
+                  for recipe_id in batch),
+                default=Value(0.0),
+                output_field=FloatField()
+            )
+        )
+
+
+def move_landmark(state, now, rate):
+    """Перенос опорного момента на now с умножением всех рейтингов
+    на exp(-λ(now - landmark)), пока веса не вышли за пределы float."""
+    if rate * (now - state.landmark).total_seconds() < MAX_EXPONENT:
+        return
+    factor = math.exp(-rate * (now - state.landmark).total_seconds())
+    Recipe.objects.filter(trending_score__gt=0).update(
+        trending_score=F('trending_score') * factor
+    )
+    state.landmark = now
+
+
+@transaction.atomic
+def update_scores(rebuild=False):
+    """Учет в рейтинге трендов новых и удаленных записей избранного
+    и списков покупок. При rebuild рейтинг пересчитывается по всем записям.
+    Возвращает количество рецептов с изменившимся рейтингом."""
+    state = get_state()
+    now = timezone.now()
+    rate = decay_rate()
+    if rebuild:
+        Recipe.objects.exclude(trending_score=0).update(trending_score=0)
+        for model in (Favorite, ShoppingCart):
+            model.objects.filter(scored=True).update(scored=False)
+        TrendingRemoval.objects.all().delete()
+        state.landmark = now
+    move_landmark(state, now, rate)
+
+    scores = defaultdict(float)
+    for model in (Favorite, ShoppingCart):
+        collect_events(model, state.landmark, rate, scores)
+    collect_removals(state.landmark, rate, scores)
+    add_scores(scores)
+    state.updated = now
+    state.save()
+    return len(scores)
@@ -0,0 +1,305 @@
+import json
+import statistics
+import time
+import tracemalloc
+import urllib.error
+import urllib.request
+from collections import namedtuple
+from contextlib import contextmanager
+from urllib.parse import quote
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+
+from api.cache import FRAGMENTS_VERSION, RECIPES_VERSION, bump_version
+from recipes.models import Ingredient, IngredientAmount, Recipe, Tag
+
+User = get_user_model()
+
+Scenario = namedtuple('Scenario', ('name', 'url', 'authenticated', 'cold'),
+                      defaults=(False,))
+
+# Метрика: допустимый прирост сверх порога, меньший считается шумом.
+# Для задержки порог шума не меньше NOISE_SIGMAS стандартных отклонений
+# времени запроса в эталоне или новом замере.
+NOISE = {
+    'p50_ms': 1.0,
+    'p90_ms': 2.0,
+    'p99_ms': 5.0,
+    'queries': 0,
+    'peak_memory_kb': 64,
+}
+# Метрики, любое увеличение которых — регрессия.
+EXACT = ('queries',)
+LATENCY = ('p50_ms', 'p90_ms', 'p99_ms')
+# Метрики, рост которых завершает сравнение ошибкой. Задержка слишком
+# зависит от загрузки машины, ее рост по умолчанию только выводится.
+GATED = ('queries', 'peak_memory_kb')
+NOISE_SIGMAS = 2
+# Минимум замеров сценария для сравнения с эталоном: на меньшем числе
+# перцентили задержки определяются шумом.
+MIN_REPEAT = 20
+# Сценарии, которые дополнительно замеряются с холодным кешем.
+COLD_SCENARIOS = (
+    'recipes_anonymous', 'recipes', 'recipe_detail', 'recipes_feed',
+    'subscriptions',
+)
+# Версии кеша, сбрасываемые перед каждым запросом холодного сценария.
+COLD_VERSIONS = (FRAGMENTS_VERSION, RECIPES_VERSION)
+ISOLATED_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'benchmark',
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    }
+}
+
+
+def get_benchmark_user(user_id=None):
+    """Пользователь, от имени которого выполняются запросы: заданный
+    или с наибольшим числом подписок, у которого тяжелее всего лента
+    и список подписок."""
+    if user_id is not None:
+        return User.objects.get(pk=user_id)
+    return User.objects.annotate(
+        subscriptions_count=Count('subscribers')
+    ).order_by('-subscriptions_count', 'id').first()
+
+
+def get_scenarios(cold=True):
+    """Эндпоинты и сочетания фильтров, параметры подбираются
+    по самому популярному рецепту и его ингредиентам. При cold
+    сценарии COLD_SCENARIOS добавляются и с холодным кешем."""
+    tags = list(Tag.objects.order_by('id').values_list('slug', flat=True))
+    recipe = Recipe.objects.order_by('-favorites_count', 'id').first()
+    ingredient_ids = list(IngredientAmount.objects.filter(
+        recipe=recipe
+    ).order_by('id').values_list('ingredient_id', flat=True)[:3])
+    ingredient = Ingredient.objects.get(pk=ingredient_ids[0])
+    cookable = ','.join(map(str, ingredient_ids))
+    word = quote(recipe.name.split()[0])
+    prefix = quote(ingredient.name[:3])
+    scenarios = [
+        ('recipes_anonymous', '/api/recipes/', False),
+        ('recipes', '/api/recipes/', True),
+        ('recipes_page_10', '/api/recipes/?page=10', True),
+        ('recipes_limit_50', '/api/recipes/?limit=50', True),
+        ('recipes_tags', '/api/recipes/?' + '&'.join(
+            f'tags={slug}' for slug in tags[:2]
+        ), True),
+        ('recipes_author', f'/api/recipes/?author={recipe.author_id}', True),
+        ('recipes_favorited', '/api/recipes/?is_favorited=1', True),
+        ('recipes_in_shopping_cart', '/api/recipes/?is_in_shopping_cart=1',
+         True),
+        ('recipes_search', f'/api/recipes/?search={word}', True),
+        ('recipes_popular', '/api/recipes/?ordering=popular', True),
+        ('recipes_trending', '/api/recipes/?ordering=trending', True),
+        ('recipe_detail', f'/api/recipes/{recipe.id}/', True),
+        ('recipes_similar', f'/api/recipes/{recipe.id}/similar/', True),
+        ('recipes_what_can_i_cook',
+         f'/api/recipes/what_can_i_cook/?ingredients={cookable}', True),
+        ('recipes_feed', '/api/recipes/feed/', True),
+        ('subscriptions', '/api/users/subscriptions/', True),
+        ('subscriptions_recipes_limit',
+         '/api/users/subscriptions/?recipes_limit=3', True),
+        ('ingredients', '/api/ingredients/', False),
+        ('ingredients_name', f'/api/ingredients/?name={prefix}', False),
+        ('tags', '/api/tags/', False),
+        ('download_shopping_cart', '/api/recipes/download_shopping_cart/',
+         True),
+        ('download_shopping_cart_csv',
+         '/api/recipes/download_shopping_cart/?format=csv', True),
+    ]
+    scenarios = [Scenario(*scenario) for scenario in scenarios]
+    if cold:
+        scenarios.extend(
+            scenario._replace(name=f'{scenario.name}_cold', cold=True)
+            for scenario in scenarios if scenario.name in COLD_SCENARIOS
+        )
+    return scenarios
+
+
+def percentile(values, share):
+    """Перцентиль по ближайшему рангу в отсортированном списке."""
+    index = min(len(values) - 1, max(0, round(share * len(values)) - 1))
+    return values[index]
+
+
+@contextmanager
+def isolated_settings():
+    """Настройки замеров в этом процессе: запросы тестового клиента
+    не попадают в общие метрики процессов сайта, а сброс версий кеша
+    не затрагивает кеш сайта — используется отдельный пустой кеш
+    в памяти процесса."""
+    with override_settings(METRICS_DIR='', CACHES=ISOLATED_CACHES):
+        cache.clear()
+        yield
+
+
+def make_client():
+    """Тестовый клиент с хостом из ALLOWED_HOSTS, чтобы запросы
+    проходили проверку хоста вне тестового окружения."""
+    host = next((host for host in settings.ALLOWED_HOSTS
+                 if host != '*' and not host.startswith('.')), 'localhost')
+    return Client(HTTP_HOST=host)
+
+
+class ClientTarget:
+    """Запросы через тестовый клиент Django в этом процессе: кроме
+    задержки измеряются количество запросов к базе и пиковая память."""
+
+    def __init__(self, token):
+        self.client = make_client()
+        self.headers = {'HTTP_AUTHORIZATION': f'Token {token}'}
+
+    @staticmethod
+    def prepare(scenario):
+        """Сброс кеша перед запросом холодного сценария, вне замера
+        задержки."""
+        if scenario.cold:
+            for name in COLD_VERSIONS:
+                bump_version(name)
+
+    def request(self, scenario):
+        """Статус и размер ответа, потоковый ответ читается целиком."""
+        response = self.client.get(
+            scenario.url, **(self.headers if scenario.authenticated else {})
+        )
+        return response.status_code, len(b''.join(response))
+
+    def profile(self, scenario):
+        """Количество запросов к базе и пиковая память одного запроса."""
+        self.prepare(scenario)
+        tracemalloc.start()
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                self.request(scenario)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return len(queries), round(peak / 1024)
+
+
+class HttpTarget:
+    """Запросы к запущенному серверу, например локальному gunicorn:
+    измеряется только задержка. Кеш сервера не сбрасывается, поэтому
+    холодные сценарии не поддерживаются."""
+
+    def __init__(self, token, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.headers = {'Authorization': f'Token {token}'}
+
+    @staticmethod
+    def prepare(scenario):
+        pass
+
+    def request(self, scenario):
+        request = urllib.request.Request(
+            self.base_url + scenario.url,
+            headers=self.headers if scenario.authenticated else {}
+        )
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, len(response.read())
+        except urllib.error.HTTPError as error:
+            return error.code, len(error.read())
+
+    def profile(self, scenario):
+        return None, None
+
+
+def get_target(user, base_url=None):
+    token, _ = Token.objects.get_or_create(user=user)
+    if base_url:
+        return HttpTarget(token.key, base_url)
+    return ClientTarget(token.key)
+
+
+def measure(target, scenario, repeat, warmup):
+    """Метрики сценария: перцентили задержки по repeat запросам после
+    warmup прогревочных, запросы к базе и память отдельного запроса,
+    чтобы трассировка памяти не искажала задержку."""
+    for _ in range(warmup):
+        target.prepare(scenario)
+        target.request(scenario)
+    timings = []
+    for _ in range(repeat):
+        target.prepare(scenario)
+        started = time.perf_counter()
+        status, size = target.request(scenario)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    queries, peak_memory = target.profile(scenario)
+    return {
+        'url': scenario.url,
+        'status': status,
+        'response_bytes': size,
+        'mean_ms': round(sum(timings) / len(timings), 3),
+        'p50_ms': round(percentile(timings, 0.5), 3),
+        'p90_ms': round(percentile(timings, 0.9), 3),
+        'p99_ms': round(percentile(timings, 0.99), 3),
+        'stdev_ms': round(statistics.pstdev(timings), 3),
+        'queries': queries,
+        'peak_memory_kb': peak_memory,
+    }
+
+
+def get_environment(user, options):
+    """Описание условий замера: результаты разных баз и объемов
+    данных сравнивать бессмысленно."""
+    return {
+        'database': connection.vendor,
+        'target': options['url'] or 'client',
+        'users': User.objects.count(),
+        'recipes': Recipe.objects.count(),
+        'user': user.id,
+        'repeat': options['repeat'],
+    }
+
+
+def get_noise(metric, before, after):
+    """Порог шума метрики: для задержки не меньше NOISE_SIGMAS
+    стандартных отклонений времени запроса."""
+    noise = NOISE[metric]
+    if metric in LATENCY:
+        noise = max(noise, NOISE_SIGMAS * max(
+            before.get('stdev_ms', 0), after.get('stdev_ms', 0)
+        ))
+    return noise
+
+
+def find_regressions(baseline, results, threshold):
+    """Метрики, выросшие относительно baseline больше чем на долю
+    threshold (количество запросов — на любую величину) и больше
+    порога шума. Возвращает строки (сценарий, метрика, было, стало)."""
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        for metric in NOISE:
+            before, after = old.get(metric), result.get(metric)
+            if before is None or after is None:
+                continue
+            limit = before if metric in EXACT else before * (1 + threshold)
+            if (after > limit
+                    and after - before > get_noise(metric, old, result)):
+                regressions.append((name, metric, before, after))
+    return regressions
+
+
+def load(path):
+    with open(path, encoding='utf-8') as baseline_file:
+        return json.load(baseline_file)
+
+
+def save(path, report):
+    with open(path, 'w', encoding='utf-8') as baseline_file:
+        json.dump(report, baseline_file, ensure_ascii=False, indent=2,
+                  sort_keys=True)
@@ -0,0 +1,323 @@
+import base64
+import datetime
+import os
+import random
+from bisect import bisect
+from contextlib import contextmanager
+from itertools import accumulate
+
+from multiprocessing import Pool
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+from django.utils import timezone
+
+from api.cache import (
+    FRAGMENTS_VERSION, RECIPES_VERSION, bump_version, invalidate_pages
+)
+from api.ingredient_index import invalidate_ingredient_index
+from api.similarity import invalidate_similarity_index
+from recipes import minhash, trending
+from recipes.counters import recount_favorites, recount_recipes
+from recipes.feed import rebuild_feeds
+from recipes.models import (
+    Favorite, IngredientAmount, Recipe, ShoppingCart, Subscription
+)
+from recipes.shopping_list import rebuild_shopping_lists
+from service.loaders import reset_sequences
+
+User = get_user_model()
+
+PLACEHOLDER_IMAGE = 'recipes/placeholder.png'
+PLACEHOLDER_PNG = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA'
+    '60e6kgAAAABJRU5ErkJggg=='
+)
+WORDS = (
+    'суп', 'салат', 'пирог', 'запеканка', 'котлеты', 'паста', 'рагу',
+    'каша', 'омлет', 'блины', 'плов', 'борщ', 'десерт', 'соус', 'рулет',
+    'домашний', 'быстрый', 'острый', 'летний', 'овощной', 'сырный',
+    'мясной', 'рыбный', 'сладкий', 'постный', 'праздничный', 'бабушкин',
+)
+
+_samplers = {}
+
+
+class PowerLaw:
+    """Выбор индекса из range(size) с вероятностью, обратно
+    пропорциональной (индекс + 1) ** alpha: первые элементы выбираются
+    чаще всего, как популярные авторы и рецепты."""
+
+    def __init__(self, size, alpha):
+        self.weights = list(accumulate(
+            1 / (rank ** alpha) for rank in range(1, size + 1)
+        ))
+        self.total = self.weights[-1]
+
+    def sample(self, generator):
+        return bisect(self.weights, generator.random() * self.total)
+
+    def sample_unique(self, generator, count, exclude=None):
+        """До count различных индексов, кроме exclude."""
+        result = set()
+        for _ in range(count * 3):
+            if len(result) == count:
+                break
+            index = self.sample(generator)
+            if index != exclude:
+                result.add(index)
+        return result
+
+
+def get_sampler(size, alpha):
+    """Сэмплер, общий для заданий одного процесса."""
+    key = (size, alpha)
+    if key not in _samplers:
+        _samplers[key] = PowerLaw(size, alpha)
+    return _samplers[key]
+
+
+def chunk_random(plan, table, chunk):
+    """Генератор случайных чисел задания: зависит только от seed,
+    таблицы и номера пачки, поэтому данные не зависят от числа
+    процессов."""
+    return random.Random(f'{plan["seed"]}:{table}:{chunk}')
+
+
+def heavy_tail_count(generator, mean, limit):
+    """Количество с распределением Парето и средним mean:
+    у большинства мало, у немногих очень много."""
+    return min(limit, int(generator.paretovariate(1.5) * mean / 3))
+
+
+def random_date(generator, plan):
+    seconds = generator.random() * plan['days'] * 86400
+    return plan['now'] - datetime.timedelta(seconds=seconds)
+
+
+@contextmanager
+def explicit_dates(*models):
+    """Отключение auto_now_add у полей моделей, чтобы bulk_create
+    сохранил сгенерированные даты.
+
+    Флаг меняется у общих для процесса полей моделей, поэтому
+    контекст используется только в командах генерации данных, а не
+    в процессах сервера: параллельный запрос внутри него сохранил бы
+    пустую дату. Флаги восстанавливаются и при ошибке."""
+    fields = [field for model in models for field in model._meta.fields
+              if getattr(field, 'auto_now_add', False)]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def ensure_placeholder_image():
+    path = os.path.join(settings.MEDIA_ROOT, PLACEHOLDER_IMAGE)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as image:
+            image.write(PLACEHOLDER_PNG)
+
+
+def user_ids(plan, start, stop):
+    return range(plan['first_user_id'] + start, plan['first_user_id'] + stop)
+
+
+@transaction.atomic
+def generate_users(plan, chunk, start, stop):
+    User.objects.bulk_create(
+        User(id=user_id, username=f'user{user_id}',
+             email=f'user{user_id}@example.com', first_name='Имя',
+             last_name=f'Фамилия {user_id}', password=plan['password'])
+        for user_id in user_ids(plan, start, stop)
+    )
+    return stop - start
+
+
+def recipe_tags(generator, plan):
+    tags = plan['tags']
+    return generator.sample(tags, min(len(tags), generator.randint(1, 2)))
+
+
+@transaction.atomic
+def generate_recipes(plan, chunk, start, stop):
+    """Рецепты с ингредиентами и тегами. Авторы и ингредиенты
+    выбираются по степенному закону, маска тегов и MinHash подпись
+    вычисляются сразу, так как bulk_create не вызывает сигналы."""
+    generator = chunk_random(plan, 'recipes', chunk)
+    authors = get_sampler(plan['users'], plan['alpha'])
+    ingredients = get_sampler(len(plan['ingredients']), plan['alpha'])
+    recipes, amounts, tags = [], [], []
+    for recipe_id in range(plan['first_recipe_id'] + start,
+                           plan['first_recipe_id'] + stop):
+        ingredient_ids = [
+            plan['ingredients'][index] for index in
+            ingredients.sample_unique(generator, generator.randint(3, 12))
+        ]
+        chosen_tags = recipe_tags(generator, plan)
+        recipes.append(Recipe(
+            id=recipe_id,
+            author_id=plan['first_user_id'] + authors.sample(generator),
+            name=' '.join(generator.sample(WORDS, 3)).capitalize(),
+            text=' '.join(generator.choices(WORDS, k=40)),
+            cooking_time=generator.randint(5, 180),
+            image=PLACEHOLDER_IMAGE,
+            pub_date=random_date(generator, plan),
+            tags_mask=sum(1 << bit for _, bit in chosen_tags),
+            minhash=minhash.to_bytes(minhash.signature(ingredient_ids)),
+        ))
+        amounts.extend(
+            IngredientAmount(recipe_id=recipe_id, ingredient_id=ingredient_id,
+                             amount=generator.randint(1, 500))
+            for ingredient_id in ingredient_ids
+        )
+        tags.extend(Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+                    for tag_id, _ in chosen_tags)
+    with explicit_dates(Recipe):
+        Recipe.objects.bulk_create(recipes)
+    IngredientAmount.objects.bulk_create(amounts)
+    Recipe.tags.through.objects.bulk_create(tags)
+    return stop - start
+
+
+def generate_user_relations(plan, table, chunk, start, stop, mean, build):
+    """Связи пользователей с авторами или рецептами: количество связей
+    пользователя — с тяжелым хвостом, цели — по степенному закону."""
+    generator = chunk_random(plan, table, chunk)
+    size = plan['users'] if table == 'subscriptions' else plan['recipes']
+    targets = get_sampler(size, plan['alpha'])
+    objects = []
+    for index in range(start, stop):
+        count = heavy_tail_count(generator, mean, size - 1)
+        exclude = index if table == 'subscriptions' else None
+        for target in targets.sample_unique(generator, count, exclude):
+            objects.append(build(generator, index, target))
+    return objects
+
+
+@transaction.atomic
+def generate_subscriptions(plan, chunk, start, stop):
+    objects = generate_user_relations(
+        plan, 'subscriptions', chunk, start, stop, plan['subscriptions'],
+        lambda generator, user, author: Subscription(
+            user_id=plan['first_user_id'] + user,
+            author_id=plan['first_user_id'] + author
+        )
+    )
+    Subscription.objects.bulk_create(objects, ignore_conflicts=True)
+    return len(objects)
+
+
+def generate_recipe_marks(model, table, mean_key):
+    """Генератор избранного или списков покупок."""
+
+    @transaction.atomic
+    def generate(plan, chunk, start, stop):
+        objects = generate_user_relations(
+            plan, table, chunk, start, stop, plan[mean_key],
+            lambda generator, user, recipe: model(
+                user_id=plan['first_user_id'] + user,
+                recipe_id=plan['first_recipe_id'] + recipe,
+                created=random_date(generator, plan)
+            )
+        )
+        with explicit_dates(model):
+            model.objects.bulk_create(objects, ignore_conflicts=True)
+        return len(objects)
+
+    return generate
+
+
+generate_favorites = generate_recipe_marks(Favorite, 'favorites', 'favorites')
+generate_carts = generate_recipe_marks(ShoppingCart, 'carts', 'carts')
+
+STEPS = (
+    # (шаг, ключ плана с количеством, делимым на пачки, функция пачки)
+    ('users', 'users', generate_users),
+    ('recipes', 'recipes', generate_recipes),
+    ('subscriptions', 'users', generate_subscriptions),
+    ('favorites', 'users', generate_favorites),
+    ('carts', 'users', generate_carts),
+)
+
+
+def run_task(task):
+    """Выполнение одного задания (шаг, план, номер пачки, границы),
+    в том числе в дочернем процессе."""
+    step, plan, chunk, start, stop = task
+    return dict((name, function) for name, _, function in STEPS)[step](
+        plan, chunk, start, stop
+    )
+
+
+def make_plan(options, password, ingredients, tags):
+    """Параметры генерации, общие для всех заданий. id пользователей
+    и рецептов назначаются явно, начиная после существующих."""
+    last_user = User.objects.order_by('-id').values_list('id', flat=True)
+    last_recipe = Recipe.objects.order_by('-id').values_list('id', flat=True)
+    return {
+        'seed': options['seed'],
+        'users': options['users'],
+        'recipes': options['recipes'],
+        'subscriptions': options['subscriptions'],
+        'favorites': options['favorites'],
+        'carts': options['carts'],
+        'alpha': options['alpha'],
+        'days': options['days'],
+        'now': timezone.now(),
+        'password': password,
+        'ingredients': ingredients,
+        'tags': tags,
+        'first_user_id': (last_user.first() or 0) + 1,
+        'first_recipe_id': (last_recipe.first() or 0) + 1,
+    }
+
+
+def make_tasks(plan, step, size_key, batch_size):
+    size = plan[size_key]
+    return [(step, plan, chunk, start, min(start + batch_size, size))
+            for chunk, start in enumerate(range(0, size, batch_size))]
+
+
+def generate(plan, batch_size, workers=1, progress=None):
+    """Генерация данных по шагам STEPS. Пачки одного шага независимы
+    и при workers > 1 вставляются параллельно в дочерних процессах,
+    шаги выполняются по очереди. progress(шаг, строк) вызывается
+    после каждого шага."""
+    ensure_placeholder_image()
+    pool = None
+    if workers > 1:
+        connections.close_all()
+        pool = Pool(workers)
+    try:
+        for step, size_key, _ in STEPS:
+            tasks = make_tasks(plan, step, size_key, batch_size)
+            rows = sum(pool.imap_unordered(run_task, tasks) if pool
+                       else map(run_task, tasks))
+            if progress:
+                progress(step, rows)
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    reset_sequences(User, Recipe)
+
+
+def rebuild_derived():
+    """Пересчет данных, которые обычно поддерживают сигналы, а
+    bulk_create их не вызывает: счетчиков, списков покупок, лент,
+    рейтинга трендов и индексов в памяти процессов."""
+    recount_favorites()
+    recount_recipes()
+    rebuild_shopping_lists()
+    rebuild_feeds()
+    trending.update_scores(rebuild=True)
+    invalidate_ingredient_index()
+    invalidate_similarity_index()
+    bump_version(FRAGMENTS_VERSION)
+    invalidate_pages(RECIPES_VERSION)
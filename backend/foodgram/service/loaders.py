@@ -0,0 +1,156 @@
+import csv
+import json
+import os
+from itertools import islice
+
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+READ_BLOCK_SIZE = 1 << 16
+
+
+def read_csv(path):
+    """Построчное чтение csv файла с заголовком в словари."""
+    with open(path, encoding='utf-8', newline='') as csv_file:
+        yield from csv.DictReader(csv_file)
+
+
+def read_json(path):
+    """Потоковое чтение json массива объектов или json lines
+    без загрузки всего файла в память: объекты разбираются по одному
+    из буфера, который дочитывается блоками."""
+    decoder = json.JSONDecoder()
+    with open(path, encoding='utf-8') as json_file:
+        buffer = ''
+        position = 0
+        eof = False
+        while True:
+            while position < len(buffer) and buffer[position] in '[], \t\r\n':
+                position += 1
+            if position == len(buffer):
+                if eof:
+                    return
+                buffer, position = json_file.read(READ_BLOCK_SIZE), 0
+                eof = not buffer
+                continue
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                block = json_file.read(READ_BLOCK_SIZE)
+                if not block:
+                    raise
+                buffer, position = buffer[position:] + block, 0
+                continue
+            yield item
+
+
+READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+}
+
+
+def find_file(directory, name):
+    """Путь к файлу name.csv или name.json в directory, None если
+    ни одного нет."""
+    for extension in READERS:
+        path = os.path.join(directory, name + extension)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def read_rows(path):
+    return READERS[os.path.splitext(path)[1]](path)
+
+
+def chunks(rows, size):
+    rows = iter(rows)
+    chunk = list(islice(rows, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(rows, size))
+
+
+class Upsert:
+    """Добавление и обновление строк модели пачками по ключу key_fields.
+
+    Для пачки одним запросом выбираются существующие объекты по первому
+    полю ключа, новые создаются одним bulk_create, изменившиеся
+    обновляются одним bulk_update. Значения приводятся к типам полей
+    модели, чтобы строки из csv сравнивались с данными базы."""
+
+    def __init__(self, model, key_fields, update_fields=()):
+        self.model = model
+        self.key_fields = tuple(key_fields)
+        self.update_fields = tuple(update_fields)
+        self.fields = {field.name: field for field in model._meta.fields}
+
+    def prepare(self, row):
+        """Строка с приведенными значениями известных модели полей."""
+        return {name: self.fields[name].to_python(value)
+                for name, value in row.items() if name in self.fields}
+
+    def key(self, row):
+        return tuple(row[field] for field in self.key_fields)
+
+    def existing(self, keys):
+        """Существующие объекты с ключами keys, выбираются по первому
+        полю ключа порциями, допустимыми для базы."""
+        first = self.key_fields[0]
+        values = list({key[0] for key in keys})
+        batch_size = connection.ops.bulk_batch_size([first], values)
+        existing = {}
+        for start in range(0, len(values), batch_size):
+            for obj in self.model.objects.filter(
+                **{f'{first}__in': values[start:start + batch_size]}
+            ):
+                key = tuple(getattr(obj, field) for field in self.key_fields)
+                existing[key] = obj
+        return existing
+
+    def before_create(self, objects):
+        """Подготовка новых объектов перед bulk_create."""
+
+    def apply(self, obj, row):
+        """Перенос в существующий объект изменившихся полей
+        update_fields, возвращает True, если объект изменился."""
+        changed = False
+        for field in self.update_fields:
+            if field in row and getattr(obj, field) != row[field]:
+                setattr(obj, field, row[field])
+                changed = True
+        return changed
+
+    def update(self, objects):
+        self.model.objects.bulk_update(objects, self.update_fields)
+
+    @transaction.atomic
+    def save(self, rows):
+        """Сохранение пачки rows, возвращает (создано, обновлено)."""
+        rows = {self.key(row): row for row in map(self.prepare, rows)}
+        existing = self.existing(rows)
+        created, updated = [], []
+        for key, row in rows.items():
+            obj = existing.get(key)
+            if obj is None:
+                created.append(self.model(**row))
+                continue
+            if self.apply(obj, row):
+                updated.append(obj)
+        if created:
+            self.before_create(created)
+            self.model.objects.bulk_create(created)
+        if updated:
+            self.update(updated)
+        return len(created), len(updated)
+
+
+def reset_sequences(*models):
+    """Сдвиг последовательностей первичных ключей после вставки строк
+    с явными id."""
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    if statements:
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
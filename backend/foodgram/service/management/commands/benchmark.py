@@ -0,0 +1,134 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import Recipe
+from service import benchmark
+
+
+class Command(BaseCommand):
+    help = ('Замер задержки, количества запросов к базе и пиковой памяти '
+            'эндпоинтов API на текущих данных, например созданных '
+            'командой gendata, и сравнение с сохраненным эталоном')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat', type=int, default=50,
+            help='Количество замеряемых запросов каждого сценария, '
+                 f'для --compare не меньше {benchmark.MIN_REPEAT}'
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=3,
+            help='Количество прогревочных запросов каждого сценария'
+        )
+        parser.add_argument(
+            '--scenario', action='append', dest='scenarios',
+            help='Имя сценария, можно указать несколько раз, '
+                 'по умолчанию все'
+        )
+        parser.add_argument(
+            '--user', type=int,
+            help='id пользователя, по умолчанию пользователь '
+                 'с наибольшим числом подписок'
+        )
+        parser.add_argument(
+            '--url',
+            help='Адрес запущенного сервера, например '
+                 'http://localhost:8000, по умолчанию запросы выполняются '
+                 'тестовым клиентом Django'
+        )
+        parser.add_argument(
+            '--save', metavar='PATH',
+            help='Сохранить результаты в json файл эталона'
+        )
+        parser.add_argument(
+            '--compare', metavar='PATH',
+            help='Сравнить результаты с json файлом эталона и завершиться '
+                 'с ошибкой при регрессии'
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='Допустимая доля роста задержки и памяти, рост задержки '
+                 'в пределах разброса замеров регрессией не считается'
+        )
+        parser.add_argument(
+            '--gate-latency', action='store_true',
+            help='Считать ошибкой и рост задержки, по умолчанию он только '
+                 'выводится: на загруженной машине задержка нестабильна'
+        )
+
+    def handle(self, *args, **options):
+        with benchmark.isolated_settings():
+            self.run(options)
+
+    def run(self, options):
+        if options['compare'] and options['repeat'] < benchmark.MIN_REPEAT:
+            raise CommandError(
+                f'Для сравнения с эталоном нужно --repeat не меньше '
+                f'{benchmark.MIN_REPEAT}'
+            )
+        user = benchmark.get_benchmark_user(options['user'])
+        if user is None or not Recipe.objects.exists():
+            raise CommandError('Нет данных, создайте их командой gendata')
+        scenarios = benchmark.get_scenarios(cold=not options['url'])
+        if options['scenarios']:
+            unknown = set(options['scenarios']) - {
+                scenario.name for scenario in scenarios
+            }
+            if unknown:
+                raise CommandError(f'Неизвестные сценарии: {unknown}')
+            scenarios = [scenario for scenario in scenarios
+                         if scenario.name in options['scenarios']]
+
+        target = benchmark.get_target(user, options['url'])
+        results = {}
+        for scenario in scenarios:
+            result = benchmark.measure(
+                target, scenario, options['repeat'], options['warmup']
+            )
+            results[scenario.name] = result
+            self.write_result(scenario.name, result)
+        report = {
+            'environment': benchmark.get_environment(user, options),
+            'results': results,
+        }
+        if options['save']:
+            benchmark.save(options['save'], report)
+        if options['compare']:
+            self.compare(benchmark.load(options['compare']), report, options)
+
+    def write_result(self, name, result):
+        style = self.style.ERROR if result['status'] >= 400 else str
+        self.stdout.write(style(
+            f'{name:30} {result["status"]} '
+            f'p50 {result["p50_ms"]:8.2f} мс  '
+            f'p90 {result["p90_ms"]:8.2f} мс  '
+            f'p99 {result["p99_ms"]:8.2f} мс  '
+            f'σ {result["stdev_ms"]:7.2f} мс  '
+            f'запросов {result["queries"]}  '
+            f'память {result["peak_memory_kb"]} КБ'
+        ))
+
+    def compare(self, baseline, report, options):
+        if baseline['environment'] != report['environment']:
+            self.stderr.write(self.style.WARNING(
+                f'Условия замера отличаются от эталона: '
+                f'{baseline["environment"]}'
+            ))
+        regressions = benchmark.find_regressions(
+            baseline['results'], report['results'], options['threshold']
+        )
+        gated = 0
+        for name, metric, before, after in regressions:
+            line = f'{name}: {metric} {before} -> {after}'
+            if metric in benchmark.GATED or options['gate_latency']:
+                gated += 1
+                self.stderr.write(line)
+            else:
+                self.stderr.write(self.style.WARNING(line))
+        if gated:
+            raise CommandError(f'Регрессий: {gated}')
+        if regressions:
+            self.stdout.write(self.style.SUCCESS(
+                f'Регрессий нет, рост задержки: {len(regressions)}'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS('Регрессий нет'))
@@ -0,0 +1,81 @@
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from recipes.models import Ingredient, Tag
+from service import generator
+
+
+class Command(BaseCommand):
+    help = ('Генерация синтетических пользователей, рецептов, подписок, '
+            'избранного и списков покупок для нагрузочного тестирования')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument(
+            '--subscriptions', type=float, default=10,
+            help='Среднее количество подписок пользователя'
+        )
+        parser.add_argument(
+            '--favorites', type=float, default=20,
+            help='Среднее количество рецептов в избранном пользователя'
+        )
+        parser.add_argument(
+            '--carts', type=float, default=3,
+            help='Среднее количество рецептов в списке покупок пользователя'
+        )
+        parser.add_argument(
+            '--alpha', type=float, default=1.0,
+            help='Показатель степенного закона популярности авторов, '
+                 'рецептов и ингредиентов'
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько последних дней распределяются даты'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Количество пользователей или рецептов в одной пачке'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Количество процессов для вставки пачек, только '
+                 'для PostgreSQL'
+        )
+        parser.add_argument(
+            '--password', default='password',
+            help='Пароль всех созданных пользователей'
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 2 or options['recipes'] < 1:
+            raise CommandError('Нужно не меньше 2 пользователей и 1 рецепта')
+        if options['workers'] > 1 and connection.vendor == 'sqlite':
+            raise CommandError('SQLite не поддерживает параллельную запись, '
+                               'запустите с --workers 1 или на PostgreSQL')
+        ingredients = list(Ingredient.objects.order_by('id').values_list(
+            'id', flat=True
+        ))
+        tags = list(Tag.objects.order_by('id').values_list('id', 'bit'))
+        if not ingredients or not tags:
+            raise CommandError('Сначала загрузите ингредиенты и теги '
+                               'командой loadcsv')
+        plan = generator.make_plan(
+            options, make_password(options['password']), ingredients, tags
+        )
+        started = time.perf_counter()
+        generator.generate(
+            plan, options['batch_size'], options['workers'], self.progress
+        )
+        self.stdout.write('Пересчет счетчиков, лент и рейтингов')
+        generator.rebuild_derived()
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.perf_counter() - started:.1f} с'
+        ))
+
+    def progress(self, step, rows):
+        self.stdout.write(f'{step}: {rows} строк')
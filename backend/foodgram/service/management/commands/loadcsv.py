@@ -1,85 +1,139 @@
-import csv
-import os
+import time
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.core.management.base import BaseCommand
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
 
-from recipes.models import Ingredient, Tag
+from api.cache import (
+    FRAGMENTS_VERSION, RECIPES_VERSION, bump_version, invalidate_pages
+)
+from api.catalog import CATALOG_VERSION
+from api.snapshots import TAGS_VERSION
+from recipes.models import TAG_BITS, Ingredient, Tag
+from service.loaders import (
+    Upsert, chunks, find_file, read_rows, reset_sequences
+)
 
 User = get_user_model()
 
 
+class UserUpsert(Upsert):
+    """Пароли из файла хешируются, у существующих пользователей
+    пароль заменяется, если не задан update_passwords=False."""
+    update_passwords = True
+
+    def before_create(self, objects):
+        for user in objects:
+            user.password = make_password(user.password)
+
+    def apply(self, obj, row):
+        changed = super().apply(obj, row)
+        if self.update_passwords and row.get('password'):
+            obj.set_password(row['password'])
+            return True
+        return changed
+
+    def update(self, objects):
+        fields = self.update_fields
+        if self.update_passwords:
+            fields += ('password',)
+        self.model.objects.bulk_update(objects, fields)
+
+
+class TagUpsert(Upsert):
+    """Новым тегам назначаются свободные биты маски тегов."""
+
+    def before_create(self, objects):
+        used = set(Tag.objects.values_list('bit', flat=True))
+        free = (bit for bit in range(TAG_BITS) if bit not in used)
+        for tag in objects:
+            tag.bit = next(free, None)
+            if tag.bit is None:
+                raise CommandError(f'Нельзя создать больше {TAG_BITS} тегов')
+
+
+DATASETS = (
+    ('users', UserUpsert(
+        User, ('id',), ('username', 'email', 'first_name', 'last_name')
+    ), None),
+    ('ingredients', Upsert(
+        Ingredient, ('name', 'measurement_unit')
+    ), CATALOG_VERSION),
+    ('tags', TagUpsert(
+        Tag, ('slug',), ('name', 'color')
+    ), TAGS_VERSION),
+)
+
+
 class Command(BaseCommand):
-    help = 'Загрузка данных из csv в базу данных'
-
-    @staticmethod
-    def _read_csv(file_name):
-        """Read CSV, return list of row."""
-        file_path = os.path.join(settings.DATA_DIR, file_name)
-        with open(file_path, encoding='utf-8') as csv_file:
-            csv_reader = csv.reader(csv_file, delimiter=',', )
-            result = [row for row in csv_reader]
-        return result or None
-
-    @staticmethod
-    def _process_date(csv_data, foreign_keys=()):
-        """Rename column if foreign key and create list of dict."""
-        result = []
-        if foreign_keys:
-            csv_data[0] = [column + '_id'
-                           if column in foreign_keys else column
-                           for column in csv_data[0]]
-        for index in range(1, len(csv_data)):
-            result.append(dict(zip(csv_data[0], csv_data[index])))
-        return result
-
-    @staticmethod
-    def _write_to_model(model, data, defaults={}):
-        """Create or update objects in model."""
-        for row in data:
-            if model == User:
-                password = row.pop('password')
-            created = model.objects.update_or_create(**row, defaults=defaults)
-            if model == User:
-                created[0].set_password(password)
-                created[0].save()
-            print(f'{created} - {row}')
-
-    def _process_file(self, model, file_name,
-                      foreign_keys=(), extra_update=()):
-        """Processing file and create/update objects."""
-        data_raw = self._read_csv(file_name)
-        data = self._process_date(data_raw, foreign_keys)
-        if extra_update:
-            for obj in data:
-                update = {}
-                for column in extra_update:
-                    update['id'] = obj['id']
-                    update[column] = obj.pop(column)
-                self._write_to_model(model, [obj])
-                self._write_to_model(model, [obj], defaults=update)
-        else:
-            self._write_to_model(model, data)
-
-    @staticmethod
-    def _write_to_many_to_many_model(model1, model2, data, foreign_keys):
-        """Create or update objects in many to many table."""
-        for row in data:
-            obj_1 = model1.objects.get(id=row[foreign_keys[0]])
-            obj_2 = model2.objects.get(id=row[foreign_keys[1]])
-            getattr(obj_1, foreign_keys[1].split('_')[0]).add(obj_2)
-            obj_1.save()
-            print(f'update - {obj_1} in many to many {" ".join(foreign_keys)}')
-
-    def _processing_many_to_many_file(self, model1, model2,
-                                      file_name, foreign_keys=()):
-        """Processing file and create/update objects in many to many table."""
-        data_raw = self._read_csv(file_name)
-        data = self._process_date(data_raw)
-        self._write_to_many_to_many_model(model1, model2, data, foreign_keys)
+    help = ('Загрузка пользователей, ингредиентов и тегов из csv или json '
+            'файлов в базу данных')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'datasets', nargs='*',
+            help='Загружаемые наборы данных: users, ingredients, tags, '
+                 'по умолчанию все'
+        )
+        parser.add_argument(
+            '--path', default=settings.DATA_DIR,
+            help='Папка с файлами users, ingredients и tags '
+                 'в формате csv или json'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=5000,
+            help='Количество строк, сохраняемых в одной транзакции'
+        )
+        parser.add_argument(
+            '--keep-passwords', action='store_true',
+            help='Не менять пароли существующих пользователей: без этого '
+                 'пароль каждого пользователя из файла хешируется заново, '
+                 'что занимает основное время загрузки пользователей'
+        )
 
     def handle(self, *args, **options):
-        self._process_file(User, 'users.csv')
-        self._process_file(Ingredient, 'ingredients.csv')
-        self._process_file(Tag, 'tags.csv')
+        known = [name for name, *_ in DATASETS]
+        names = options['datasets'] or known
+        unknown = set(names) - set(known)
+        if unknown:
+            raise CommandError(f'Неизвестные наборы данных: {unknown}')
+        changed = False
+        for name, upsert, version in DATASETS:
+            if name not in names:
+                continue
+            if isinstance(upsert, UserUpsert):
+                upsert.update_passwords = not options['keep_passwords']
+            path = find_file(options['path'], name)
+            if path is None:
+                self.stderr.write(f'{name}: файл не найден, пропущен')
+                continue
+            created, updated = self.load(name, path, upsert, options)
+            if created or updated:
+                changed = True
+                if version is not None:
+                    bump_version(version)
+                if upsert.model is User and created:
+                    reset_sequences(User)
+        if changed:
+            bump_version(FRAGMENTS_VERSION)
+            invalidate_pages(RECIPES_VERSION)
+
+    def load(self, name, path, upsert, options):
+        """Загрузка файла path пачками, по пачке на транзакцию."""
+        started = time.perf_counter()
+        rows = created = updated = 0
+        for chunk in chunks(read_rows(path), options['chunk_size']):
+            chunk_created, chunk_updated = upsert.save(chunk)
+            rows += len(chunk)
+            created += chunk_created
+            updated += chunk_updated
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{name}: {rows} строк')
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{name}: {rows} строк за {elapsed:.2f} с '
+            f'({rows / elapsed if elapsed else 0:.0f} строк/с), '
+            f'создано {created}, обновлено {updated}'
+        ))
+        return created, updated
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from api.cache import get_page_cache_stats
+
+
+class Command(BaseCommand):
+    help = 'Статистика кеша страниц рецептов для анонимных пользователей'
+
+    def handle(self, *args, **options):
+        stats = get_page_cache_stats()
+        for stat, value in stats.items():
+            self.stdout.write(f'{stat}: {value}')
@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from service import benchmark
+from service.querybudget import BUDGETS, BudgetRunner
+
+
+class Command(BaseCommand):
+    help = ('Проверка количества запросов к базе данных эндпоинтов API '
+            'по бюджетам с отчетом о повторяющихся запросах и полях '
+            'сериализаторов, которые их выполняют')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--budget', action='append', dest='budgets',
+            help='Имя бюджета, можно указать несколько раз, по умолчанию все'
+        )
+        parser.add_argument(
+            '--user', type=int,
+            help='id пользователя, по умолчанию пользователь '
+                 'с наибольшим числом подписок'
+        )
+
+    def handle(self, *args, **options):
+        with benchmark.isolated_settings():
+            self.run(options)
+
+    def run(self, options):
+        names = options['budgets']
+        budgets = [budget for budget in BUDGETS
+                   if not names or budget.name in names]
+        unknown = set(names or ()) - {budget.name for budget in BUDGETS}
+        if unknown:
+            raise CommandError(f'Неизвестные бюджеты: {unknown}')
+        user = benchmark.get_benchmark_user(options['user'])
+        if user is None:
+            raise CommandError('Нет данных, создайте их командой gendata')
+        runner = BudgetRunner(user)
+        failed = []
+        for budget in budgets:
+            url = runner.get_url(budget)
+            if url is None:
+                failed.append(budget.name)
+                self.stdout.write(self.style.ERROR(
+                    f'{budget.name}: нет данных для проверки'
+                ))
+                continue
+            status, log = runner.run(budget, url)
+            line = (f'{budget.name}: {budget.method.upper()} {url} '
+                    f'{status}, запросов {log.count} из {budget.budget}')
+            if status >= 400 or log.count > budget.budget:
+                failed.append(budget.name)
+                self.stdout.write(self.style.ERROR(line))
+                self.stdout.write(log.report())
+            else:
+                self.stdout.write(line)
+                if options['verbosity'] > 1:
+                    self.stdout.write(log.report())
+        if failed:
+            raise CommandError(
+                f'Не пройдены бюджеты: {", ".join(failed)}'
+            )
+        self.stdout.write(self.style.SUCCESS('Бюджеты запросов соблюдены'))
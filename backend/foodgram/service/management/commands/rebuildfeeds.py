@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from recipes import feed
+
+
+class Command(BaseCommand):
+    help = 'Пересоздание лент подписок пользователей по их подпискам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='user_ids',
+            help='id пользователя, можно указать несколько раз'
+        )
+
+    def handle(self, *args, **options):
+        count = feed.rebuild_feeds(options['user_ids'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Ленты пересозданы, обработано подписок: {count}'
+        ))
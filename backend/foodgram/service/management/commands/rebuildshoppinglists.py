@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes import shopping_list
+
+
+class Command(BaseCommand):
+    help = ('Пересчет сводных списков покупок по рецептам в списках покупок '
+            'и проверка их согласованности')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только проверить списки, завершиться с ошибкой '
+                 'при расхождении'
+        )
+        parser.add_argument(
+            '--user', type=int, action='append', dest='user_ids',
+            help='id пользователя, можно указать несколько раз'
+        )
+
+    def handle(self, *args, **options):
+        user_ids = options['user_ids']
+        if options['check']:
+            changed, _ = shopping_list.find_mismatched_users(user_ids)
+            if changed:
+                raise CommandError(
+                    f'Расходятся списки покупок пользователей: {changed}'
+                )
+            self.stdout.write(self.style.SUCCESS('Списки покупок согласованы'))
+            return
+
+        changed = shopping_list.rebuild_shopping_lists(user_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитаны списки покупок пользователей: {len(changed)}'
+        ))
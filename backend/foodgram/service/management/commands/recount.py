@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from recipes.counters import recount_favorites, recount_recipes
+
+
+class Command(BaseCommand):
+    help = ('Пересчет счетчиков избранного у рецептов и количества '
+            'рецептов у пользователей')
+
+    def handle(self, *args, **options):
+        favorites = recount_favorites()
+        recipes = recount_recipes()
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено рецептов: {favorites}, пользователей: {recipes}'
+        ))
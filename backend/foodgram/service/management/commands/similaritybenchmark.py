@@ -0,0 +1,103 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.similarity import BANDS, SimilarityIndex
+from recipes import minhash
+
+
+class Command(BaseCommand):
+    help = ('Сравнение поиска похожих рецептов по LSH индексу MinHash '
+            'подписей с точным перебором по коэффициенту Жаккара '
+            'на сгенерированных наборах ингредиентов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=20000,
+                            help='Количество рецептов')
+        parser.add_argument('--ingredients', type=int, default=2000,
+                            help='Количество ингредиентов')
+        parser.add_argument('--dishes', type=int, default=1000,
+                            help='Количество блюд, вариантами которых '
+                                 'являются рецепты')
+        parser.add_argument('--queries', type=int, default=200,
+                            help='Количество запросов')
+        parser.add_argument('--top', type=int, default=10,
+                            help='Размер выдачи похожих рецептов')
+        parser.add_argument('--bands', type=int, default=BANDS,
+                            help='Количество полос LSH индекса')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        generator = random.Random(options['seed'])
+        recipes = self.generate(generator, options)
+
+        started = time.perf_counter()
+        index = SimilarityIndex(bands=options['bands'])
+        for recipe_id, ingredients in recipes.items():
+            index.add(recipe_id, minhash.signature(ingredients))
+        build_time = time.perf_counter() - started
+
+        top = options['top']
+        queries = generator.sample(sorted(recipes), options['queries'])
+        found = expected = 0
+        lsh_time = exact_time = 0
+        for recipe_id in queries:
+            started = time.perf_counter()
+            similar = index.similar(recipe_id, top)
+            lsh_time += time.perf_counter() - started
+
+            started = time.perf_counter()
+            exact = self.exact(recipes, recipe_id, top)
+            exact_time += time.perf_counter() - started
+
+            if not exact:
+                continue
+            threshold = exact[-1][1]
+            ingredients = recipes[recipe_id]
+            expected += len(exact)
+            found += min(len(exact), sum(
+                minhash.jaccard(ingredients, recipes[candidate]) >= threshold
+                for candidate, _ in similar
+            ))
+
+        count = len(queries)
+        self.stdout.write(
+            f'Рецептов: {len(recipes)}, запросов: {count}, top: {top}\n'
+            f'Построение индекса: {build_time:.2f} с\n'
+            f'LSH: {lsh_time / count * 1000:.2f} мс на запрос\n'
+            f'Перебор: {exact_time / count * 1000:.2f} мс на запрос\n'
+            f'Полнота: {found / expected if expected else 1:.3f}'
+        )
+
+    @staticmethod
+    def generate(generator, options):
+        """Рецепты — варианты блюд: основа блюда, из которой выброшено
+        и в которую добавлено несколько случайных ингредиентов."""
+        universe = range(1, options['ingredients'] + 1)
+        dishes = [set(generator.sample(universe, generator.randint(5, 15)))
+                  for _ in range(options['dishes'])]
+        recipes = {}
+        for recipe_id in range(1, options['recipes'] + 1):
+            ingredients = set(generator.choice(dishes))
+            for ingredient in generator.sample(
+                sorted(ingredients), generator.randint(0, 2)
+            ):
+                ingredients.discard(ingredient)
+            ingredients.update(
+                generator.sample(universe, generator.randint(0, 3))
+            )
+            recipes[recipe_id] = ingredients or {generator.choice(universe)}
+        return recipes
+
+    @staticmethod
+    def exact(recipes, recipe_id, top):
+        """Точный top похожих рецептов перебором всех рецептов."""
+        ingredients = recipes[recipe_id]
+        scores = sorted(
+            ((candidate, minhash.jaccard(ingredients, other))
+             for candidate, other in recipes.items()
+             if candidate != recipe_id),
+            key=lambda score: (-score[1], -score[0])
+        )
+        return [score for score in scores[:top] if score[1] > 0]
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from api.cache import RECIPES_VERSION, invalidate_pages
+from recipes import trending
+
+
+class Command(BaseCommand):
+    help = ('Учет новых добавлений в избранное и списки покупок '
+            'в рейтинге трендов рецептов, запускается периодически')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Пересчитать рейтинг по всем записям'
+        )
+
+    def handle(self, *args, **options):
+        count = trending.update_scores(rebuild=options['rebuild'])
+        if count:
+            invalidate_pages(RECIPES_VERSION)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлен рейтинг рецептов: {count}'
+        ))
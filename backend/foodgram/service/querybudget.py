@@ -0,0 +1,222 @@
+import os
+import re
+import sys
+from collections import Counter, defaultdict, namedtuple
+from contextlib import contextmanager
+from urllib.parse import quote
+
+from django.conf import settings
+from django.db import connection, transaction
+from rest_framework.authtoken.models import Token
+
+from api.cache import FRAGMENTS_VERSION, bump_version
+from recipes.models import Favorite, Recipe, ShoppingCart, Subscription, Tag
+from service.benchmark import make_client
+
+Budget = namedtuple('Budget', ('name', 'method', 'url', 'budget'))
+
+# Бюджеты запросов к базе для авторизованного пользователя. Бюджет не
+# должен зависеть от размера страницы: рост с limit означает N+1.
+BUDGETS = (
+    Budget('recipes', 'get', '/api/recipes/', 6),
+    Budget('recipes_limit_50', 'get', '/api/recipes/?limit=50', 6),
+    # С кешем в памяти процесса биты тегов сверяются с таблицей тегов.
+    Budget('recipes_tags_limit_50', 'get',
+           '/api/recipes/?limit=50&tags={tag}', 7),
+    Budget('recipes_favorited_limit_50', 'get',
+           '/api/recipes/?limit=50&is_favorited=1', 6),
+    Budget('recipe_detail', 'get', '/api/recipes/{recipe}/', 5),
+    Budget('recipes_feed_limit_50', 'get', '/api/recipes/feed/?limit=50', 6),
+    Budget('recipes_similar_limit_50', 'get',
+           '/api/recipes/{recipe}/similar/?limit=50', 3),
+    Budget('recipes_what_can_i_cook_limit_50', 'get',
+           '/api/recipes/what_can_i_cook/?limit=50&ingredients={ingredients}',
+           3),
+    Budget('download_shopping_cart', 'get',
+           '/api/recipes/download_shopping_cart/', 2),
+    Budget('subscriptions', 'get', '/api/users/subscriptions/', 4),
+    Budget('subscriptions_limit_50', 'get',
+           '/api/users/subscriptions/?limit=50', 4),
+    Budget('subscriptions_recipes_limit', 'get',
+           '/api/users/subscriptions/?limit=50&recipes_limit=3', 4),
+    Budget('users', 'get', '/api/users/', 3),
+    Budget('users_limit_50', 'get', '/api/users/?limit=50', 3),
+    Budget('user_detail', 'get', '/api/users/{author}/', 2),
+    Budget('users_me', 'get', '/api/users/me/', 2),
+    # Проверка числа и наибольшего id записей снимков и каталога
+    # выполняется только с кешем в памяти процесса, как при замере.
+    Budget('tags', 'get', '/api/tags/', 2),
+    Budget('tag_detail', 'get', '/api/tags/{tag_id}/', 2),
+    Budget('ingredients', 'get', '/api/ingredients/', 2),
+    Budget('ingredients_name', 'get', '/api/ingredients/?name={prefix}', 2),
+    Budget('favorite_add', 'post', '/api/recipes/{new_recipe}/favorite/', 8),
+    Budget('favorite_remove', 'delete', '/api/recipes/{favorite}/favorite/',
+           8),
+    Budget('shopping_cart_add', 'post',
+           '/api/recipes/{new_recipe}/shopping_cart/', 11),
+    Budget('shopping_cart_remove', 'delete',
+           '/api/recipes/{shopping_cart}/shopping_cart/', 10),
+    Budget('subscribe', 'post', '/api/users/{new_author}/subscribe/', 7),
+    Budget('unsubscribe', 'delete', '/api/users/{subscription}/subscribe/',
+           6),
+)
+
+IN_LIST = re.compile(r'\(%s(?:, %s)+\)')
+DRF_SERIALIZERS = os.path.join('rest_framework', 'serializers.py')
+SERVICE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def normalize(sql):
+    """Запрос без различий в длине списков параметров IN."""
+    return IN_LIST.sub('(%s, ...)', sql)
+
+
+def find_source():
+    """Поле сериализатора, при выводе которого выполняется запрос,
+    и ближайшая к запросу строка кода проекта вне service.
+
+    Поле берется из локальной переменной field самого вложенного
+    вызова Serializer.to_representation в стеке."""
+    field = location = None
+    frame = sys._getframe(2)
+    while frame is not None and (field is None or location is None):
+        code = frame.f_code
+        if (field is None and code.co_name == 'to_representation'
+                and code.co_filename.endswith(DRF_SERIALIZERS)
+                and 'field' in frame.f_locals):
+            serializer = type(frame.f_locals['self']).__name__
+            field = f'{serializer}.{frame.f_locals["field"].field_name}'
+        if (location is None
+                and code.co_filename.startswith(settings.BASE_DIR)
+                and not code.co_filename.startswith(SERVICE_DIR)):
+            path = os.path.relpath(code.co_filename, settings.BASE_DIR)
+            location = f'{path}:{frame.f_lineno} {code.co_name}'
+        frame = frame.f_back
+    return field, location
+
+
+class QueryLog:
+    """Выполненные запросы, сгруппированные по нормализованному SQL,
+    с источниками каждого выполнения."""
+
+    def __init__(self):
+        self.count = 0
+        self.statements = defaultdict(Counter)
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        self.statements[normalize(sql)][find_source()] += 1
+        return execute(sql, params, many, context)
+
+    def repeated(self):
+        """Запросы, выполненные больше одного раза, от частых к редким:
+        (количество, SQL, Counter источников)."""
+        return sorted(
+            ((sum(sources.values()), sql, sources)
+             for sql, sources in self.statements.items()
+             if sum(sources.values()) > 1),
+            key=lambda statement: -statement[0]
+        )
+
+    def report(self, width=200):
+        """Все запросы от частых к редким с полями сериализаторов
+        и строками кода, из которых они выполнены."""
+        lines = []
+        for sql, sources in sorted(
+            self.statements.items(),
+            key=lambda statement: -sum(statement[1].values())
+        ):
+            lines.append(f'  {sum(sources.values())} x {sql[:width]}')
+            for (field, location), times in sources.most_common():
+                lines.append(
+                    f'      {times} x поле {field or "-"}, {location or "-"}'
+                )
+        return '\n'.join(lines)
+
+
+@contextmanager
+def capture_queries():
+    """Запись всех запросов к базе внутри блока в QueryLog."""
+    log = QueryLog()
+    with connection.execute_wrapper(log):
+        yield log
+
+
+def get_context(user):
+    """Значения для адресов бюджетов: рецепты, авторы и ингредиенты,
+    для которых запросы пользователя выполняются успешно. Значение
+    None, если подходящих данных нет."""
+    recipe = Recipe.objects.order_by('-favorites_count', 'id').first()
+    tag = Tag.objects.order_by('id').first()
+    favorites = Favorite.objects.filter(user=user)
+    carts = ShoppingCart.objects.filter(user=user)
+    subscriptions = Subscription.objects.filter(user=user)
+    ingredients = recipe.ingredients.order_by('id')[:3] if recipe else []
+    return {
+        'recipe': recipe and recipe.id,
+        'author': recipe and recipe.author_id,
+        'tag': tag and tag.slug,
+        'tag_id': tag and tag.id,
+        'ingredients': ','.join(str(item.id) for item in ingredients),
+        'prefix': quote(ingredients[0].name[:3]) if ingredients else None,
+        'new_recipe': Recipe.objects.exclude(
+            id__in=favorites.values('recipe_id')
+        ).exclude(
+            id__in=carts.values('recipe_id')
+        ).values_list('id', flat=True).first(),
+        'favorite': favorites.values_list('recipe_id', flat=True).first(),
+        'shopping_cart': carts.values_list('recipe_id', flat=True).first(),
+        'new_author': type(user).objects.exclude(id=user.id).exclude(
+            id__in=subscriptions.values('author_id')
+        ).values_list('id', flat=True).first(),
+        'subscription': subscriptions.values_list(
+            'author_id', flat=True
+        ).first(),
+    }
+
+
+class BudgetRunner:
+    """Выполнение запросов бюджетов от имени пользователя."""
+
+    def __init__(self, user):
+        token, _ = Token.objects.get_or_create(user=user)
+        self.client = make_client()
+        self.headers = {'HTTP_AUTHORIZATION': f'Token {token.key}'}
+        self.context = get_context(user)
+
+    def get_url(self, budget):
+        """Адрес бюджета, None если для него нет данных."""
+        try:
+            return budget.url.format(**{
+                key: value for key, value in self.context.items()
+                if value is not None and value != ''
+            })
+        except KeyError:
+            return None
+
+    def request(self, budget, url):
+        """Ответ на запрос, потоковый ответ читается целиком, чтобы
+        учесть выполняемые при чтении запросы."""
+        response = getattr(self.client, budget.method)(url, **self.headers)
+        b''.join(response)
+        return response
+
+    def run(self, budget, url):
+        """Статус ответа и журнал запросов. Чтение выполняется после
+        прогревочного запроса, чтобы не учитывать заполнение индексов
+        и снимков процесса, но со сброшенными фрагментами рецептов,
+        которые иначе скрыли бы запросы сериализаторов. Версии кеша
+        сбрасываются, поэтому выполнять только внутри
+        benchmark.isolated_settings. Изменение выполняется
+        в транзакции, которая откатывается."""
+        if budget.method == 'get':
+            self.request(budget, url)
+            bump_version(FRAGMENTS_VERSION)
+            with capture_queries() as log:
+                response = self.request(budget, url)
+            return response.status_code, log
+        with transaction.atomic():
+            with capture_queries() as log:
+                response = self.request(budget, url)
+            transaction.set_rollback(True)
+        return response.status_code, log
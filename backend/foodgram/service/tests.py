@@ -0,0 +1,303 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from api.cache import FRAGMENTS_VERSION, get_version
+from api.catalog import CATALOG_VERSION
+from api.snapshots import TAGS_VERSION
+from recipes import shopping_list
+from recipes.models import (
+    FeedEntry, Ingredient, Recipe, ShoppingListItem, Subscription, Tag
+)
+from service import benchmark, loaders
+from service.management.commands.loadcsv import TagUpsert
+from service.querybudget import BUDGETS, BudgetRunner
+
+
+class ServiceTestCase(TestCase):
+    """Ингредиенты и теги для генерации данных, картинки рецептов
+    сохраняются во временную папку."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_settings = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_settings.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'ингредиент {index}', measurement_unit='г')
+            for index in range(50)
+        )
+        Tag.objects.create(name='Завтрак', color='#00FF00', slug='breakfast')
+        Tag.objects.create(name='Обед', color='#0000FF', slug='lunch')
+
+
+class GenDataTests(ServiceTestCase):
+
+    def test_generates_consistent_derived_data(self):
+        call_command('gendata', users=100, recipes=300, carts=10,
+                     batch_size=40, seed=3, stdout=StringIO())
+
+        self.assertEqual(Recipe.objects.count(), 300)
+        self.assertGreater(ShoppingListItem.objects.count(), 500)
+        self.assertEqual(shopping_list.find_mismatched_users()[0], [])
+        self.assertEqual(
+            FeedEntry.objects.count() > 0, Subscription.objects.exists()
+        )
+
+    def test_parallel_workers_rejected_on_sqlite(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Проверка только для SQLite')
+        with self.assertRaises(CommandError):
+            call_command('gendata', users=2, recipes=1, workers=2)
+
+
+class QueryBudgetTests(ServiceTestCase):
+    """Бюджеты запросов из service.querybudget на сгенерированных
+    данных: рост числа запросов с размером страницы означает N+1."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        call_command('gendata', users=60, recipes=200, seed=5,
+                     stdout=StringIO())
+
+    def test_budgets(self):
+        with benchmark.isolated_settings():
+            runner = BudgetRunner(benchmark.get_benchmark_user())
+            for budget in BUDGETS:
+                with self.subTest(budget=budget.name):
+                    url = runner.get_url(budget)
+                    self.assertIsNotNone(url, 'нет данных для проверки')
+                    status, log = runner.run(budget, url)
+                    self.assertLess(status, 400, url)
+                    self.assertLessEqual(
+                        log.count, budget.budget, f'{url}\n{log.report()}'
+                    )
+
+    def test_site_cache_untouched(self):
+        version = get_version(FRAGMENTS_VERSION)
+        call_command('querybudget', budget=['recipes'], stdout=StringIO())
+        self.assertEqual(get_version(FRAGMENTS_VERSION), version)
+
+    def test_missing_data_fails(self):
+        Subscription.objects.all().delete()
+        with self.assertRaisesMessage(CommandError, 'unsubscribe'):
+            call_command('querybudget', budget=['unsubscribe'],
+                         stdout=StringIO())
+
+
+class BenchmarkTests(ServiceTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        call_command('gendata', users=20, recipes=50, seed=7,
+                     stdout=StringIO())
+
+    def test_cold_scenarios_miss_cache(self):
+        scenarios = {scenario.name: scenario
+                     for scenario in benchmark.get_scenarios()}
+        with benchmark.isolated_settings():
+            target = benchmark.get_target(benchmark.get_benchmark_user())
+            warm, cold = (
+                benchmark.measure(target, scenarios[name], 2, 1)
+                for name in ('recipes_anonymous', 'recipes_anonymous_cold')
+            )
+        self.assertEqual(warm['queries'], 0)
+        self.assertGreater(cold['queries'], 0)
+
+    def test_compare_requires_min_repeat(self):
+        with self.assertRaisesMessage(CommandError, '--repeat'):
+            call_command('benchmark', repeat=3, compare='baseline.json')
+
+
+class LoaderFilesMixin:
+    """Временная папка для файлов загрузки."""
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path, ignore_errors=True)
+
+    def write(self, name, text):
+        path = os.path.join(self.path, name)
+        with open(path, 'w', encoding='utf-8') as data_file:
+            data_file.write(text)
+        return path
+
+
+class ReaderTests(LoaderFilesMixin, SimpleTestCase):
+
+    items = [
+        {'name': 'Соль, морская [крупная]', 'measurement_unit': 'г'},
+        {'name': 'Сахар {тростниковый}', 'measurement_unit': 'г'},
+        {'name': 'Вода', 'measurement_unit': 'мл'},
+    ]
+
+    def test_read_csv(self):
+        path = self.write(
+            'ingredients.csv',
+            'name,measurement_unit\n"Соль, морская [крупная]",г\n'
+            'Сахар {тростниковый},г\nВода,мл\n'
+        )
+        self.assertEqual(list(loaders.read_rows(path)), self.items)
+
+    def test_read_json_array_across_blocks(self):
+        path = self.write(
+            'ingredients.json', json.dumps(self.items, ensure_ascii=False)
+        )
+        with mock.patch.object(loaders, 'READ_BLOCK_SIZE', 7):
+            self.assertEqual(list(loaders.read_rows(path)), self.items)
+
+    def test_read_json_lines(self):
+        path = self.write('ingredients.json', '\n'.join(
+            json.dumps(item, ensure_ascii=False) for item in self.items
+        ) + '\n')
+        with mock.patch.object(loaders, 'READ_BLOCK_SIZE', 5):
+            self.assertEqual(list(loaders.read_rows(path)), self.items)
+
+    def test_read_broken_json(self):
+        path = self.write('ingredients.json', '[{"name": "Соль"}, {"name"')
+        with self.assertRaises(json.JSONDecodeError):
+            list(loaders.read_rows(path))
+
+    def test_find_file_prefers_csv(self):
+        self.write('tags.json', '[]')
+        self.assertEqual(
+            loaders.find_file(self.path, 'tags'),
+            os.path.join(self.path, 'tags.json')
+        )
+        self.write('tags.csv', 'slug\n')
+        self.assertEqual(
+            loaders.find_file(self.path, 'tags'),
+            os.path.join(self.path, 'tags.csv')
+        )
+        self.assertIsNone(loaders.find_file(self.path, 'users'))
+
+
+class LoadCsvTests(LoaderFilesMixin, TestCase):
+
+    def load(self, *datasets, **options):
+        call_command('loadcsv', *datasets, path=self.path,
+                     stdout=StringIO(), stderr=StringIO(), **options)
+
+    def test_upsert_inserts_and_updates(self):
+        upsert = TagUpsert(Tag, ('slug',), ('name', 'color'))
+        Tag.objects.create(name='Завтрак', color='#00FF00', slug='breakfast')
+
+        self.assertEqual(upsert.save([
+            {'slug': 'breakfast', 'name': 'Завтрак', 'color': '#00FF00'},
+            {'slug': 'lunch', 'name': 'Обед', 'color': '#0000FF'},
+        ]), (1, 0))
+        self.assertEqual(upsert.save([
+            {'slug': 'breakfast', 'name': 'Ранний завтрак',
+             'color': '#00FF00'},
+            {'slug': 'lunch', 'name': 'Обед', 'color': '#0000FF'},
+        ]), (0, 1))
+        self.assertEqual(
+            Tag.objects.get(slug='breakfast').name, 'Ранний завтрак'
+        )
+
+    def test_duplicates_within_file_keep_last_row(self):
+        self.write(
+            'ingredients.csv',
+            'name,measurement_unit\nСоль,г\nСахар,г\nСоль,г\nСоль,кг\n'
+        )
+        self.load('ingredients', chunk_size=3)
+
+        self.assertEqual(
+            sorted(Ingredient.objects.values_list(
+                'name', 'measurement_unit'
+            )),
+            [('Сахар', 'г'), ('Соль', 'г'), ('Соль', 'кг')]
+        )
+
+    def test_duplicate_tags_keep_last_row(self):
+        self.write('tags.csv', 'name,color,slug\nЗавтрак,#00FF00,breakfast\n'
+                               'Обед,#0000FF,lunch\n'
+                               'Ранний завтрак,#00FF00,breakfast\n')
+        self.load('tags')
+
+        self.assertEqual(
+            sorted(Tag.objects.values_list('slug', 'name', 'bit')),
+            [('breakfast', 'Ранний завтрак', 0), ('lunch', 'Обед', 1)]
+        )
+
+    def test_load_bumps_cache_versions_only_on_changes(self):
+        self.write('ingredients.csv', 'name,measurement_unit\nСоль,г\n')
+        self.write('tags.csv', 'name,color,slug\nЗавтрак,#00FF00,breakfast\n')
+        names = (CATALOG_VERSION, TAGS_VERSION, FRAGMENTS_VERSION)
+        before = [get_version(name) for name in names]
+
+        self.load('ingredients')
+        after_ingredients = [get_version(name) for name in names]
+        self.assertGreater(after_ingredients[0], before[0])
+        self.assertEqual(after_ingredients[1], before[1])
+        self.assertGreater(after_ingredients[2], before[2])
+
+        self.load('tags')
+        after_tags = [get_version(name) for name in names]
+        self.assertEqual(after_tags[0], after_ingredients[0])
+        self.assertGreater(after_tags[1], after_ingredients[1])
+
+        self.load()
+        self.assertEqual([get_version(name) for name in names], after_tags)
+
+    def test_users_passwords(self):
+        User = get_user_model()
+        header = 'id,username,email,first_name,last_name,password\n'
+        self.write('users.csv', header + '100,cook,cook@example.com,'
+                                         'Имя,Фамилия,first-pass1\n')
+        self.load('users')
+        user = User.objects.get(pk=100)
+        self.assertTrue(user.check_password('first-pass1'))
+
+        self.write('users.csv', header + '100,cook,cook@example.com,'
+                                         'Имя,Фамилия,second-pass2\n')
+        self.load('users', keep_passwords=True)
+        user.refresh_from_db()
+        self.assertTrue(user.check_password('first-pass1'))
+
+        self.load('users')
+        user.refresh_from_db()
+        self.assertTrue(user.check_password('second-pass2'))
+        self.assertEqual(
+            User.objects.create(username='new', email='new@example.com').pk,
+            101
+        )
+
+
+class FindRegressionsTests(SimpleTestCase):
+
+    def result(self, p50, stdev, queries=3):
+        return {'p50_ms': p50, 'stdev_ms': stdev, 'queries': queries}
+
+    def test_latency_within_spread_is_noise(self):
+        self.assertEqual(benchmark.find_regressions(
+            {'recipes': self.result(10, 3)},
+            {'recipes': self.result(14, 2)}, 0.2
+        ), [])
+
+    def test_latency_and_queries_growth(self):
+        self.assertEqual(benchmark.find_regressions(
+            {'recipes': self.result(10, 1)},
+            {'recipes': self.result(14, 1, queries=4)}, 0.2
+        ), [('recipes', 'p50_ms', 10, 14), ('recipes', 'queries', 3, 4)])
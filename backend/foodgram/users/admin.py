@@ -5,6 +5,7 @@ from .models import User
 
 
 class OwnUserAdmin(UserAdmin):
+    list_display = UserAdmin.list_display + ('recipes_count',)
     list_filter = ('email', 'username')
 
 
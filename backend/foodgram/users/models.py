@@ -79,6 +79,12 @@ class User(AbstractUser, PermissionsMixin):
         verbose_name='Суперпользователь'
     )
 
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество рецептов'
+    )
+
     objects = UserManager()
 
     USERNAME_FIELD = 'username'